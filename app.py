@@ -11,18 +11,36 @@ Processing order:
   • Finally, the combined Markdown (now containing embedded HTML for code blocks) is converted to HTML via Mistune.
   
 Additionally, the folder view displays the language name next to code files, again using Shtype.
+Rendered pages are cached (see rendercache.py), large files are streamed and huge ones paged by line.
 
 Required packages:
     pip install flask mistune pygments
 
 Custom modules:
-    code2md.py, task3.py, shtype.py must be in the same directory.
+    code2md.py, highlighter.py, shtype.py and the modules they import must be in the same directory.
 """
 
 import os
+import re
+import html
+import atexit
+import hashlib
 import logging
-from flask import Flask, request, redirect, url_for
 import mistune
+import pygments
+from flask import Flask, Response, request, redirect, url_for, jsonify, make_response, stream_with_context, g
+from rendercache import RenderCache
+from sharedcache import SharedCache
+from listing import ListingCache
+from hooks import BlockHook, HookPipeline, BLOCK_TYPES, HOOK_FUNCTIONS
+from warmup import AccessStats, Warmer, read_paths_file
+from searchindex import SearchIndex, KINDS
+import metrics
+import readblocks
+import sourcefile
+import compression
+import fences
+import renderers
 
 # Set up basic logging.
 logging.basicConfig(level=logging.DEBUG)
@@ -34,6 +52,78 @@ BASE_DIR = os.getcwd()
 MD_EXTENSIONS   = {".md", ".markdown"}
 CODE_EXTENSIONS = {".py", ".js", ".java", ".c", ".cpp", ".go", ".html", ".css"}
 
+# Render cache settings: in-memory byte budget and optional on-disk tier (None disables it).
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RENDER_CACHE_DIR = None
+
+# Shared cache of all worker processes: SQLite file path (None disables it) and size bound.
+SHARED_CACHE_PATH = None
+SHARED_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Directory listings: entries per page, directories kept in the listing cache, and whether cached
+# directories are watched with inotify (see listing.py).
+LISTING_PAGE_SIZE = 1000
+LISTING_CACHE_DIRS = 256
+LISTING_WATCH = False
+
+# Markdown to HTML backend (see renderers.py): "mistune", "cmark" (needs the cmarkgfm package) or
+# "auto" (cmark if installed). With RENDER_PER_SEGMENT, code files are rendered segment by segment,
+# their code not parsed as Markdown; see renderers.py for where that differs from the whole document.
+MARKDOWN_BACKEND = "mistune"
+RENDER_PER_SEGMENT = False
+
+# Code files of at least this size are streamed, so the first bytes arrive immediately and memory
+# stays bounded by a segment; pieces are sent once they reach STREAM_CHUNK_BYTES.
+STREAM_THRESHOLD_BYTES = 4 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Files larger than MAX_RENDER_BYTES are shown VIEW_PAGE_LINES lines per page, each page cut off after
+# VIEW_PAGE_MAX_BYTES, with links to the neighbouring pages.
+MAX_RENDER_BYTES = 64 * 1024 * 1024
+VIEW_PAGE_LINES = 5000
+VIEW_PAGE_MAX_BYTES = 1024 * 1024
+
+# Cache warm-up (see warmup.py): hot paths are read from WARMUP_PATHS_FILE (a list of paths or an
+# access log) if set, otherwise taken from the access statistics the app keeps, saved to
+# ACCESS_STATS_PATH (None keeps them in memory only). Up to WARMUP_LIMIT paths are rendered by
+# WARMUP_WORKERS background threads at nice level WARMUP_NICE, on startup with WARMUP_ON_STARTUP.
+WARMUP_ON_STARTUP = False
+WARMUP_PATHS_FILE = None
+ACCESS_STATS_PATH = None
+WARMUP_LIMIT = 200
+WARMUP_WORKERS = 1
+WARMUP_NICE = 10
+
+# /bundle pages hold at most BUNDLE_MAX_FILES files.
+BUNDLE_MAX_FILES = 1000
+
+# Search index (see searchindex.py): saved to SEARCH_INDEX_PATH (None keeps it in memory only),
+# refreshed by a background thread every SEARCH_REFRESH_SECONDS, started on the first search or, with
+# SEARCH_INDEX_ON_STARTUP, on startup; files larger than SEARCH_MAX_FILE_BYTES are not indexed, and a
+# query returns at most SEARCH_MAX_RESULTS files (showing SEARCH_MAX_SNIPPETS matching segments of each).
+SEARCH_INDEX_PATH = None
+SEARCH_INDEX_ON_STARTUP = False
+SEARCH_REFRESH_SECONDS = 10
+SEARCH_MAX_FILE_BYTES = 4 * 1024 * 1024
+SEARCH_MAX_RESULTS = 100
+SEARCH_MAX_SNIPPETS = 5
+
+# Style sheet of the /view pages. It is served under a URL containing its fingerprint (a hash of its
+# content), so browsers may cache it for STYLESHEET_MAX_AGE seconds: any change gives it a new URL.
+PAGE_STYLESHEET = """body { font-family: sans-serif; margin: 2em; }
+pre { background-color: #f5f5f5; padding: 1em; overflow-x: auto; }
+code { font-family: monospace; }
+""" + fences.stylesheet()
+STYLESHEET_FINGERPRINT = hashlib.sha256(PAGE_STYLESHEET.encode("utf-8")).hexdigest()[:16]
+STYLESHEET_URL = f"/assets/page.{STYLESHEET_FINGERPRINT}.css"
+STYLESHEET_MAX_AGE = 365 * 24 * 60 * 60
+
+# Requests to /view taking at least this many seconds are profiled with cProfile and the profile is
+# written to PROFILE_DIR (None disables profiling, which otherwise slows every request down). For
+# streamed pages, only the work before the first piece is sent is profiled.
+PROFILE_THRESHOLD_SECONDS = None
+PROFILE_DIR = "profiles"
+
 # Import custom classes.
 try:
     from code2md import MarkdownGenerator
@@ -41,10 +131,10 @@ except ImportError:
     MarkdownGenerator = None
     logging.error("Could not import MarkdownGenerator from code2md.py")
 try:
-    from task3 import Task3Highlighter
+    from highlighter import Task3Highlighter
 except ImportError:
     Task3Highlighter = None
-    logging.error("Could not import Task3Highlighter from task3.py")
+    logging.error("Could not import Task3Highlighter from highlighter.py")
 try:
     from shtype import Shtype
 except ImportError:
@@ -57,13 +147,76 @@ if Shtype is not None:
 else:
     shtype_checker = None
 
-# Global hooks list (each hook is a callable: blocks -> blocks)
-pre_parse_hooks = []
+shared_cache = SharedCache(SHARED_CACHE_PATH, SHARED_CACHE_MAX_BYTES) if SHARED_CACHE_PATH else None
+readblocks.set_block_store(shared_cache)
+render_cache = RenderCache(max_bytes=RENDER_CACHE_MAX_BYTES, disk_dir=RENDER_CACHE_DIR, shared=shared_cache)
+try:
+    markdown_renderer = renderers.get_renderer(MARKDOWN_BACKEND)
+except ValueError as e:
+    logging.error(f"{e}; using Mistune instead.")
+    markdown_renderer = renderers.get_renderer("mistune")
+listing_cache = ListingCache(max_dirs=LISTING_CACHE_DIRS, watch=LISTING_WATCH)
+access_stats = AccessStats(ACCESS_STATS_PATH)
+if ACCESS_STATS_PATH is not None:
+    atexit.register(access_stats.save)
+
+# Pre-parse hooks, run on the blocks of code files between PygmentsParser and MarkdownGenerator
+# (see hooks.py); their version is part of the render cache keys and ETags.
+hook_pipeline = HookPipeline()
+
+# Modules whose code determines the rendered pages (see config_digest).
+RENDER_MODULES = ("app.py", "code2md.py", "readblocks.py", "scanners.py", "highlighter.py",
+                  "sourcefile.py", "shtype.py", "listing.py", "fences.py", "lineoffsets.py",
+                  "commentsyntax.py", "renderers.py")
+
+def config_digest():
+    """
+    Returns the SHA-256 of the rendering configuration: package versions and RENDER_MODULES.
+    """
+    versions = f"pygments {pygments.__version__}\nmistune {mistune.__version__}\n"
+    if renderers.cmarkgfm is not None:
+        versions += f"cmark {renderers.cmarkgfm.cmark.CMARK_VERSION}\n"
+    hasher = hashlib.sha256(versions.encode("utf-8"))
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in RENDER_MODULES:
+        hasher.update(name.encode("utf-8") + b"\n")
+        try:
+            with open(os.path.join(directory, name), "rb") as f:
+                hasher.update(f.read())
+        except OSError:
+            hasher.update(b"missing")
+    return hasher.hexdigest()
+
+# Part of every render cache key and ETag, so that the disk and shared tiers (and the clients) never
+# get pages rendered with other package versions or another version of this code.
+RENDER_VERSION = config_digest()[:12]
+
+def render_variant(ext):
+    """
+    Returns the render cache variant (and ETag suffix) of files with extension ext: the extension
+    and RENDER_VERSION, plus the hook set's version for code files when hooks are registered, the
+    Markdown backend unless it is Mistune and "+segments" for code files rendered segment by segment.
+    """
+    variant = f"{ext}+{RENDER_VERSION}"
+    if hook_pipeline.version and ext in CODE_EXTENSIONS:
+        variant += f"+hooks.{hook_pipeline.version}"
+    if markdown_renderer.name != "mistune":
+        variant += f"+{markdown_renderer.name}"
+    if renders_per_segment(ext):
+        variant += "+segments"
+    return variant
+
+def renders_per_segment(ext):
+    """
+    Returns True if files with extension ext are rendered segment by segment (RENDER_PER_SEGMENT).
+    """
+    return RENDER_PER_SEGMENT and ext in CODE_EXTENSIONS and MarkdownGenerator is not None
 
-def run_pre_parse_hooks(blocks):
-    for hook in pre_parse_hooks:
-        blocks = hook(blocks)
-    return blocks
+def is_streamed(size, ext):
+    """
+    Returns True if a file of size bytes with extension ext is streamed (STREAM_THRESHOLD_BYTES).
+    """
+    return size >= STREAM_THRESHOLD_BYTES and ext in CODE_EXTENSIONS and MarkdownGenerator is not None
 
 app = Flask(__name__)
 
@@ -79,115 +232,770 @@ def browse(subpath):
         return f"Path {abs_path} not found", 404
     if os.path.isfile(abs_path):
         return redirect(url_for('view_file', subpath=subpath))
-    items = sorted(os.listdir(abs_path), key=lambda s: s.lower())
+    try:
+        entries = listing_cache.list_dir(abs_path)
+    except NotADirectoryError:
+        return f"Path {abs_path} not found", 404
+    page_count = max(1, -(-len(entries) // LISTING_PAGE_SIZE))
+    page = min(max(request.args.get("page", 1, type=int), 1), page_count)
+    first = (page - 1) * LISTING_PAGE_SIZE
     html_items = []
     parent = os.path.dirname(subpath)
     if subpath:
         html_items.append(f'<li><a href="{url_for("browse", subpath=parent)}">.. (Parent Directory)</a></li>')
-    for item in items:
-        item_abs = os.path.join(abs_path, item)
-        item_rel = os.path.join(subpath, item)
-        display_text = item
-        if os.path.isfile(item_abs):
-            ext = os.path.splitext(item)[1].lower()
+    for entry in entries[first:first + LISTING_PAGE_SIZE]:
+        item_rel = os.path.join(subpath, entry.name)
+        display_text = entry.name
+        if entry.is_file:
+            ext = os.path.splitext(entry.name)[1].lower()
             if ext in CODE_EXTENSIONS and shtype_checker is not None:
                 langs = shtype_checker.get_languages_by_extension(ext)
                 if langs:
                     display_text += f" (lang: {langs[0]})"
-        if os.path.isdir(item_abs):
+        if entry.is_dir:
             html_items.append(f'<li>[DIR] <a href="{url_for("browse", subpath=item_rel)}">{display_text}</a></li>')
         else:
             html_items.append(f'<li>[FILE] <a href="{url_for("view_file", subpath=item_rel)}">{display_text}</a></li>')
     html = f"<h1>Index of /{subpath}</h1><ul>" + "\n".join(html_items) + "</ul>"
+    if page_count > 1:
+        html += page_links(subpath, page, page_count, first, len(entries))
     return html
 
+def page_links(subpath, page, page_count, first, total):
+    """
+    Returns the navigation shown below a listing that spans several pages.
+    """
+    links = [f"Entries {first + 1}–{min(first + LISTING_PAGE_SIZE, total)} of {total}"]
+    if page > 1:
+        links.append(f'<a href="{url_for("browse", subpath=subpath, page=page - 1)}">Previous page</a>')
+    if page < page_count:
+        links.append(f'<a href="{url_for("browse", subpath=subpath, page=page + 1)}">Next page</a>')
+    return "<p>" + " | ".join(links) + "</p>"
+
 # ---------------------------------------------------------------------
-# File viewing route.
+# Rendering pipeline.
 # ---------------------------------------------------------------------
-@app.route('/view/<path:subpath>')
-def view_file(subpath):
-    abs_path = os.path.join(BASE_DIR, subpath)
-    if not os.path.exists(abs_path) or not os.path.isfile(abs_path):
-        return f"File {abs_path} not found", 404
-
-    ext = os.path.splitext(abs_path)[1].lower()
-    with open(abs_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    md_content = None
-
+def generate_markdown(content, ext, first_line=1):
+    """
+    Turns file content into Markdown: Markdown files are used directly, code files are
+    converted with MarkdownGenerator (Task 2). Returns None for unsupported file types.
+    first_line is the line number of content's first line (for a page of a huge file).
+    """
     if ext in MD_EXTENSIONS:
         # For Markdown files: use the file content directly.
         logging.debug("File identified as Markdown.")
-        md_content = content
-    elif ext in CODE_EXTENSIONS:
+        return content
+    if ext in CODE_EXTENSIONS:
         # For code files: use MarkdownGenerator (Task 2) to convert code into Markdown.
         logging.debug("File identified as a code file.")
-        language = ext[1:]  # default to extension without dot
-        if shtype_checker is not None:
-            langs = shtype_checker.get_languages_by_extension(ext)
-            if langs:
-                language = langs[0]
+        language = code_language(ext)
         logging.debug(f"Determined language for code file: {language}")
         if MarkdownGenerator is None:
             logging.error("MarkdownGenerator class not available. Showing plain content.")
-            md_content = "```\n" + content + "\n```"
-        else:
-            md_gen = MarkdownGenerator(content, language)
-            md_content = md_gen.generate_markdown()
-            logging.debug("Markdown conversion via MarkdownGenerator complete.")
-    else:
-        # For unsupported file types, display plain text.
-        logging.debug("File type not recognized for Markdown processing; showing plain text.")
-        return f"<pre>{content}</pre>"
+            return "```\n" + content + "\n```"
+        md_gen = MarkdownGenerator(content, language, first_line, hooks=hook_pipeline.compiled())
+        md_content = md_gen.generate_markdown()
+        logging.debug("Markdown conversion via MarkdownGenerator complete.")
+        return md_content
+    return None
+
+def code_language(ext):
+    """
+    Returns the language name (via Shtype) used to convert code files with the given extension.
+    """
+    language = ext[1:]  # default to extension without dot
+    if shtype_checker is not None:
+        langs = shtype_checker.get_languages_by_extension(ext)
+        if langs:
+            language = langs[0]
+    return language
 
+def markdown_to_html(md_content):
+    """
+    Highlights code blocks with Task3Highlighter (Task 3) and converts the result to HTML with
+    markdown_renderer (Mistune by default).
+    """
     # In both cases (Markdown file or generated Markdown) we now process code blocks.
     # Task3Highlighter (Task 3) replaces fenced code blocks with HTML (using Pygments for syntax highlighting).
     if Task3Highlighter is None:
         logging.error("Task3Highlighter class not available; skipping further processing.")
         processed_md = md_content
     else:
-        highlighter = Task3Highlighter(md_content)
-        processed_md = highlighter.process()
+        with metrics.stage("highlight"):
+            highlighter = Task3Highlighter(md_content)
+            processed_md = highlighter.process()
         logging.debug("Processing with Task3Highlighter complete.")
 
-    # Finally, run the result through a Markdown-to-HTML converter (using Mistune).
-    # We disable escaping so that embedded HTML (from Task3Highlighter) isn't escaped.
-    final_html = mistune.markdown(processed_md, escape=False)
+    # Finally, run the result through a Markdown-to-HTML converter (Mistune, or the backend chosen by
+    # MARKDOWN_BACKEND), which also highlights the fenced code blocks with Pygments (see fences.py).
+    # Escaping is disabled so that embedded HTML (from Task3Highlighter) isn't escaped.
+    final_html = markdown_renderer.markdown_to_html(processed_md)
     logging.debug("Conversion to final HTML complete.")
+    return final_html
+
+def render_cached(abs_path, digest, ext, content=None):
+    """
+    Returns the final HTML body for the file content identified by digest, using the render cache
+    for both the intermediate Markdown and the HTML. The file is only read (if content is None)
+    when the Markdown has to be generated. Returns None for unsupported file types.
+    """
+    html_key = RenderCache.make_key("html", digest, render_variant(ext))
+    final_html = render_cache.get(html_key)
+    if final_html is not None:
+        return final_html
+    if renders_per_segment(ext):
+        if content is None:
+            content = sourcefile.read_text(abs_path)
+        md_content, final_html = render_code_segments(content, ext)
+        render_cache.put(RenderCache.make_key("md", digest, render_variant(ext)), md_content)
+        render_cache.put(html_key, final_html)
+        return final_html
+    md_content = markdown_cached(abs_path, digest, ext, content)
+    if md_content is None:
+        return None
+    final_html = markdown_to_html(md_content)
+    render_cache.put(html_key, final_html)
+    return final_html
+
+def render_code_segments(content, ext):
+    """
+    Renders a code file segment by segment (RENDER_PER_SEGMENT, see renderers.py). Returns
+    (Markdown, HTML).
+    """
+    md_gen = MarkdownGenerator(content, code_language(ext), hooks=hook_pipeline.compiled())
+    with metrics.stage("markdown"):
+        segments = list(md_gen.iter_segments_with_modes())
+    metrics.count("segments", len(segments))
+    return "\n\n".join(text for _, text in segments), renderers.render_segments(segments, markdown_renderer)
+
+def markdown_cached(abs_path, digest, ext, content=None):
+    """
+    Returns the Markdown for the file content identified by digest, from the render cache where
+    possible (see render_cached). Returns None for unsupported file types.
+    """
+    md_key = RenderCache.make_key("md", digest, render_variant(ext))
+    md_content = render_cache.get(md_key)
+    if md_content is None:
+        if content is None:
+            content = sourcefile.read_text(abs_path)
+        md_content = generate_markdown(content, ext)
+        if md_content is None:
+            return None
+        render_cache.put(md_key, md_content)
+    return md_content
+
+def page_variant_key(digest, ext, subpath, encoding):
+    """
+    Returns the render cache key of the page of subpath, compressed with encoding. Unlike the
+    Markdown and HTML, the page depends on the path (its title and back link).
+    """
+    return RenderCache.make_key(f"page.{encoding}", digest, f"{render_variant(ext)}:{subpath}")
+
+def store_page_variants(digest, ext, subpath, page):
+    """
+    Compresses the page (bytes) in every supported encoding and stores the variants in the render
+    cache. Returns {encoding: compressed page}.
+    """
+    with metrics.stage("compress"):
+        variants = compression.compress_variants(page)
+    for encoding, data in variants.items():
+        render_cache.put_bytes(page_variant_key(digest, ext, subpath, encoding), data)
+    return variants
+
+def encoded_page(abs_path, digest, ext, content, subpath, back_url, encoding):
+    """
+    Returns the page of the file compressed with encoding, from the render cache. On a miss the
+    page is rendered (see render_cached) and compressed in all encodings at once.
+    """
+    data = render_cache.get_bytes(page_variant_key(digest, ext, subpath, encoding))
+    if data is None:
+        final_html = render_cached(abs_path, digest, ext, content)
+        page = render_page(subpath, final_html, back_url).encode("utf-8")
+        data = store_page_variants(digest, ext, subpath, page)[encoding]
+    return data
+
+def read_file_digest(abs_path, st):
+    """
+    Returns (digest, content) for the file. The content is only read when the digest is not
+    already known for the file's current size and mtime; in that case content is None. Raises
+    sourcefile.BinaryFileError for a file that looks binary (whose digest is never remembered).
+    """
+    digest = render_cache.lookup_digest(abs_path, st)
+    if digest is not None:
+        return digest, None
+    digest, content = sourcefile.read_digest_and_text(abs_path)
+    render_cache.remember_digest(abs_path, st, digest)
+    return digest, content
+
+def resolve_file_path(subpath):
+    """
+    Returns the path of subpath in BASE_DIR, or None if it resolves (following "..", symbolic links
+    and absolute paths such as "/etc/passwd") to a place outside of BASE_DIR.
+    """
+    abs_path = os.path.join(BASE_DIR, subpath)
+    base = os.path.realpath(BASE_DIR)
+    if os.path.commonpath([base, os.path.realpath(abs_path)]) != base:
+        return None
+    return abs_path
+
+# ---------------------------------------------------------------------
+# File viewing route.
+# ---------------------------------------------------------------------
+@app.route('/view/<path:subpath>')
+def view_file(subpath):
+    render_metrics = metrics.RenderMetrics("view")
+    with metrics.recording(render_metrics), \
+            metrics.profiled(f"view/{subpath}", PROFILE_THRESHOLD_SECONDS, PROFILE_DIR):
+        response = make_response(view_file_response(subpath, render_metrics))
+    # For a streamed page, the header only covers the work done before the first piece is sent.
+    response.headers["Server-Timing"] = render_metrics.server_timing()
+    if not response.is_streamed:
+        render_metrics.bytes_out = response.content_length or 0
+        render_metrics.finish(response.status_code)
+    if response.status_code in (200, 304):
+        access_stats.record(subpath)
+    return response
+
+def view_file_response(subpath, render_metrics):
+    abs_path = resolve_file_path(subpath)
+    if abs_path is None:
+        return f"File {html.escape(subpath)} not found", 404
+    if not os.path.exists(abs_path) or not os.path.isfile(abs_path):
+        return f"File {abs_path} not found", 404
+
+    ext = os.path.splitext(abs_path)[1].lower()
+    st = os.stat(abs_path)
+    back_url = url_for('browse', subpath=os.path.dirname(subpath))
+    if st.st_size > MAX_RENDER_BYTES:
+        return view_file_lines(subpath, abs_path, ext, st, back_url, render_metrics)
+
+    if ext not in MD_EXTENSIONS and ext not in CODE_EXTENSIONS:
+        # For unsupported file types, display plain text.
+        logging.debug("File type not recognized for Markdown processing; showing plain text.")
+        if sourcefile.is_binary_file(abs_path):
+            return binary_page(subpath, st, back_url)
+        content = sourcefile.read_text(abs_path)
+        return f"<pre>{content}</pre>"
 
-    html_template = f"""
+    render_metrics.bytes_in = st.st_size
+    try:
+        with metrics.stage("read"):
+            digest, content = read_file_digest(abs_path, st)
+    except sourcefile.BinaryFileError:
+        return binary_page(subpath, st, back_url)
+    streamed = is_streamed(st.st_size, ext)
+    # Streamed pages are sent uncompressed; the others in the precompressed variant the client accepts.
+    encoding = None if streamed else compression.negotiate(request.headers.get("Accept-Encoding"))
+    etag = compression.etag_for(f"{digest[:32]}{render_variant(ext)}", encoding)
+
+    # Answer conditional requests before doing any rendering work.
+    if is_not_modified(etag, st, request.if_none_match, request.if_modified_since):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        if not streamed:
+            response.vary.add("Accept-Encoding")
+        return response
+
+    if streamed:
+        stream = iter_page_stream(abs_path, ext, content, subpath, back_url, render_metrics)
+        response = Response(stream_with_context(stream), mimetype="text/html")
+    elif encoding is not None:
+        response = make_response(encoded_page(abs_path, digest, ext, content, subpath, back_url, encoding))
+        response.headers["Content-Encoding"] = encoding
+    else:
+        final_html = render_cached(abs_path, digest, ext, content)
+        response = make_response(render_page(subpath, final_html, back_url))
+    if not streamed:
+        response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    response.last_modified = int(st.st_mtime)
+    return response
+
+def view_file_lines(subpath, abs_path, ext, st, back_url, render_metrics):
+    """
+    Returns the /view response for a huge file: the page of VIEW_PAGE_LINES lines starting at
+    ?line=N (default 1), read through the file's line index. The ETag is made from the file's size,
+    mtime and the page, since hashing the whole file for every change would defeat the paging.
+    Each page is converted on its own, with block positions counting lines from its first line, so
+    a construct spanning a page boundary (e.g. a docstring) may be shown differently.
+    """
+    if sourcefile.is_binary_file(abs_path):
+        return binary_page(subpath, st, back_url)
+    first = max(request.args.get("line", 1, type=int), 1)
+    etag = f"{st.st_size:x}-{st.st_mtime_ns:x}-{first}{render_variant(ext)}"
+    if is_not_modified(etag, st, request.if_none_match, request.if_modified_since):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    with metrics.stage("read"):
+        index = sourcefile.line_index(abs_path, st)
+        first = min(first, max(index.line_count, 1))
+        content, lines, truncated = sourcefile.read_lines(abs_path, index, first, VIEW_PAGE_LINES,
+                                                          VIEW_PAGE_MAX_BYTES)
+    render_metrics.bytes_in = len(content)
+    if ext in MD_EXTENSIONS or ext in CODE_EXTENSIONS:
+        body = markdown_to_html(generate_markdown(content, ext, first))
+    else:
+        body = f"<pre>{content}</pre>"
+    links = line_page_links(subpath, first, lines, truncated, index.line_count)
+    response = make_response(render_page(subpath, links + body + links, back_url))
+    response.set_etag(etag)
+    response.last_modified = int(st.st_mtime)
+    return response
+
+def line_page_links(subpath, first, lines, truncated, line_count):
+    """
+    Returns the navigation shown above and below a page of a huge file.
+    """
+    last = first + max(lines, 1) - 1
+    text = f"Lines {first}–{last} of {line_count}"
+    if truncated:
+        text += f" (cut off after {VIEW_PAGE_MAX_BYTES} bytes)"
+    links = [text]
+    if first > 1:
+        previous = max(first - VIEW_PAGE_LINES, 1)
+        links.append(f'<a href="{url_for("view_file", subpath=subpath, line=previous)}">Previous lines</a>')
+    if last < line_count:
+        links.append(f'<a href="{url_for("view_file", subpath=subpath, line=last + 1)}">Next lines</a>')
+    return "<p>" + " | ".join(links) + "</p>"
+
+def binary_page(subpath, st, back_url):
+    return render_page(subpath, f"<p>Binary file ({st.st_size} bytes), not shown.</p>", back_url)
+
+def is_not_modified(etag, st, if_none_match, if_modified_since):
+    """
+    Returns True if a conditional request (werkzeug ETags from If-None-Match and the datetime from
+    If-Modified-Since, or None) can be answered with 304 for the file's etag and os.stat result st.
+    """
+    if if_none_match:
+        return if_none_match.contains(etag)
+    return if_modified_since is not None and int(st.st_mtime) <= if_modified_since.timestamp()
+
+def render_page(subpath, final_html, back_url):
+    """
+    Wraps the rendered HTML of a file in the page shown by /view.
+    """
+    return page_head(subpath) + final_html + page_tail(back_url)
+
+def iter_page_stream(abs_path, ext, content, subpath, back_url, render_metrics=None):
+    """
+    Yields the /view page of a code file in pieces of about STREAM_CHUNK_BYTES characters: the page
+    head, the HTML of each Markdown segment (highlighted and converted separately), then the tail.
+    content is read from abs_path if None. If render_metrics is given, the stages are timed there
+    ("markdown" includes lexing and classification, which are interleaved when streaming) and the
+    request is finished once the page has been sent. Streamed pages are not cached (ETag/304 still
+    apply), and Markdown constructs spanning segments (e.g. reference-style links defined in another
+    comment block) are not resolved.
+    """
+    if render_metrics is None:
+        render_metrics = metrics.RenderMetrics()
+    try:
+        yield from _iter_page_pieces(abs_path, ext, content, subpath, back_url, render_metrics)
+    finally:
+        render_metrics.finish(200)
+
+def _iter_page_pieces(abs_path, ext, content, subpath, back_url, render_metrics):
+    head = page_head(subpath)
+    render_metrics.bytes_out += len(head.encode("utf-8"))
+    yield head
+    yield from iter_chunks(iter_segments_html(abs_path, ext, content, render_metrics), render_metrics)
+    tail = page_tail(back_url)
+    render_metrics.bytes_out += len(tail.encode("utf-8"))
+    yield tail
+
+def iter_segments_html(abs_path, ext, content, render_metrics):
+    """
+    Yields the HTML of each Markdown segment of a code file, highlighted and converted on its own
+    (code segments without being parsed as Markdown, see renderers.py), timing the stages in
+    render_metrics. content is read from abs_path if None.
+    """
+    if content is None:
+        content = sourcefile.read_text(abs_path)
+    md_gen = MarkdownGenerator(content, code_language(ext), hooks=hook_pipeline.compiled())
+    segments = md_gen.iter_segments_with_modes()
+    while True:
+        with metrics.recording(render_metrics), render_metrics.stage("markdown"):
+            segment = next(segments, None)
+        if segment is None:
+            break
+        render_metrics.count("segments")
+        with metrics.recording(render_metrics):
+            html_segment = renderers.segment_html(*segment, markdown_renderer)
+        yield html_segment
+
+def iter_chunks(pieces, render_metrics):
+    """
+    Joins the strings of pieces into chunks of about STREAM_CHUNK_BYTES characters, counting the
+    bytes sent in render_metrics.
+    """
+    chunk = []
+    size = 0
+    for piece in pieces:
+        chunk.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            data = "".join(chunk)
+            render_metrics.bytes_out += len(data.encode("utf-8"))
+            yield data
+            chunk = []
+            size = 0
+    if chunk:
+        data = "".join(chunk)
+        render_metrics.bytes_out += len(data.encode("utf-8"))
+        yield data
+
+def page_head(subpath):
+    return f"""
     <!DOCTYPE html>
     <html>
       <head>
         <meta charset="UTF-8">
         <title>{subpath}</title>
-        <style>
-          body {{ font-family: sans-serif; margin: 2em; }}
-          pre {{ background-color: #f5f5f5; padding: 1em; overflow-x: auto; }}
-          code {{ font-family: monospace; }}
-        </style>
+        <link rel="stylesheet" href="{STYLESHEET_URL}">
       </head>
       <body>
-        {final_html}
+        """
+
+def page_tail(back_url):
+    return f"""
         <hr>
-        <p><a href="{url_for('browse', subpath=os.path.dirname(subpath))}">Back to Directory</a></p>
+        <p><a href="{back_url}">Back to Directory</a></p>
       </body>
     </html>
     """
-    return html_template
+
+# ---------------------------------------------------------------------
+# Directory bundles: one page with every supported file under a directory, each rendered as /view
+# would; ?format=md streams the concatenated Markdown.
+# ---------------------------------------------------------------------
+@app.route('/bundle/', defaults={'subpath': ''})
+@app.route('/bundle/<path:subpath>')
+def bundle(subpath):
+    abs_dir = os.path.join(BASE_DIR, subpath)
+    if not os.path.isdir(abs_dir):
+        return f"Directory {html.escape(abs_dir)} not found", 404
+    markdown_output = request.args.get("format") == "md"
+    render_metrics = metrics.RenderMetrics("bundle")
+    stream = iter_bundle(subpath, bundle_files(abs_dir), markdown_output, render_metrics)
+    return Response(stream_with_context(stream), mimetype="text/markdown" if markdown_output else "text/html")
+
+def bundle_files(abs_dir):
+    """
+    Returns the paths (relative to abs_dir) of the Markdown and code files under abs_dir, in path
+    order: the files of a directory, then its subdirectories.
+    """
+    extensions = MD_EXTENSIONS | CODE_EXTENSIONS
+    paths = []
+    for root, dirs, files in os.walk(abs_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                paths.append(os.path.relpath(os.path.join(root, name), abs_dir))
+    return paths
+
+def iter_bundle(subpath, files, markdown_output, render_metrics):
+    """
+    Yields the /bundle page of a directory (HTML, or Markdown with markdown_output): a table of
+    contents, then the first BUNDLE_MAX_FILES files, each under a heading linking to its /view
+    page. The head is sent at once, the files in pieces of about STREAM_CHUNK_BYTES characters.
+    """
+    title = f"Bundle of /{subpath}"
+    shown = files[:BUNDLE_MAX_FILES]
+    try:
+        if markdown_output:
+            head = f"# {title}\n\n" + "".join(f"- {rel_path}\n" for rel_path in shown) + "\n"
+        else:
+            head = page_head(title) + f"<h1>{html.escape(title)}</h1><ul>" + "".join(
+                f'<li><a href="#file-{i}">{html.escape(rel_path)}</a></li>' for i, rel_path in enumerate(shown)) + "</ul>\n"
+        render_metrics.bytes_out += len(head.encode("utf-8"))
+        yield head
+        yield from iter_chunks(_iter_bundle_files(subpath, shown, markdown_output, render_metrics), render_metrics)
+        tail = ""
+        if len(files) > len(shown):
+            tail = bundle_note(f"{len(files) - len(shown)} more files not included.", markdown_output)
+        if not markdown_output:
+            tail += page_tail(url_for('browse', subpath=subpath))
+        render_metrics.bytes_out += len(tail.encode("utf-8"))
+        yield tail
+    finally:
+        render_metrics.finish(200)
+
+def _iter_bundle_files(subpath, files, markdown_output, render_metrics):
+    for i, rel_path in enumerate(files):
+        file_subpath = os.path.join(subpath, rel_path)
+        if markdown_output:
+            yield f"## {rel_path}\n\n"
+        else:
+            view_url = url_for('view_file', subpath=file_subpath)
+            yield f'<h2 id="file-{i}"><a href="{view_url}">{html.escape(rel_path)}</a></h2>\n'
+        yield from _iter_bundle_file(os.path.join(BASE_DIR, file_subpath), markdown_output, render_metrics)
+
+def _iter_bundle_file(abs_path, markdown_output, render_metrics):
+    """
+    Yields the Markdown or HTML of one file of a bundle, as /view renders it: from the render cache,
+    or segment by segment for a file that /view streams. Huge and binary files are only noted.
+    """
+    ext = os.path.splitext(abs_path)[1].lower()
+    try:
+        st = os.stat(abs_path)
+        if st.st_size > MAX_RENDER_BYTES:
+            yield bundle_note(f"Too large to include ({st.st_size} bytes), see its /view pages.", markdown_output)
+            return
+        with metrics.recording(render_metrics), render_metrics.stage("read"):
+            digest, content = read_file_digest(abs_path, st)
+    except sourcefile.BinaryFileError:
+        yield bundle_note(f"Binary file ({st.st_size} bytes), not shown.", markdown_output)
+        return
+    except OSError as e:
+        # Removed or unreadable since the directory was walked.
+        yield bundle_note(f"Not readable: {e.strerror}.", markdown_output)
+        return
+    render_metrics.bytes_in += st.st_size
+    streamed = is_streamed(st.st_size, ext)
+    if streamed and markdown_output:
+        if content is None:
+            content = sourcefile.read_text(abs_path)
+        md_gen = MarkdownGenerator(content, code_language(ext), hooks=hook_pipeline.compiled())
+        for segment in md_gen.iter_segments():
+            yield segment + "\n\n"
+    elif streamed:
+        yield from iter_segments_html(abs_path, ext, content, render_metrics)
+    else:
+        with metrics.recording(render_metrics):
+            if markdown_output:
+                piece = markdown_cached(abs_path, digest, ext, content) + "\n\n"
+            else:
+                piece = render_cached(abs_path, digest, ext, content) + "\n"
+        yield piece
+
+def bundle_note(text, markdown_output):
+    return f"_{text}_\n\n" if markdown_output else f"<p><em>{html.escape(text)}</em></p>\n"
+
+# ---------------------------------------------------------------------
+# Search (see searchindex.py).
+# ---------------------------------------------------------------------
+def search_segments(abs_path, ext):
+    """
+    Returns the segments of a file for the search index, as [(kind, first line, text)]: for code
+    files, the MarkdownGenerator segments ("prose" for comments shown as Markdown, "code" for code
+    with the comments kept in it; the pre-parse hooks are not applied), for Markdown files their
+    paragraphs ("prose") and fenced blocks ("code"). Raises sourcefile.BinaryFileError for a binary
+    file.
+    """
+    _, content = sourcefile.read_digest_and_text(abs_path)
+    if ext in CODE_EXTENSIONS and MarkdownGenerator is not None:
+        md_gen = MarkdownGenerator(content, code_language(ext))
+        segments = [("prose" if mode == "markdown" else "code", tokens[0].line, "\n".join(tok.content for tok in tokens))
+                    for mode, tokens in md_gen.iter_token_segments()]
+        return [segment for segment in segments if segment[2].strip()]
+    return markdown_segments(content)
+
+def markdown_segments(content):
+    """
+    Splits Markdown into its paragraphs ("prose") and fenced code blocks ("code"), as
+    [(kind, first line, text)].
+    """
+    segments = []
+    lines = []
+    first = 1
+    in_fence = False
+    for number, line in enumerate(content.split("\n"), 1):
+        fence = line.lstrip().startswith(("```", "~~~"))
+        if fence or (not in_fence and not line.strip()):
+            if lines:
+                segments.append(("code" if in_fence else "prose", first, "\n".join(lines)))
+                lines = []
+            if fence:
+                in_fence = not in_fence
+            continue
+        if not lines:
+            first = number
+        lines.append(line)
+    if lines:
+        segments.append(("code" if in_fence else "prose", first, "\n".join(lines)))
+    return segments
+
+search_index = SearchIndex(search_segments, MD_EXTENSIONS | CODE_EXTENSIONS, path=SEARCH_INDEX_PATH,
+                           refresh_seconds=SEARCH_REFRESH_SECONDS, max_file_bytes=SEARCH_MAX_FILE_BYTES)
+
+if SEARCH_INDEX_ON_STARTUP:
+    search_index.start(BASE_DIR)
+
+# Files whose segments contain all the words of q (&in=prose|code|all; &format=json for JSON).
+@app.route('/search')
+def search():
+    query = request.args.get("q", "")
+    kind = request.args.get("in", "all")
+    if kind != "all" and kind not in KINDS:
+        return f"Unknown segment kind {html.escape(kind)}", 400
+    render_metrics = metrics.RenderMetrics("search")
+    # The index is built and refreshed in the background; until its first pass over the tree is
+    # done, queries see the files indexed so far.
+    search_index.start(BASE_DIR)
+    complete = search_index.is_ready(BASE_DIR)
+    results = []
+    if query.strip() and search_index.base_dir == BASE_DIR:
+        with metrics.recording(render_metrics), metrics.stage("query"):
+            results = search_index.search(query, None if kind == "all" else kind, SEARCH_MAX_RESULTS)
+    if request.args.get("format") == "json":
+        response = jsonify({"query": query, "in": kind, "complete": complete, "results": results})
+    else:
+        response = make_response(search_page(query, kind, results, complete))
+    response.headers["Server-Timing"] = render_metrics.server_timing()
+    render_metrics.finish(response.status_code)
+    return response
+
+def search_page(query, kind, results, complete=True):
+    """
+    Returns the /search page: the search form and the matching files, each with the first
+    SEARCH_MAX_SNIPPETS matching segments (line number and the first line containing a word), and
+    a note if the index is still being built (complete is False).
+    """
+    options = "".join(f'<option value="{value}"{" selected" if value == kind else ""}>{value}</option>'
+                      for value in ("all",) + KINDS)
+    body = [f'<h1>Search</h1><form action="{url_for("search")}">'
+            f'<input name="q" value="{html.escape(query)}"> in <select name="in">{options}</select> '
+            f'<button>Search</button></form>']
+    if query.strip():
+        if not complete:
+            body.append("<p><em>The search index is still being built; the results may be incomplete.</em></p>")
+        body.append(f"<p>{len(results)} files found.</p><ul>")
+        for result in results:
+            view_url = url_for('view_file', subpath=result["path"])
+            snippets = "".join(f'<li>line {segment["line"]} ({segment["kind"]}): <code>{html.escape(segment["snippet"])}</code></li>'
+                               for segment in result["segments"][:SEARCH_MAX_SNIPPETS])
+            more = len(result["segments"]) - SEARCH_MAX_SNIPPETS
+            if more > 0:
+                snippets += f"<li>and {more} more segments</li>"
+            body.append(f'<li><a href="{view_url}">{html.escape(result["path"])}</a><ul>{snippets}</ul></li>')
+        body.append("</ul>")
+    return render_page("Search", "\n".join(body), url_for('browse', subpath=''))
+
+# ---------------------------------------------------------------------
+# Style sheet of the /view pages.
+# ---------------------------------------------------------------------
+@app.route('/assets/page.<fingerprint>.css')
+def stylesheet(fingerprint):
+    response = Response(PAGE_STYLESHEET, mimetype="text/css")
+    if fingerprint == STYLESHEET_FINGERPRINT:
+        response.headers["Cache-Control"] = f"public, max-age={STYLESHEET_MAX_AGE}, immutable"
+    else:
+        # A page cached before the style sheet changed: serve the current one, but do not keep it.
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# ---------------------------------------------------------------------
+# Render cache statistics (counters as JSON).
+# ---------------------------------------------------------------------
+@app.route('/cache/stats')
+def cache_stats():
+    stats = render_cache.get_stats()
+    stats["listings"] = listing_cache.get_stats()
+    stats["fences"] = fences.get_stats()
+    stats["search"] = search_index.get_stats()
+    if shared_cache is not None:
+        stats["shared"] = shared_cache.get_stats()
+    return jsonify(stats)
+
+# ---------------------------------------------------------------------
+# Instrumentation (see metrics.py).
+# ---------------------------------------------------------------------
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.registry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# ---------------------------------------------------------------------
+# Cache warm-up (see warmup.py).
+# ---------------------------------------------------------------------
+def warm_path(subpath):
+    """
+    Renders the /view page of subpath through view_file_response, as for a reader accepting the
+    supported encodings, so that everything a request would cache is cached. Returns "warmed",
+    "skipped" for pages that are not cached (streamed, paged or not rendered files) or an error.
+    """
+    abs_path = os.path.join(BASE_DIR, subpath)
+    if not os.path.isfile(abs_path):
+        return "not found"
+    ext = os.path.splitext(abs_path)[1].lower()
+    size = os.path.getsize(abs_path)
+    if ext not in MD_EXTENSIONS and ext not in CODE_EXTENSIONS or size > MAX_RENDER_BYTES \
+            or is_streamed(size, ext):
+        return "skipped"
+    with app.test_request_context():
+        url = url_for('view_file', subpath=subpath)
+    with app.test_request_context(url, headers={"Accept-Encoding": ", ".join(compression.ENCODINGS)}):
+        response = make_response(view_file_response(subpath, metrics.RenderMetrics("warmup")))
+    response.close()
+    return "warmed" if response.status_code == 200 else f"HTTP {response.status_code}"
+
+def hot_paths(limit, source="auto"):
+    """
+    Returns up to limit paths to warm, from WARMUP_PATHS_FILE ("file"), the access statistics
+    ("stats"), or the file if one is configured and the statistics otherwise ("auto").
+    """
+    if source == "file" or source == "auto" and WARMUP_PATHS_FILE is not None:
+        if WARMUP_PATHS_FILE is None:
+            return []
+        try:
+            return read_paths_file(WARMUP_PATHS_FILE)[:limit]
+        except OSError as e:
+            logging.error(f"Could not read the warm-up paths {WARMUP_PATHS_FILE}: {e}")
+            return []
+    return access_stats.most_common(limit)
+
+warmer = Warmer(warm_path, workers=WARMUP_WORKERS, nice=WARMUP_NICE)
+
+# Live requests pause the warm-up between paths. Request contexts made with test_request_context
+# (the warm-up's own, url_for outside of requests) are torn down without having started.
+@app.before_request
+def warmer_request_started():
+    warmer.request_started()
+    g.warmer_request = True
+
+@app.teardown_request
+def warmer_request_finished(exc):
+    if g.pop("warmer_request", False):
+        warmer.request_finished()
+
+@app.route('/admin/warmup', methods=["GET", "POST"])
+def warmup():
+    """
+    GET: progress of the current (or last) warm-up. POST: starts one (form fields source, "auto",
+    "file" or "stats", and limit) or, with cancel=1, cancels it.
+    """
+    if request.method == "POST":
+        if request.form.get("cancel"):
+            warmer.cancel()
+            return jsonify(warmer.status())
+        paths = hot_paths(request.form.get("limit", WARMUP_LIMIT, type=int), request.form.get("source", "auto"))
+        if not warmer.start(paths):
+            return jsonify(warmer.status()), 409
+        return jsonify(warmer.status()), 202
+    return jsonify(warmer.status())
+
+if WARMUP_ON_STARTUP:
+    warmer.start(hot_paths(WARMUP_LIMIT))
 
 # ---------------------------------------------------------------------
 # Hook management endpoint.
 # ---------------------------------------------------------------------
 @app.route('/hooks/add', methods=["POST"])
 def add_hook():
-    hook_name = request.form.get("name", "UnnamedHook")
-    def new_hook(blocks):
-        app.logger.debug(f"Hook {hook_name} called with {len(blocks)} blocks.")
-        # Optionally modify blocks here.
-        return blocks
-    pre_parse_hooks.append(new_hook)
+    """
+    Registers one of the hook functions of hooks.HOOK_FUNCTIONS (form field "function", by default
+    "log", which leaves the blocks unchanged) under a name, for the given block types.
+    """
+    # Hook names appear in Server-Timing and metric labels: keep them to word characters and "-".
+    hook_name = re.sub(r"[^\w-]", "_", request.form.get("name", "UnnamedHook"))
+    function = HOOK_FUNCTIONS.get(request.form.get("function", "log"))
+    if function is None:
+        return f"Unknown hook function; expected one of {', '.join(sorted(HOOK_FUNCTIONS))}", 400
+    types = [t.strip() for t in request.form.get("types", ",".join(BLOCK_TYPES)).split(",") if t.strip()]
+    try:
+        hook_pipeline.add(BlockHook(hook_name, function, types))
+    except ValueError as e:
+        return html.escape(str(e)), 400
     return f"Added hook {hook_name}", 200
 
 # ---------------------------------------------------------------------
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+asgi.py – ASGI entry point for the code browser, with CPU-bound rendering offloaded to processes.
+
+Run it with any ASGI server, e.g. "uvicorn asgi:application". /view/<path> is rendered in a bounded
+process pool (RENDER_WORKERS); all other routes are handed to the Flask app of app.py.
+"""
+
+import io
+import os
+import sys
+import html
+import json
+import asyncio
+import itertools
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.http import parse_etags, parse_date, http_date, quote_etag
+
+import app as webapp
+import metrics
+import sourcefile
+import compression
+from rendercache import RenderCache
+
+# Render pool settings: a request waits at most RENDER_TIMEOUT seconds for its render (then 504;
+# the render continues and fills the cache), and beyond MAX_PENDING_RENDERS distinct pending
+# renders requests get 503 instead of queueing without bound.
+RENDER_WORKERS = os.cpu_count() or 1
+RENDER_TIMEOUT = 30.0
+MAX_PENDING_RENDERS = 64
+
+# Chunks of a Flask response produced ahead of the client (see send_flask_response).
+WSGI_QUEUE_CHUNKS = 8
+
+
+_worker_hooks = None  # key of the hooks a worker process last installed
+
+
+def use_hooks(hooks):
+    """
+    Installs hooks (a list of BlockHook) as app.hook_pipeline of a worker process.
+    """
+    global _worker_hooks
+    key = tuple((hook.name, hook.version, tuple(sorted(hook.types)), hook.function) for hook in hooks)
+    if key != _worker_hooks:
+        webapp.hook_pipeline.replace(hooks)
+        _worker_hooks = key
+
+
+def render_in_worker(abs_path, ext, content, md_content, hooks=None):
+    """
+    Runs in a worker process: renders a file (content, or read from abs_path if None) to HTML,
+    starting from md_content if the Markdown is already known (code files rendered segment by
+    segment always start from content, see app.render_code_segments). Returns (Markdown, HTML, metrics),
+    with (None, None, metrics) for unsupported file types; metrics are the stage timings and counts
+    (metrics.RenderMetrics.as_dict()). hooks, if not None, replace the pre-parse hooks first.
+    """
+    if hooks is not None:
+        use_hooks(hooks)
+    render_metrics = metrics.RenderMetrics()
+    with metrics.recording(render_metrics):
+        if webapp.renders_per_segment(ext):
+            if content is None:
+                content = sourcefile.read_text(abs_path)
+            md_content, final_html = webapp.render_code_segments(content, ext)
+            return md_content, final_html, render_metrics.as_dict()
+        if md_content is None:
+            if content is None:
+                content = sourcefile.read_text(abs_path)
+            md_content = webapp.generate_markdown(content, ext)
+            if md_content is None:
+                return None, None, render_metrics.as_dict()
+        return md_content, webapp.markdown_to_html(md_content), render_metrics.as_dict()
+
+
+class Overloaded(Exception):
+    """Raised when MAX_PENDING_RENDERS renders are already pending."""
+
+
+class RenderPool:
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, max_pending=MAX_PENDING_RENDERS):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._executor = None
+        # (digest, ext) -> asyncio.Task of the running render: concurrent requests for the same
+        # content share one render.
+        self._pending = {}
+        self.stats = {"renders": 0, "coalesced": 0, "timeouts": 0, "rejected": 0, "errors": 0, "in_process": 0}
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["pending"] = len(self._pending)
+        stats["workers"] = self.workers
+        return stats
+
+    async def render(self, abs_path, digest, ext, content=None):
+        """
+        Returns (final HTML, metrics) for the file content identified by digest, like
+        app.render_cached, but rendering in the process pool; metrics are the stage timings of the
+        render (see render_in_worker), shared by coalesced requests, or None for a cache hit.
+        Raises Overloaded or asyncio.TimeoutError.
+        """
+        loop = asyncio.get_running_loop()
+        html_key = RenderCache.make_key("html", digest, webapp.render_variant(ext))
+        final_html = await loop.run_in_executor(None, webapp.render_cache.get, html_key)
+        if final_html is not None:
+            return final_html, None
+        key = (digest, ext, webapp.render_variant(ext))
+        task = self._pending.get(key)
+        if task is None:
+            if len(self._pending) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise Overloaded()
+            task = asyncio.ensure_future(self._render(key, abs_path, content))
+            self._pending[key] = task
+        else:
+            self.stats["coalesced"] += 1
+        try:
+            # shield: a timed-out request must not cancel the render shared with others.
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+
+    async def _render(self, key, abs_path, content):
+        digest, ext, variant = key
+        loop = asyncio.get_running_loop()
+        md_key = RenderCache.make_key("md", digest, variant)
+        html_key = RenderCache.make_key("html", digest, variant)
+        try:
+            md_content = await loop.run_in_executor(None, webapp.render_cache.get, md_key)
+            self.stats["renders"] += 1
+            # The hooks are sent with each render and installed in the worker.
+            if webapp.hook_pipeline.is_portable():
+                executor, hooks = self.executor, webapp.hook_pipeline.hooks()
+            else:
+                # Hook functions which cannot be pickled only exist in this process.
+                executor, hooks = None, None
+                self.stats["in_process"] += 1
+            md_content, final_html, render_metrics = await loop.run_in_executor(
+                executor, render_in_worker, abs_path, ext, content, md_content, hooks)
+            if final_html is not None:
+                webapp.render_cache.put(md_key, md_content)
+                webapp.render_cache.put(html_key, final_html)
+            return final_html, render_metrics
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            del self._pending[key]
+
+
+render_pool = RenderPool()
+
+
+# ---------------------------------------------------------------------
+# Responses.
+# ---------------------------------------------------------------------
+async def send_response(send, status, body, headers=(), content_type="text/html; charset=utf-8"):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    raw_headers = [(b"content-type", content_type.encode("latin-1")),
+                   (b"content-length", str(len(body)).encode("latin-1"))]
+    raw_headers += [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def request_headers(scope):
+    """
+    Returns the request headers as a dict of lowercase name -> value (str).
+    """
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+# ---------------------------------------------------------------------
+# /view/<path>
+# ---------------------------------------------------------------------
+def back_url(subpath):
+    with webapp.app.test_request_context():
+        return webapp.url_for("browse", subpath=os.path.dirname(subpath))
+
+
+async def view_file(scope, send, subpath):
+    render_metrics = metrics.RenderMetrics("view")
+    status = 500
+    # As in the Flask app: live requests pause the warm-up, and views are counted for its ranking.
+    webapp.warmer.request_started()
+    try:
+        status = await view_file_response(scope, send, subpath, render_metrics)
+    finally:
+        webapp.warmer.request_finished()
+        if status is not None:
+            render_metrics.finish(status)
+    if status in (200, 304):
+        webapp.access_stats.record(subpath)
+
+
+async def view_file_response(scope, send, subpath, render_metrics):
+    """
+    Sends the response for /view/<subpath>; returns its status code (None if the Flask app handled
+    the request, which records its metrics itself).
+    """
+    loop = asyncio.get_running_loop()
+    abs_path = webapp.resolve_file_path(subpath)
+    if abs_path is None:
+        await send_response(send, 404, f"File {html.escape(subpath)} not found")
+        return 404
+    if not os.path.isfile(abs_path):
+        await send_response(send, 404, f"File {abs_path} not found")
+        return 404
+
+    ext = os.path.splitext(abs_path)[1].lower()
+    st = await loop.run_in_executor(None, os.stat, abs_path)
+    if st.st_size > webapp.MAX_RENDER_BYTES or webapp.is_streamed(st.st_size, ext):
+        # Pages of huge files are cheap to render (see sourcefile.py) and large files are streamed
+        # segment by segment as they are converted; the Flask app serves both.
+        await send_flask_response(scope, send, b"")
+        return None
+    if ext not in webapp.MD_EXTENSIONS and ext not in webapp.CODE_EXTENSIONS:
+        # For unsupported file types, display plain text.
+        if await loop.run_in_executor(None, sourcefile.is_binary_file, abs_path):
+            await send_response(send, 200, webapp.binary_page(subpath, st, back_url(subpath)))
+            return 200
+        content = await loop.run_in_executor(None, sourcefile.read_text, abs_path)
+        await send_response(send, 200, f"<pre>{content}</pre>")
+        return 200
+
+    render_metrics.bytes_in = st.st_size
+    try:
+        with render_metrics.stage("read"):
+            digest, content = await loop.run_in_executor(None, webapp.read_file_digest, abs_path, st)
+    except sourcefile.BinaryFileError:
+        await send_response(send, 200, webapp.binary_page(subpath, st, back_url(subpath)))
+        return 200
+    headers = request_headers(scope)
+    encoding = compression.negotiate(headers.get("accept-encoding"))
+    etag = compression.etag_for(f"{digest[:32]}{webapp.render_variant(ext)}", encoding)
+    if_none_match = parse_etags(headers.get("if-none-match"))
+    if_modified_since = parse_date(headers.get("if-modified-since"))
+    validators = [("ETag", quote_etag(etag)), ("Vary", "Accept-Encoding"),
+                  ("Last-Modified", http_date(int(st.st_mtime)))]
+    if webapp.is_not_modified(etag, st, if_none_match, if_modified_since):
+        await send_response(send, 304, b"", validators[:2])
+        return 304
+    if encoding is not None:
+        validators.append(("Content-Encoding", encoding))
+        variant_key = webapp.page_variant_key(digest, ext, subpath, encoding)
+        page = await loop.run_in_executor(None, webapp.render_cache.get_bytes, variant_key)
+        if page is not None:
+            render_metrics.bytes_out = len(page)
+            await send_response(send, 200, page, validators + [("Server-Timing", render_metrics.server_timing())])
+            return 200
+
+    try:
+        final_html, worker_metrics = await render_pool.render(abs_path, digest, ext, content)
+    except Overloaded:
+        await send_response(send, 503, "Server busy, try again later", [("Retry-After", "1")])
+        return 503
+    except asyncio.TimeoutError:
+        await send_response(send, 504, "Rendering timed out, try again later", [("Retry-After", "5")])
+        return 504
+    except Exception:
+        logging.exception(f"Rendering {abs_path} failed")
+        await send_response(send, 500, "Rendering failed")
+        return 500
+    if worker_metrics is not None:
+        # Stage timings measured in the worker process; aggregated at /metrics by the Flask app.
+        render_metrics.merge(worker_metrics)
+    page = webapp.render_page(subpath, final_html, back_url(subpath)).encode("utf-8")
+    if encoding is not None:
+        # Compressing a large page takes a while: not on the event loop.
+        with render_metrics.stage("compress"):
+            variants = await loop.run_in_executor(None, webapp.store_page_variants, digest, ext, subpath, page)
+        page = variants[encoding]
+    render_metrics.bytes_out = len(page)
+    await send_response(send, 200, page, validators + [("Server-Timing", render_metrics.server_timing())])
+    return 200
+
+
+# ---------------------------------------------------------------------
+# WSGI bridge for the Flask routes.
+# ---------------------------------------------------------------------
+def call_wsgi(wsgi_app, scope, body):
+    """
+    Calls a WSGI application for an ASGI HTTP scope; returns (status code, headers, response
+    iterable). The caller iterates the response (see send_flask_response) and closes it.
+    """
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name, value = raw_name.decode("latin-1").lower(), raw_value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length":  # the body has been read already
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = headers
+
+    chunks = wsgi_app(environ, start_response)
+    if "status" not in response:
+        # start_response may be deferred until the first chunk is produced.
+        chunks = iter(chunks)
+        first = next(chunks, b"")
+        chunks = itertools.chain((first,), chunks)
+    return response["status"], response["headers"], chunks
+
+
+async def call_flask(scope, receive, send):
+    body = await read_body(receive)
+    await send_flask_response(scope, send, body)
+
+
+async def send_flask_response(scope, send, body):
+    """
+    Handles the request with the Flask app and sends its response chunk by chunk as the app produces
+    them (streamed pages stay streamed); returns the status. The app runs and is iterated in one
+    thread, as under a WSGI server, at most WSGI_QUEUE_CHUNKS chunks ahead of the client.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=WSGI_QUEUE_CHUNKS)
+    stopped = threading.Event()
+
+    def put(item):
+        if not stopped.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        try:
+            status, headers, chunks = call_wsgi(webapp.app, scope, body)
+            put(("start", (status, headers)))
+            try:
+                for chunk in chunks:
+                    if stopped.is_set():
+                        break
+                    if chunk:
+                        put(("body", chunk))
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+            put(("end", None))
+        except BaseException as e:
+            put(("error", e))
+
+    producer = loop.run_in_executor(None, produce)
+    status = None
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "error":
+                raise value
+            if kind == "start":
+                status, headers = value
+                raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+                await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+            elif kind == "body":
+                await send({"type": "http.response.body", "body": value, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": b""})
+                return status
+    finally:
+        # Unblock and stop the producer if the client went away.
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
+
+
+# ---------------------------------------------------------------------
+# ASGI application.
+# ---------------------------------------------------------------------
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            render_pool.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def without_body(send):
+    """
+    Wraps send for a HEAD request: the headers are sent, the body is not.
+    """
+    async def send_head(message):
+        if message["type"] == "http.response.body":
+            if message.get("more_body", False):
+                return
+            message = {"type": "http.response.body", "body": b""}
+        await send(message)
+    return send_head
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    if scope["method"] == "HEAD":
+        send = without_body(send)
+    path = scope["path"]
+    if path.startswith("/view/") and scope["method"] in ("GET", "HEAD"):
+        await read_body(receive)
+        # ASGI paths are already percent-decoded.
+        await view_file(scope, send, path[len("/view/"):])
+    elif path == "/render/stats":
+        await read_body(receive)
+        await send_response(send, 200, json.dumps(render_pool.get_stats()), content_type="application/json")
+    else:
+        await call_flask(scope, receive, send)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+bench_classify_modes.py – Microbenchmark for MarkdownGenerator.classify_modes().
+
+The former implementation walked up and down from every code token through the adjacent
+comment runs (O(n·k) for comment runs of length k). It is kept here as reference_classify_modes()
+and timed against the current two-sweep implementation on a 100k-line token sequence which
+alternates code lines with long comment banners (tests/test_code2md.py checks that both agree).
+
+Usage:
+    python benchmarks/bench_classify_modes.py [--lines 100000] [--banner 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from code2md import MarkdownGenerator, LineToken
+
+
+def reference_classify_modes(tokens):
+    """
+    The original propagation: for every code token, walk up and down through comment tokens.
+    """
+    for tok in tokens:
+        tok["mode"] = "code" if tok["token_type"] == "code" else "markdown"
+    n = len(tokens)
+    for i, tok in enumerate(tokens):
+        if tok["mode"] == "code":
+            j = i - 1
+            while j >= 0 and tokens[j]["token_type"] == "comment":
+                tokens[j]["mode"] = "code"
+                j -= 1
+            k = i + 1
+            while k < n and tokens[k]["token_type"] == "comment":
+                tokens[k]["mode"] = "code"
+                k += 1
+    return tokens
+
+
+def make_tokens(types):
+    return [LineToken(t, t, i + 1, 1) for i, t in enumerate(types)]
+
+
+def banner_types(lines, banner):
+    """
+    Alternates one code line with a comment banner of the given length.
+    """
+    types = []
+    while len(types) < lines:
+        types.append("code")
+        types.extend(["comment"] * banner)
+    return types[:lines]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--lines", type=int, default=100000)
+    argparser.add_argument("--banner", type=int, default=200)
+    args = argparser.parse_args()
+
+    types = banner_types(args.lines, args.banner)
+    generator = MarkdownGenerator("", "python")
+    for name, classify in (("two-sweep", generator.classify_modes),
+                           ("reference", reference_classify_modes)):
+        tokens = make_tokens(types)
+        start = time.perf_counter()
+        classify(tokens)
+        elapsed = time.perf_counter() - start
+        print(f"{name:10}: {elapsed * 1000:.1f} ms for {args.lines} lines (banner {args.banner})")
+
+
+if __name__ == "__main__":
+    main()
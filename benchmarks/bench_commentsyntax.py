@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+bench_commentsyntax.py – Effect of the per-language comment markers (commentsyntax.py).
+
+For the suite's 10k-line samples (Python, JavaScript, C, Go, Java), the Markdown of MarkdownGenerator
+is made twice: with the language's comment syntax, and with the former fixed "#" marker
+(commentsyntax.DEFAULT). For each, the share of the output inside code fences and the time to render
+it as a page (fences.markdown_to_html, which highlights every fence) are shown.
+
+The cost of recognizing comment lines is measured separately, on the lines of the C sample:
+
+  • CommentSyntax.marker(): one slice per marker length, looked up in a set;
+  • a chain of startswith() calls, one per marker;
+  • a regular expression of the markers.
+
+Usage:
+    python benchmarks/bench_commentsyntax.py [--repeat 3]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import suite
+import fences
+import commentsyntax
+from code2md import MarkdownGenerator
+
+SAMPLES = ("python-10k", "javascript-10k", "c-10k", "go-10k", "java-10k")
+
+
+def markdown_of(sample, language, comments=None):
+    md_gen = MarkdownGenerator(sample, language)
+    if comments is not None:
+        md_gen.comments = comments
+    return md_gen.generate_markdown()
+
+
+def fenced_share(markdown):
+    """
+    The share of the lines of markdown inside code fences.
+    """
+    lines = markdown.split("\n")
+    inside = fenced = 0
+    for line in lines:
+        if line.startswith("```"):
+            inside = not inside
+        elif inside:
+            fenced += 1
+    return fenced / max(len(lines), 1)
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        fences.fence_cache.clear()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    print(f"{'sample':16} {'markers':24} {'fenced':>14} {'page render (ms)':>22}")
+    for name in SAMPLES:
+        _, language, sample = suite.make_sample(name)
+        current = markdown_of(sample, language)
+        former = markdown_of(sample, language, commentsyntax.DEFAULT)
+        syntax = commentsyntax.for_language(language)
+        markers = " ".join(syntax.line + tuple(opener for opener, _ in syntax.block))
+        former_time = best_time(lambda: fences.markdown_to_html(former), args.repeat)
+        current_time = best_time(lambda: fences.markdown_to_html(current), args.repeat)
+        print(f"{name:16} {markers:24} {fenced_share(former):6.0%} -> {fenced_share(current):4.0%}"
+              f" {former_time * 1000:10.1f} -> {current_time * 1000:7.1f}")
+
+    _, language, sample = suite.make_sample("c-10k")
+    syntax = commentsyntax.for_language(language)
+    lines = [line.lstrip() for line in sample.split("\n")] * 10
+    starts = syntax.line + tuple(opener for opener, _ in syntax.block) + syntax.closers + syntax.continuation
+    match = re.compile("|".join(re.escape(marker) for marker in sorted(starts, key=len, reverse=True))).match
+    marker = syntax.marker  # bound once, as MarkdownGenerator.append_block_tokens does
+    timings = [
+        ("CommentSyntax.marker()", lambda: [marker(line) is not None for line in lines]),
+        ("startswith() chain", lambda: [any(line.startswith(marker) for marker in starts) for line in lines]),
+        ("regular expression", lambda: [match(line) is not None for line in lines]),
+    ]
+    print(f"\nComment lines of {len(lines)} C lines (markers {' '.join(starts)}):")
+    for label, function in timings:
+        print(f"  {label:24} {best_time(function, args.repeat) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+bench_compression.py – Response size and server CPU of /view pages, before and after precompressed
+pages and the fingerprinted style sheet (compression.py, app.STYLESHEET_URL).
+
+For the suite's samples (and any files given), with the rendered HTML already cached:
+
+  • Size: the former page (an inline <style> block, sent uncompressed; reference_page()), the page
+    now without compression, and its gzip and Brotli variants (Brotli only with the brotli package).
+  • CPU per request (time.process_time, through the Flask test client): the uncompressed page, a
+    precompressed variant from the cache, and compressing the page on every request instead (what
+    a compressing proxy or middleware would spend), plus the one-time cost of producing the variants.
+
+Usage:
+    python benchmarks/bench_compression.py [paths ...] [--repeat 50]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import suite
+import compression
+import app as webapp
+
+SAMPLES = ["tiny", "python-10k", "javascript-10k", "c-10k", "go-10k", "java-10k"]
+
+REFERENCE_STYLE = """        <style>
+          body { font-family: sans-serif; margin: 2em; }
+          pre { background-color: #f5f5f5; padding: 1em; overflow-x: auto; }
+          code { font-family: monospace; }
+        </style>
+"""
+
+
+def reference_page(page):
+    """
+    The former page: the current one with the inline <style> block instead of the style sheet link.
+    """
+    return page.replace(f'        <link rel="stylesheet" href="{webapp.STYLESHEET_URL}">\n', REFERENCE_STYLE)
+
+
+def cpu_per_call(function, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        function()
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("paths", nargs="*", help="files to measure as well (copied into the served tree)")
+    argparser.add_argument("--repeat", type=int, default=50)
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    root = tempfile.mkdtemp(prefix="bench-compression-")
+    try:
+        names = []
+        for name in SAMPLES:
+            ext, _, code = suite.make_sample(name)
+            with open(os.path.join(root, name + ext), "w", encoding="utf-8") as f:
+                f.write(code)
+            names.append(name + ext)
+        for path in args.paths:
+            shutil.copy(path, root)
+            names.append(os.path.basename(path))
+        webapp.BASE_DIR = root
+        client = webapp.app.test_client()
+        print(f"encodings: {', '.join(compression.ENCODINGS)}")
+        print(f"{'file':<22} {'before':>9} {'now':>9} {'gzip':>9} {'br':>9}   "
+              f"{'plain ms':>8} {'cached ms':>9} {'per-req ms':>10} {'once ms':>8}")
+        for name in names:
+            url = f"/view/{name}"
+            page = client.get(url).get_data()  # renders and caches the HTML
+            before = len(reference_page(page.decode("utf-8")).encode("utf-8"))
+            start = time.process_time()
+            variants = webapp.store_page_variants("bench", "", name, page)
+            once = time.process_time() - start
+            client.get(url, headers={"Accept-Encoding": "gzip"})  # fills the variants of the page
+            plain = cpu_per_call(lambda: client.get(url), args.repeat)
+            cached = cpu_per_call(lambda: client.get(url, headers={"Accept-Encoding": "gzip"}), args.repeat)
+            per_request = plain + cpu_per_call(lambda: compression.compress(page, "gzip"), args.repeat)
+            br = f"{len(variants['br']):>9}" if "br" in variants else f"{'-':>9}"
+            print(f"{name:<22} {before:>9} {len(page):>9} {len(variants['gzip']):>9} {br}   "
+                  f"{plain * 1000:>8.2f} {cached * 1000:>9.2f} {per_request * 1000:>10.2f} {once * 1000:>8.1f}")
+        stylesheet = client.get(webapp.STYLESHEET_URL)
+        print(f"style sheet: {len(stylesheet.get_data())} bytes, Cache-Control: {stylesheet.headers['Cache-Control']}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+bench_fences.py – Cost of highlighting the fenced code blocks of Markdown documents (fences.py).
+
+A Markdown document with --fences fences (in several languages, --distinct different snippets, so
+snippets repeat as they do in documentation) is converted to HTML:
+
+  • Mistune only: the former conversion, without highlighting;
+  • naive: Mistune, then every fence highlighted on its own (lexer looked up by name and a formatter
+    made for each fence, no memoization); reference_naive() below;
+  • fences.py, cold: lexers resolved once, repeated snippets highlighted once (empty fence cache);
+  • fences.py, warm: a second document sharing the snippets (everything from the fence cache);
+  • with --workers N also cold with the process pool (POOL_WORKERS = N).
+
+tests/test_fences.py checks that both give the same HTML.
+
+Usage:
+    python benchmarks/bench_fences.py [--fences 500] [--distinct 100] [--workers 0]
+"""
+
+import os
+import re
+import sys
+import html
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mistune
+from pygments import highlight
+from pygments.lexers import get_lexer_by_name
+from pygments.formatters import HtmlFormatter
+
+import fences
+
+SNIPPETS = {
+    "python": ("def f{n}(items):\n    # Sum the items.\n    total = 0\n    for item in items:\n"
+               "        total += item * {n}\n    return total\n"),
+    "javascript": ("function f{n}(items) {{\n  // Sum the items.\n"
+                   "  return items.reduce((a, b) => a + b * {n}, 0);\n}}\n"),
+    "go": ("func f{n}(items []int) int {{\n\t// Sum the items.\n\ttotal := 0\n"
+           "\tfor _, item := range items {{\n\t\ttotal += item * {n}\n\t}}\n\treturn total\n}}\n"),
+    "c": ("int f{n}(const int *items, int count) {{\n    /* Sum the items. */\n    int total = 0;\n"
+          "    for (int i = 0; i < count; i++) total += items[i] * {n};\n    return total;\n}}\n"),
+}
+
+FENCE = re.compile(r'<pre><code class="language-(\w+)">(.*?)</code></pre>', re.S)
+
+
+def make_document(count, distinct, seed):
+    rng = random.Random(seed)
+    languages = sorted(SNIPPETS)
+    parts = ["# Examples\n"]
+    for i in range(count):
+        n = rng.randrange(distinct)
+        language = languages[n % len(languages)]
+        code = SNIPPETS[language].format(n=n)
+        parts.append(f"Example {i}, a function in {language}:\n\n```{language}\n{code}```\n")
+    return "\n".join(parts)
+
+
+def reference_naive(text):
+    """
+    Mistune, then each fence highlighted separately, the way a per-fence Pygments call would.
+    """
+    def replace(m):
+        lexer = get_lexer_by_name(m.group(1), stripnl=False)
+        code = highlight(html.unescape(m.group(2)), lexer, HtmlFormatter(nowrap=True))
+        return f'<pre class="{fences.CSS_CLASS}"><code class="language-{m.group(1)}">{code}</code></pre>'
+    return FENCE.sub(replace, mistune.markdown(text, escape=False))
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--fences", type=int, default=500)
+    argparser.add_argument("--distinct", type=int, default=100)
+    argparser.add_argument("--workers", type=int, default=0, help="also measure with a pool of N processes")
+    args = argparser.parse_args()
+
+    document = make_document(args.fences, args.distinct, 1)
+    other = make_document(args.fences, args.distinct, 2)
+    _, plain_time = timed(lambda: mistune.markdown(document, escape=False))
+    _, naive_time = timed(lambda: reference_naive(document))
+    fences.fence_cache.clear()
+    _, cold_time = timed(lambda: fences.markdown_to_html(document))
+    _, warm_time = timed(lambda: fences.markdown_to_html(other))
+    print(f"{args.fences} fences, {args.distinct} distinct snippets, {len(document) / 1e3:.0f} kB")
+    print(f"  Mistune only:             {plain_time * 1000:8.1f} ms")
+    print(f"  Naive, per fence:         {naive_time * 1000:8.1f} ms")
+    print(f"  fences.py, cold cache:    {cold_time * 1000:8.1f} ms")
+    print(f"  fences.py, other doc.:    {warm_time * 1000:8.1f} ms")
+    if args.workers:
+        fences.POOL_WORKERS = args.workers
+        fences.POOL_MIN_BYTES = 0
+        fences.get_pool().submit(int).result()  # start the pool outside the measurement
+        fences.fence_cache.clear()
+        _, pooled_time = timed(lambda: fences.markdown_to_html(document))
+        print(f"  fences.py, {args.workers} workers:    {pooled_time * 1000:8.1f} ms")
+    print(f"fence cache: {fences.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+bench_highlighter.py – Benchmark for Task3Highlighter.process().
+
+The former implementation matched fences with the DOTALL regex ```(\w*)\n(.*?)\n``` over the whole
+document, compiled the marker pattern for every block and split/joined each block line by line. It
+is kept here as reference_process() and timed against the current single-pass scanner on a large
+document as MarkdownGenerator produces it (long code blocks, few markers) and on one made of many
+tiny fenced blocks full of markers. tests/test_highlighter.py checks the results.
+
+Usage:
+    python benchmarks/bench_highlighter.py [--blocks 20000]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from code2md import MarkdownGenerator
+from highlighter import Task3Highlighter
+
+
+def reference_process(markdown_text):
+    """
+    The former Task3Highlighter.process().
+    """
+    def process_code_block(code_text):
+        marker_pattern = re.compile(r'__(\w+)__(:)')
+        processed_lines = []
+        for line in code_text.split("\n"):
+            stripped = line.lstrip()
+            if stripped.startswith("#!"):
+                processed_lines.append(line)
+                continue
+            if stripped.startswith("#"):
+                processed_lines.append(marker_pattern.sub(r'<span class="highlight">\g<0></span>', line))
+            else:
+                processed_lines.append(line)
+        return "\n".join(processed_lines)
+
+    def replace_block(match):
+        return f"```{match.group(1)}\n{process_code_block(match.group(2))}\n```"
+
+    return re.compile(r"```(\w*)\n(.*?)\n```", re.DOTALL).sub(replace_block, markdown_text)
+
+
+def make_dense_document(blocks):
+    """
+    Many small fenced blocks, each with markers.
+    """
+    block = ("Some text describing block {n}.\n\n"
+             "```python\n"
+             "# Step {n}: __TODO__: check this\n"
+             "def function_{n}(a):\n"
+             "    return a * {n}  # inline __NOTE__:\n"
+             "```\n\n")
+    return "".join(block.format(n=n) for n in range(blocks))
+
+
+def make_generated_document(blocks):
+    """
+    Markdown as MarkdownGenerator produces it for a large source file: longer code blocks, few markers.
+    """
+    chunk = ("# Section {n}\n"
+             "# Explains the function below.\n\n"
+             "def function_{n}(a, b):\n"
+             "    # __TODO__: handle b == 0\n"
+             "    total = a + b  # inline comment\n"
+             "    values = [total * i for i in range({n})]\n"
+             "    for value in values:\n"
+             "        if value > a:\n"
+             "            yield value - b\n"
+             "    return total * {n}\n\n")
+    code = "".join(chunk.format(n=n) for n in range(blocks))
+    return MarkdownGenerator(code, "python").generate_markdown()
+
+
+def compare(name, document):
+    start = time.perf_counter()
+    reference_process(document)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    Task3Highlighter(document).process()
+    current_time = time.perf_counter() - start
+    print(f"{name}: {len(document) / (1024 * 1024):.1f} MB, {document.count(chr(10))} lines")
+    print(f"  Reference: {reference_time * 1000:8.1f} ms")
+    print(f"  Current:   {current_time * 1000:8.1f} ms ({reference_time / current_time:.1f}x)")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--blocks", type=int, default=20000)
+    args = argparser.parse_args()
+
+    compare("Generated document", make_generated_document(args.blocks))
+    compare("Dense fences", make_dense_document(args.blocks))
+
+
+if __name__ == "__main__":
+    main()
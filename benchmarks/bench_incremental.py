@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+bench_incremental.py – Per-edit latency of IncrementalMarkdownGenerator versus full re-conversion.
+
+A synthetic Python file (default 20k lines) is converted once; then typing is simulated: the cursor
+jumps to a random place and a burst of keystrokes (characters, and a newline every so often) is
+applied there one edit at a time. The median, 95th percentile and worst per-keystroke times are
+reported next to the time of one full conversion.
+
+Usage:
+    python benchmarks/bench_incremental.py [--lines 20000] [--bursts 20] [--burst-length 25]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code2md import MarkdownGenerator
+from incremental import IncrementalMarkdownGenerator
+
+SAMPLE_CHUNK = '''# Section {n}
+# Explains what the function below does.
+
+def function_{n}(a, b):
+    """Docstring for function {n}."""
+    total = a + b  # inline comment
+    # A note inside the code.
+    return total * {n}
+
+'''
+
+
+def make_source(lines):
+    chunk_lines = SAMPLE_CHUNK.count("\n")
+    return "".join(SAMPLE_CHUNK.format(n=n) for n in range(lines // chunk_lines + 1))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--lines", type=int, default=20000)
+    argparser.add_argument("--bursts", type=int, default=20)
+    argparser.add_argument("--burst-length", type=int, default=25)
+    args = argparser.parse_args()
+
+    code = make_source(args.lines)
+    start = time.perf_counter()
+    MarkdownGenerator(code, "python").generate_markdown()
+    full_time = time.perf_counter() - start
+    print(f"Full conversion of {code.count(chr(10))} lines: {full_time * 1000:.1f} ms")
+
+    doc = IncrementalMarkdownGenerator(code, "python")
+    rng = random.Random(42)
+    timings = []
+    for burst in range(args.bursts):
+        # Place the cursor at the end of a random line and type there.
+        position = doc.code.index("\n", rng.randint(0, len(doc.code) - 1))
+        for n in range(args.burst_length):
+            key = "\n" if n % 12 == 11 else rng.choice("abcdefgh ")
+            start = time.perf_counter()
+            doc.apply_edit(position, position, key)
+            timings.append(time.perf_counter() - start)
+            position += 1
+
+    timings.sort()
+    print(f"Keystrokes: {len(timings)}, median {statistics.median(timings) * 1000:.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f} ms, max {timings[-1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
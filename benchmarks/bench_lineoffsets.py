@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_lineoffsets.py – Cost of locating block positions with LineOffsets (lineoffsets.py).
+
+A Python file of --millions million lines (the suite's python-1m sample, repeated) is scanned into
+comment and code runs once; then the runs are turned into blocks with positions:
+
+  • per run: the former way, newlines counted in every run (reference_blocks() below);
+  • LineOffsets: PygmentsParser.iter_run_blocks(), which only locates the block boundaries, in
+    batches (locate_many);
+
+and single offsets are located at random, against counting the newlines from the start of the text:
+
+  • building the line start index (starts) of the text;
+  • random locate() calls (binary search in the index);
+  • locate_many() of all block starts in random order.
+
+tests/test_lineoffsets.py checks the positions.
+
+Usage:
+    python benchmarks/bench_lineoffsets.py [--millions 2] [--lookups 100000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import suite
+import lineoffsets
+from lineoffsets import LineOffsets
+from readblocks import PygmentsParser, get_scanner, lexer_input, _with_code_runs
+
+
+def reference_blocks(text, runs):
+    """
+    The blocks of the runs, with the newlines of every run counted as the runs are walked.
+    """
+    make_block = PygmentsParser._make_block
+    blocks = []
+    current_type = None
+    start_position = start_line = start_col = None
+    position = 0
+    line = 1
+    column = 1
+    for run_type, run_start, run_end in runs:
+        if run_type != current_type and current_type is not None:
+            blocks.append(make_block(text, current_type, start_position, run_start, start_line, start_col, line, column))
+        if run_type != current_type:
+            start_position, start_line, start_col = run_start, line, column
+        current_type = run_type
+        newlines = text.count("\n", run_start, run_end)
+        if newlines:
+            line += newlines
+            column = run_end - text.rfind("\n", run_start, run_end)
+        else:
+            column += run_end - run_start
+        position = run_end
+    if current_type is not None:
+        blocks.append(make_block(text, current_type, start_position, position, start_line, start_col, line, column))
+    return blocks
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--millions", type=int, default=2, help="million lines in the file")
+    argparser.add_argument("--lookups", type=int, default=100000)
+    args = argparser.parse_args()
+
+    _, language, sample = suite.make_sample("python-1m")
+    parser = PygmentsParser(sample * args.millions, language)
+    text = parser.source = lexer_input(parser.lexer, parser.code)
+    runs = list(_with_code_runs(get_scanner(parser.lexer).scan(text), len(text)))
+
+    _, reference_time = timed(lambda: reference_blocks(text, runs))
+    blocks, located_time = timed(lambda: list(parser.iter_run_blocks(text, runs)))
+    print(f"{text.count(chr(10)) / 1e6:.1f}M lines, {len(runs)} runs, {len(blocks)} blocks; "
+          f"NumPy: {lineoffsets.numpy is not None}")
+    print(f"  Blocks, newlines counted per run:     {reference_time * 1000:8.1f} ms")
+    print(f"  Blocks, boundaries (LineOffsets):     {located_time * 1000:8.1f} ms")
+
+    rng = random.Random(1)
+    offsets = [rng.randrange(len(text) + 1) for _ in range(args.lookups)]
+    naive = offsets[:100]
+    _, naive_time = timed(lambda: [text.count("\n", 0, offset) for offset in naive])
+    index = LineOffsets(text)
+    _, build_time = timed(lambda: index.starts)
+    _, lookup_time = timed(lambda: [index.locate(offset) for offset in offsets])
+    starts = [block.start for block in blocks]
+    rng.shuffle(starts)
+    _, batch_time = timed(lambda: index.locate_many(starts))
+    print(f"  Random offset, counting from start:   {naive_time / len(naive) * 1e6:8.1f} µs per offset")
+    print(f"  Index of line starts, build:          {build_time * 1000:8.1f} ms")
+    print(f"  Random offset, locate():              {lookup_time / len(offsets) * 1e6:8.1f} µs per offset")
+    print(f"  locate_many(), {len(starts)} shuffled starts: {batch_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+bench_listing.py – Directory listing time of /browse for a large directory, before and after the
+listing cache (listing.py).
+
+The former browse() listed the directory with os.listdir and called os.path.isfile/os.path.isdir
+(a stat each) for every entry on every request; it is kept here as reference_browse(). For a
+temporary directory with --entries entries (files of several types and some subdirectories):
+
+  • Timing: the reference, the first (uncached) request and later (cached) requests, each with
+    LISTING_PAGE_SIZE entries per page.
+  • Invalidation: after a file is added, the next request lists it; with --watch, the inotify
+    watcher is expected to have re-listed the directory before that request.
+
+Network file systems are where the per-entry stats hurt most; on a local disk the differences are
+smaller, but the proportions show.
+
+Usage:
+    python benchmarks/bench_listing.py [--entries 20000] [--watch]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as webapp
+from listing import ListingCache
+
+EXTENSIONS = [".py", ".js", ".md", ".txt", ".go", ".json"]
+
+
+def reference_browse(subpath):
+    """
+    The former app.browse() (for an existing directory).
+    """
+    url_for = webapp.url_for
+    abs_path = os.path.join(webapp.BASE_DIR, subpath)
+    items = sorted(os.listdir(abs_path), key=lambda s: s.lower())
+    html_items = []
+    parent = os.path.dirname(subpath)
+    if subpath:
+        html_items.append(f'<li><a href="{url_for("browse", subpath=parent)}">.. (Parent Directory)</a></li>')
+    for item in items:
+        item_abs = os.path.join(abs_path, item)
+        item_rel = os.path.join(subpath, item)
+        display_text = item
+        if os.path.isfile(item_abs):
+            ext = os.path.splitext(item)[1].lower()
+            if ext in webapp.CODE_EXTENSIONS and webapp.shtype_checker is not None:
+                langs = webapp.shtype_checker.get_languages_by_extension(ext)
+                if langs:
+                    display_text += f" (lang: {langs[0]})"
+        if os.path.isdir(item_abs):
+            html_items.append(f'<li>[DIR] <a href="{url_for("browse", subpath=item_rel)}">{display_text}</a></li>')
+        else:
+            html_items.append(f'<li>[FILE] <a href="{url_for("view_file", subpath=item_rel)}">{display_text}</a></li>')
+    return f"<h1>Index of /{subpath}</h1><ul>" + "\n".join(html_items) + "</ul>"
+
+
+def make_tree(root, entries):
+    directory = os.path.join(root, "big")
+    os.mkdir(directory)
+    for n in range(entries):
+        if n % 50 == 0:
+            os.mkdir(os.path.join(directory, f"Package_{n}"))
+        else:
+            with open(os.path.join(directory, f"file_{n}{EXTENSIONS[n % len(EXTENSIONS)]}"), "w") as f:
+                f.write("x\n")
+    return directory
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--entries", type=int, default=20000)
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--watch", action="store_true", help="watch cached directories with inotify")
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    root = tempfile.mkdtemp(prefix="bench-listing-")
+    try:
+        directory = make_tree(root, args.entries)
+        webapp.BASE_DIR = root
+        webapp.listing_cache = ListingCache(watch=args.watch)
+        client = webapp.app.test_client()
+        with webapp.app.test_request_context():
+            _, reference_time = timed(lambda: reference_browse("big"), args.repeat)
+
+        print(f"{args.entries} entries")
+
+        webapp.listing_cache = ListingCache(watch=args.watch)
+        _, cold_time = timed(lambda: client.get("/browse/big?page=2"), 1)
+        _, warm_time = timed(lambda: client.get("/browse/big?page=2"), args.repeat)
+        print(f"  Reference (all entries):  {reference_time * 1000:8.1f} ms")
+        print(f"  First request (page 2):   {cold_time * 1000:8.1f} ms")
+        print(f"  Cached request (page 2):  {warm_time * 1000:8.1f} ms")
+
+        with open(os.path.join(directory, "aaa_new.py"), "w") as f:
+            f.write("x\n")
+        if args.watch:
+            time.sleep(0.5)
+        listed = "aaa_new.py" in client.get("/browse/big").get_data(as_text=True)
+        print(f"New file listed: {listed}; listing cache: {webapp.listing_cache.get_stats()}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+bench_memory.py – Memory taken by the parsed blocks and line tokens of a large file.
+
+A Python sample of the suite's corpus (by default the 1M-line one) is parsed once, and the memory
+each representation keeps alive is measured with tracemalloc (the source text and the content
+strings of the tokens, which all representations share, excluded):
+
+  • blocks as dicts: the former block dictionaries (Block.as_dict()), a dict with a nested
+    "positions" dict of tuples and a copy of the content per block;
+  • blocks as Block objects: what iter_comments_and_blocks() yields now (__slots__, values made
+    on access);
+  • BlockList: PygmentsParser.parse_blocks(), parallel arrays of type codes, offsets, lines and
+    columns;
+  • tokens as dicts / LineToken objects: the line tokens of MarkdownGenerator.iter_tokens(), in
+    the former dict form and as the LineToken (__slots__) objects used now.
+
+Usage:
+    python benchmarks/bench_memory.py [--sample python-1m] [--lines N]
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import suite
+from readblocks import PygmentsParser, BlockList
+from code2md import MarkdownGenerator, LineToken
+
+
+def retained(build):
+    """
+    Returns (result, bytes allocated by build() and still alive afterwards).
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def copy_blocks(block_list):
+    # A BlockList of the same blocks, built without re-parsing (which would also allocate a new source).
+    copy = BlockList(block_list.source)
+    for block in block_list:
+        copy.append(block)
+    return copy
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    argparser.add_argument("--sample", default="python-1m", help="suite corpus sample (default python-1m)")
+    argparser.add_argument("--lines", type=int, help="only the first N lines of the sample")
+    args = argparser.parse_args()
+
+    _, language, code = suite.make_sample(args.sample)
+    if args.lines:
+        code = "".join(code.splitlines(True)[:args.lines])
+    parser = PygmentsParser(code, language)
+    print(f"{args.sample}: {code.count(chr(10))} lines, {len(code) / 1e6:.1f} MB")
+
+    rows = []
+    block_list = parser.parse_blocks()
+    blocks = len(block_list)
+    rows.append(("blocks as dicts", retained(lambda: [block.as_dict() for block in block_list])[1], blocks))
+    rows.append(("blocks as Block objects", retained(lambda: list(block_list))[1], blocks))
+    rows.append(("BlockList", retained(lambda: copy_blocks(block_list))[1], blocks))
+    tokens = MarkdownGenerator(code, language).iter_tokens()
+    token_dicts = retained(lambda: [{"token_type": t.token_type, "content": t.content, "line": t.line,
+                                     "col": t.col, "mode": t.mode} for t in tokens])[1]
+    line_tokens = retained(lambda: [LineToken(t.token_type, t.content, t.line, t.col, t.mode) for t in tokens])[1]
+    rows.append(("tokens as dicts", token_dicts, len(tokens)))
+    rows.append(("tokens as LineToken objects", line_tokens, len(tokens)))
+
+    print(f"{'representation':<30} {'items':>10} {'MB':>9} {'bytes/item':>11}")
+    for name, size, count in rows:
+        print(f"{name:<30} {count:>10} {size / 1e6:>9.1f} {size / max(count, 1):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+bench_readblocks.py – Throughput and peak memory of PygmentsParser.iter_comments_and_blocks().
+
+A synthetic Python source of the requested size (default 50 MB) is generated in memory,
+mixing full-line comments, code, inline comments, docstrings and blank lines. The blocks
+are consumed one at a time (nothing is kept), so the measured peak is what the parser itself
+holds on top of the source text.
+
+Two passes are made:
+  • a timed pass (no tracing), reporting MB/s and blocks/s;
+  • a traced pass with tracemalloc, reporting the peak allocation during parsing.
+
+Usage:
+    python benchmarks/bench_readblocks.py [--size-mb 50] [--language python]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from readblocks import PygmentsParser
+
+SAMPLE_CHUNK = '''# Section header comment
+# describing the function below.
+def function_{n}(a, b):
+    """Docstring for function {n}."""
+    total = a + b  # inline comment
+    return total * {n}
+
+'''
+
+
+def make_source(size_mb):
+    """
+    Returns a synthetic Python source of roughly size_mb megabytes.
+    """
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+    n = 0
+    while size < target:
+        chunk = SAMPLE_CHUNK.format(n=n)
+        parts.append(chunk)
+        size += len(chunk)
+        n += 1
+    return "".join(parts)
+
+
+def consume(code, language):
+    """
+    Runs the parser over code, discarding blocks. Returns the number of blocks.
+    """
+    count = 0
+    for _ in PygmentsParser(code, language).iter_comments_and_blocks():
+        count += 1
+    return count
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--size-mb", type=float, default=50.0)
+    argparser.add_argument("--language", default="python")
+    args = argparser.parse_args()
+
+    code = make_source(args.size_mb)
+    size_mb = len(code.encode("utf-8")) / (1024 * 1024)
+    print(f"Source: {size_mb:.1f} MB, {code.count(chr(10))} lines")
+
+    start = time.perf_counter()
+    blocks = consume(code, args.language)
+    elapsed = time.perf_counter() - start
+    print(f"Blocks: {blocks}")
+    print(f"Time: {elapsed:.2f} s ({size_mb / elapsed:.2f} MB/s, {blocks / elapsed:.0f} blocks/s)")
+
+    tracemalloc.start()
+    consume(code, args.language)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Peak memory while parsing: {peak / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
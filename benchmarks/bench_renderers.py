@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+bench_renderers.py – Benchmark of the Markdown backends and per-segment rendering (renderers.py).
+
+For the suite's 10k-line samples: the former conversion (mistune.markdown() with a new parser per
+call, no fence highlighting), then for each backend the whole document and the segments, and the
+streamed segments (one Mistune call each) with and without parsing the code segments. The fence
+cache is warmed first, so the timings are of parsing rather than Pygments. tests/test_renderers.py
+checks that the segments render as the whole document.
+
+Usage:
+    python benchmarks/bench_renderers.py [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import mistune
+
+import suite
+import renderers
+from code2md import MarkdownGenerator
+from highlighter import Task3Highlighter
+
+SAMPLES = ("python-10k", "javascript-10k", "c-10k", "go-10k", "java-10k")
+
+
+def segments_of(source, language):
+    return list(MarkdownGenerator(source, language).iter_segments_with_modes())
+
+
+def whole_html(segments, renderer):
+    return renderer.markdown_to_html(Task3Highlighter("\n\n".join(text for _, text in segments)).process())
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(repeat):
+    backends = renderers.available_backends()
+    for name in SAMPLES:
+        _, language, sample = suite.make_sample(name)
+        segments = segments_of(sample, language)
+        processed = Task3Highlighter("\n\n".join(text for _, text in segments)).process()
+        print(f"{name}: {len(segments)} segments, {len(processed) / 1e3:.0f} kB")
+        former = best_time(lambda: mistune.markdown(processed, escape=False), repeat)
+        print(f"  {'former (new parser, no fences)':34} {former * 1000:8.1f} ms")
+        for backend in backends:
+            renderer = renderers.get_renderer(backend)
+            renderers.render_segments(segments, renderer)  # warms the fence cache
+            whole_time = best_time(lambda: whole_html(segments, renderer), repeat)
+            segments_time = best_time(lambda: renderers.render_segments(segments, renderer), repeat)
+            print(f"  {backend + ', whole document':34} {whole_time * 1000:8.1f} ms")
+            print(f"  {backend + ', segments':34} {segments_time * 1000:8.1f} ms")
+        # Streaming (app.iter_segments_html) formerly parsed every segment, code included.
+        renderer = renderers.get_renderer("mistune")
+        streamed_all = best_time(lambda: [renderer.markdown_to_html(Task3Highlighter(text).process())
+                                          for _, text in segments], repeat)
+        streamed = best_time(lambda: list(renderers.iter_segments_html(segments, renderer)), repeat)
+        print(f"  {'streamed, every segment parsed':34} {streamed_all * 1000:8.1f} ms")
+        print(f"  {'streamed, code segments direct':34} {streamed * 1000:8.1f} ms")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+    benchmark(args.repeat)
+
+if __name__ == "__main__":
+    main()
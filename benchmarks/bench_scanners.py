@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+bench_scanners.py – Speed of the comment scanners (scanners.py) against the lexers.
+
+Every file is split into blocks twice: by PygmentsParser.iter_comments_and_blocks() with the scanner
+of its language, and from the lexer's tokens (iter_blocks_from). tests/test_scanners.py checks that
+the blocks are the same.
+
+  • paths: files and directories (searched recursively) of Python, JavaScript, Go, Java, C, C++ and
+    shell sources (see EXTENSIONS); by default the repository itself and the synthetic samples of
+    suite.py;
+  • the fallback rate is the share of files where a scanner gave up (ScanAbort) and the lexer was
+    used; the speedup compares the total parse time of both ways.
+
+Usage:
+    python benchmarks/bench_scanners.py [paths ...] [--limit 5000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import readblocks
+from readblocks import PygmentsParser
+
+EXTENSIONS = {".py": "python", ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+              ".go": "go", ".java": "java", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp", ".hpp": "cpp",
+              ".sh": "bash", ".bash": "bash"}
+
+SUITE_SAMPLES = ["tiny", "python-10k", "python-comments-10k", "python-code-10k", "javascript-10k",
+                 "go-10k", "java-10k", "c-10k"]
+
+
+def collect(paths, limit):
+    """
+    Returns [(label, language, text)] of the source files under paths (at most limit).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if os.path.splitext(filename)[1] in EXTENSIONS:
+                        files.append(os.path.join(directory, filename))
+        else:
+            files.append(path)
+    sources = []
+    for path in files[:limit]:
+        language = EXTENSIONS.get(os.path.splitext(path)[1])
+        if language is None:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                sources.append((path, language, f.read()))
+        except (OSError, UnicodeDecodeError):
+            continue
+    return sources
+
+
+def suite_sources():
+    import suite
+    return [(f"suite:{name}", *suite.make_sample(name)[1:]) for name in SUITE_SAMPLES]
+
+
+def timed_parse(language, text):
+    """
+    Returns (scanned, scanner seconds, lexer seconds) for one source.
+    """
+    parser = PygmentsParser(text, language)
+    start = time.perf_counter()
+    for _ in parser.iter_comments_and_blocks():
+        pass
+    scanner_seconds = time.perf_counter() - start
+    scanned = parser.scanned
+    start = time.perf_counter()
+    for _ in parser.iter_blocks_from(parser.source):
+        pass
+    return scanned, scanner_seconds, time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0],
+                                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument("paths", nargs="*", help="source files or directories (default: the repository)")
+    argparser.add_argument("--limit", type=int, default=5000, help="at most this many files from paths")
+    args = argparser.parse_args()
+
+    sources = collect(args.paths or [ROOT], args.limit)
+    if not args.paths:
+        sources += suite_sources()
+    if readblocks.get_scanner(PygmentsParser("", "python").lexer) is None:
+        print("scanners are not in use (unverified Pygments version or USE_SCANNERS off)")
+
+    stats = {}  # language -> [files, fallbacks, scanner seconds, lexer seconds, bytes]
+    for label, language, text in sources:
+        scanned, scanner_seconds, lexer_seconds = timed_parse(language, text)
+        entry = stats.setdefault(language, [0, 0, 0.0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += not scanned
+        entry[2] += scanner_seconds
+        entry[3] += lexer_seconds
+        entry[4] += len(text)
+
+    print(f"{'language':<12} {'files':>7} {'MB':>8} {'fallback':>9} {'scanner s':>10} {'lexer s':>9} {'speedup':>8}")
+    for language, (files, fallbacks, scanner_seconds, lexer_seconds, size) in sorted(stats.items()):
+        speedup = lexer_seconds / scanner_seconds if scanner_seconds else 0.0
+        print(f"{language:<12} {files:>7} {size / 1e6:>8.2f} {fallbacks / files:>8.1%} "
+              f"{scanner_seconds:>10.2f} {lexer_seconds:>9.2f} {speedup:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+bench_search.py – Cost of /search queries answered from the search index (searchindex.py).
+
+A temporary tree of --files Python files (--lines lines each, comments and code) is searched:
+
+  • naive: every file converted with MarkdownGenerator and its segments scanned, for each query
+    (what answering a query without an index costs); reference_naive() below;
+  • first build of the index (all files converted once);
+  • a query on an up-to-date index (the refresh only compares sizes and mtimes);
+  • a refresh after --changed files were edited (only those are converted again), then a query.
+
+tests/test_search.py checks that the index finds what the naive scan finds.
+
+Usage:
+    python benchmarks/bench_search.py [--files 200] [--lines 500] [--changed 5]
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from searchindex import SearchIndex, terms_of
+
+WORDS = ("cache index render segment parser token comment block stream query file "
+         "value result error lookup update").split()
+
+FUNCTION = '''def function_{n}(items):
+    total = 0
+    for item in items:
+        total += item * {n}  # {words}
+    return total
+
+'''
+
+
+def make_tree(root, files, lines, seed=1):
+    rng = random.Random(seed)
+    for i in range(files):
+        parts = []
+        count = 0
+        n = 0
+        while count < lines:
+            comment = [f"# {' '.join(rng.choice(WORDS) for _ in range(8))}" for _ in range(rng.randint(0, 4))]
+            function = FUNCTION.format(n=n, words=" ".join(rng.choice(WORDS) for _ in range(4)))
+            parts.append("\n".join(comment) + ("\n" if comment else "") + function)
+            count += len(comment) + function.count("\n")
+            n += 1
+        directory = os.path.join(root, f"package{i % 10}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module{i}.py"), "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+
+
+def reference_naive(root, query, kind):
+    """
+    Converts every file and returns the paths of those with a segment of kind containing all words.
+    """
+    terms = set(terms_of(query))
+    found = set()
+    for directory, dirs, files in os.walk(root):
+        for name in files:
+            abs_path = os.path.join(directory, name)
+            for segment_kind, _, text in app.search_segments(abs_path, ".py"):
+                if segment_kind == kind and terms <= set(terms_of(text)):
+                    found.add(os.path.relpath(abs_path, root))
+    return found
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--files", type=int, default=200)
+    argparser.add_argument("--lines", type=int, default=500)
+    argparser.add_argument("--changed", type=int, default=5)
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    query, kind = "cache stream", "prose"
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, args.files, args.lines)
+        index = SearchIndex(app.search_segments, {".py"}, refresh_seconds=0)
+
+        def search():
+            index.refresh_if_due(root)
+            return {result["path"] for result in index.search(query, kind, limit=args.files)}
+
+        _, naive_time = timed(lambda: reference_naive(root, query, kind))
+        _, build_time = timed(lambda: index.refresh(root))
+        indexed, query_time = timed(search)
+
+        rng = random.Random(2)
+        paths = sorted(os.path.join(directory, name) for directory, _, files in os.walk(root) for name in files)
+        for path in rng.sample(paths, min(args.changed, len(paths))):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("# cache stream appended\n")
+        _, update_time = timed(search)
+
+        print(f"{args.files} files of {args.lines} lines, query {query!r} in {kind}: "
+              f"{len(indexed)} files")
+        print(f"  Naive, convert and scan:  {naive_time * 1000:8.1f} ms per query")
+        print(f"  Index, first build:       {build_time * 1000:8.1f} ms")
+        print(f"  Index, query:             {query_time * 1000:8.1f} ms")
+        print(f"  Index, {args.changed} changed + query: {update_time * 1000:8.1f} ms")
+        print(f"index: {index.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py – Cold-start cost of Shtype and lexer lookup, with and without the index.
+
+Each measurement runs in a fresh interpreter (as a new serverless worker would):
+  • "no index": Shtype has to query Pygments for all lexers (as Shtype.__init__ always did before
+    the index existed); the index directory is empty for every run.
+  • "index": the generated index file for the installed Pygments version is already present.
+Both run the same lookups as app.py does for a first request (extension -> language, then a lexer).
+Plain interpreter start-up ("python -c pass") is reported for reference.
+
+In-process, resolving a lexer per request with get_lexer_by_name() is compared with the shared
+per-process lexers of readblocks.get_lexer().
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--lookups 1000]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+FIRST_REQUEST = """
+import shtype, readblocks
+checker = shtype.Shtype()
+language = checker.get_languages_by_extension(".py")[0]
+readblocks.get_lexer(language)
+"""
+
+
+def time_subprocess(code, env=None, before_each=None, runs=5):
+    """
+    Returns the median wall time (seconds) of running code in a fresh interpreter.
+    """
+    timings = []
+    for _ in range(runs):
+        if before_each is not None:
+            before_each()
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, env=env, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--runs", type=int, default=5)
+    argparser.add_argument("--lookups", type=int, default=1000)
+    args = argparser.parse_args()
+
+    index_dir = tempfile.mkdtemp(prefix="shtype-index-")
+    env = dict(os.environ, SHTYPE_INDEX_DIR=index_dir)
+
+    def clear_index():
+        shutil.rmtree(index_dir, ignore_errors=True)
+        os.makedirs(index_dir)
+
+    try:
+        interpreter = time_subprocess("pass", runs=args.runs)
+        no_index = time_subprocess(FIRST_REQUEST, env=env, before_each=clear_index, runs=args.runs)
+        time_subprocess("import shtype; shtype.write_index(shtype.add_comment_syntax(shtype.build_index()),"
+                        " shtype.index_path())", env=env, runs=1)  # as --build-index
+        indexed = time_subprocess(FIRST_REQUEST, env=env, runs=args.runs)
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    print(f"Interpreter start-up:        {interpreter * 1000:8.1f} ms")
+    print(f"First request, no index:     {no_index * 1000:8.1f} ms")
+    print(f"First request, index:        {indexed * 1000:8.1f} ms ({no_index / indexed:.1f}x faster)")
+
+    from pygments.lexers import get_lexer_by_name
+    from readblocks import get_lexer
+    names = ["python", "javascript", "go", "css"]
+    get_lexer_by_name("python")
+    for name in names:
+        get_lexer(name)
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        get_lexer_by_name(names[i % len(names)])
+    by_name = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        get_lexer(names[i % len(names)])
+    cached = time.perf_counter() - start
+    print(f"Lexer lookup, get_lexer_by_name: {by_name / args.lookups * 1e6:8.1f} us")
+    print(f"Lexer lookup, get_lexer (cached): {cached / args.lookups * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
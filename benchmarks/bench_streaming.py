@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+bench_streaming.py – Time to first byte and peak memory of the streamed /view page versus the
+buffered one, for a large log-like source file.
+
+The buffered path is what app.py does below STREAM_THRESHOLD_BYTES (generate_markdown, then
+markdown_to_html and render_page on the whole file); the streamed path is app.iter_page_stream.
+For each, the time until the first piece of rendered content, the total time and the peak traced
+allocation (tracemalloc, on top of the source text) are reported. tests/test_app.py checks that
+both pages are the same.
+
+Usage:
+    python benchmarks/bench_streaming.py [--size-mb 4]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as webapp
+
+SAMPLE_CHUNK = '''# Request {n} handled
+# Status: ok, __NOTE__: cached
+log("request", {n}, status="ok")  # inline comment
+log("timing", {n}, elapsed=0.{n})
+
+'''
+
+
+def make_source(size_mb):
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+    n = 0
+    while size < target:
+        chunk = SAMPLE_CHUNK.format(n=n)
+        parts.append(chunk)
+        size += len(chunk)
+        n += 1
+    return "".join(parts)
+
+
+def buffered_page(content):
+    md_content = webapp.generate_markdown(content, ".py")
+    yield webapp.render_page("big.py", webapp.markdown_to_html(md_content), "/")
+
+
+def streamed_page(content):
+    return webapp.iter_page_stream(None, ".py", content, "big.py", "/")
+
+
+def measure(page, content):
+    """
+    Consumes the page generator; returns (seconds to first content, total seconds). The page head
+    (sent before any rendering) does not count as content.
+    """
+    head = webapp.page_head("big.py")
+    first = None
+    start = time.perf_counter()
+    for piece in page(content):
+        if first is None and piece != head:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--size-mb", type=float, default=4.0)
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    content = make_source(args.size_mb)
+    print(f"Source: {len(content) / (1024 * 1024):.1f} MB, {content.count(chr(10))} lines")
+
+    for name, page in (("Buffered", buffered_page), ("Streamed", streamed_page)):
+        first, total = measure(page, content)
+        tracemalloc.start()
+        measure(page, content)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: first content after {first:7.2f} s, total {total:7.2f} s, "
+              f"peak memory {peak / (1024 * 1024):7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
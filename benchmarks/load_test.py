@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+load_test.py – Latency of the ASGI server (asgi.py) under concurrent clients.
+
+Each client sends its requests one after another: mostly /view of a randomly chosen file, and every
+--browse-every-th request a directory listing, so one can see whether listings queue behind renders.
+p50/p99/max latencies are reported per route kind, with the status counts and the overall request rate.
+
+Two modes:
+  • In-process (default): asgi.application is called directly (no network, no server needed).
+    --files synthetic source files of --file-lines lines, each with distinct content, are generated
+    in a temporary directory which becomes the browsing root, so the first requests for a file render
+    it (concurrent ones coalesce) and later ones are cache hits. The render pool counters are printed.
+  • --url http://host:port: requests go over HTTP (one connection per request) to a running server
+    (e.g. "uvicorn asgi:application"); --paths lists the /view paths to request (relative to its root).
+
+Usage:
+    python benchmarks/load_test.py [--clients 32] [--requests 20] [--files 16] [--file-lines 3000]
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --paths app.py code2md.py
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from urllib.parse import urlsplit, quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_CHUNK = '''# Section {n} of file {f}
+# Explains what the function below does.
+
+def function_{f}_{n}(a, b):
+    """Docstring for function {n}."""
+    total = a + b  # inline comment
+    return total * {n}
+
+'''
+
+
+def make_files(directory, files, lines):
+    chunk_lines = SAMPLE_CHUNK.count("\n")
+    names = []
+    for f in range(files):
+        name = f"module_{f}.py"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as out:
+            out.write("".join(SAMPLE_CHUNK.format(f=f, n=n) for n in range(lines // chunk_lines + 1)))
+        names.append(name)
+    return names
+
+
+async def request_in_process(application, path):
+    """
+    Calls the ASGI application for a GET of path; returns the status code.
+    """
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode("utf-8"),
+             "root_path": "", "query_string": b"", "headers": [], "http_version": "1.1",
+             "scheme": "http", "server": ("localhost", 80), "client": ("127.0.0.1", 0)}
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+async def request_http(base_url, path):
+    """
+    Sends a GET of path over HTTP/1.1 (Connection: close); returns the status code.
+    """
+    url = urlsplit(base_url)
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    try:
+        writer.write(f"GET {quote(path)} HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def client(send_request, view_paths, requests, browse_every, rng, results):
+    for i in range(requests):
+        if browse_every and i % browse_every == browse_every - 1:
+            kind, path = "browse", "/browse/"
+        else:
+            kind, path = "view", "/view/" + rng.choice(view_paths)
+        start = time.perf_counter()
+        try:
+            status = await send_request(path)
+        except Exception as e:
+            status = type(e).__name__
+        results.append((kind, time.perf_counter() - start, status))
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def report(results, elapsed):
+    print(f"{len(results)} requests in {elapsed:.2f} s ({len(results) / elapsed:.1f} requests/s)")
+    for kind in ("view", "browse"):
+        latencies = sorted(latency for k, latency, _ in results if k == kind)
+        if not latencies:
+            continue
+        statuses = {}
+        for k, _, status in results:
+            if k == kind:
+                statuses[status] = statuses.get(status, 0) + 1
+        print(f"  {kind:6s} n={len(latencies):5d}  p50 {percentile(latencies, 0.50) * 1000:8.1f} ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:8.1f} ms  max {latencies[-1] * 1000:8.1f} ms  "
+              f"status {statuses}")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    if args.url:
+        async def send_request(path):
+            return await request_http(args.url, path)
+        view_paths = args.paths
+    else:
+        root = tempfile.mkdtemp(prefix="load-test-")
+        view_paths = make_files(root, args.files, args.file_lines)
+        import app as webapp
+        import asgi
+        webapp.BASE_DIR = root
+        if args.workers:
+            asgi.render_pool.workers = args.workers
+
+        async def send_request(path):
+            return await request_in_process(asgi.application, path)
+
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(send_request, view_paths, args.requests, args.browse_every,
+                                  random.Random(rng.random()), results) for _ in range(args.clients)))
+    report(results, time.perf_counter() - start)
+    if not args.url:
+        print(f"Render pool: {asgi.render_pool.get_stats()}")
+        asgi.render_pool.shutdown()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--clients", type=int, default=32)
+    argparser.add_argument("--requests", type=int, default=20, help="requests per client")
+    argparser.add_argument("--browse-every", type=int, default=5, help="every n-th request is a listing (0: none)")
+    argparser.add_argument("--files", type=int, default=16)
+    argparser.add_argument("--file-lines", type=int, default=3000)
+    argparser.add_argument("--workers", type=int, default=None, help="render processes (in-process mode)")
+    argparser.add_argument("--seed", type=int, default=1)
+    argparser.add_argument("--url", help="base URL of a running server")
+    argparser.add_argument("--paths", nargs="*", default=[], help="/view paths to request (with --url)")
+    args = argparser.parse_args()
+    if args.url and not args.paths:
+        argparser.error("--url needs --paths")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
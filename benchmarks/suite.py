@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+suite.py – Benchmark suite and golden-output check for the whole rendering pipeline.
+
+A synthetic corpus is generated deterministically (seeded), and every stage of the pipeline is run
+on each sample:
+
+  • parse:     PygmentsParser.iter_comments_and_blocks (all blocks, with their positions);
+  • markdown:  MarkdownGenerator.generate_markdown;
+  • highlight: Task3Highlighter.process, on the generated Markdown;
+  • view:      the end-to-end /view route of app.py (Flask test client, empty render cache);
+  • shtype:    Shtype() construction and the extension lookups of the folder view (once, not per sample).
+
+Corpus: a tiny file, 10k-line files of several languages (Python, JavaScript, C, Go, Java) and,
+for Python, comment-heavy and code-heavy variants; with --large also a 1M-line Python file.
+
+Golden outputs: the SHA-256 of every stage's output is compared with benchmarks/golden.json, so an
+optimization can be verified byte-for-byte; any mismatch is reported and the exit status is 1.
+--update-golden records the current outputs instead (only do that for intended output changes).
+The golden file notes the Pygments and Mistune versions it was made with, since their output may
+change between versions.
+
+Timings (best and median of --repeat runs; one run for the 1M-line sample) are written as JSON to
+benchmarks/results/<time>.json (or --output), together with the commit and package versions;
+--compare OLD.json prints each timing relative to an earlier result file.
+
+Usage:
+    python benchmarks/suite.py [--large] [--repeat 3] [--only python-10k,go-10k] [--stages parse,markdown]
+    python benchmarks/suite.py --compare benchmarks/results/<earlier>.json
+    python benchmarks/suite.py --update-golden [--large]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mistune
+import pygments
+
+import app as webapp
+from shtype import Shtype
+from readblocks import PygmentsParser
+from code2md import MarkdownGenerator
+from highlighter import Task3Highlighter
+from rendercache import RenderCache
+
+GOLDEN_PATH = os.path.join(ROOT, "benchmarks", "golden.json")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+STAGES = ["parse", "markdown", "highlight", "view"]
+
+# ---------------------------------------------------------------------
+# Corpus.
+# ---------------------------------------------------------------------
+# Per language: file extension, Pygments name, line comment, block comment (open, close) or None,
+# and the template of one function.
+LANGUAGES = {
+    "python": (".py", "python", "#", None,
+               'def function_{n}(a, b):\n'
+               '    """Docstring for function {n}."""\n'
+               '    total = a + b  # inline comment\n'
+               '    # __TODO__: check the bounds\n'
+               '    if total > {n}:\n'
+               '        return total - {n}\n'
+               '    return "value {n}"\n\n'),
+    "javascript": (".js", "javascript", "//", ("/*", " */"),
+                   'function function_{n}(a, b) {{\n'
+                   '  const total = a + b; // inline comment\n'
+                   '  if (total > {n}) {{\n'
+                   '    return total - {n};\n'
+                   '  }}\n'
+                   '  return "value {n}";\n'
+                   '}}\n\n'),
+    "c": (".c", "c", "//", ("/*", " */"),
+          'int function_{n}(int a, int b) {{\n'
+          '    int total = a + b; /* inline comment */\n'
+          '    if (total > {n}) {{\n'
+          '        return total - {n};\n'
+          '    }}\n'
+          '    return {n};\n'
+          '}}\n\n'),
+    "go": (".go", "go", "//", ("/*", " */"),
+           'func function_{n}(a int, b int) int {{\n'
+           '\ttotal := a + b // inline comment\n'
+           '\tif total > {n} {{\n'
+           '\t\treturn total - {n}\n'
+           '\t}}\n'
+           '\treturn {n}\n'
+           '}}\n\n'),
+    "java": (".java", "java", "//", ("/**", " */"),
+             '    static int function_{n}(int a, int b) {{\n'
+             '        int total = a + b; // inline comment\n'
+             '        if (total > {n}) {{\n'
+             '            return total - {n};\n'
+             '        }}\n'
+             '        return "value {n}".length();\n'
+             '    }}\n\n'),
+}
+
+COMMENT_WORDS = ("the value is checked before use and the result is cached for later calls "
+                 "__NOTE__: see the section above __TODO__: handle errors").split()
+
+# name -> (language, lines, (fewest, most) comment lines before a function, large)
+CORPUS = {
+    "tiny": ("python", 20, (1, 3), False),
+    "python-10k": ("python", 10000, (0, 4), False),
+    "python-comments-10k": ("python", 10000, (6, 16), False),
+    "python-code-10k": ("python", 10000, (0, 0), False),
+    "javascript-10k": ("javascript", 10000, (0, 4), False),
+    "c-10k": ("c", 10000, (0, 4), False),
+    "go-10k": ("go", 10000, (0, 4), False),
+    "java-10k": ("java", 10000, (0, 4), False),
+    "python-1m": ("python", 1000000, (0, 4), True),
+}
+
+
+def comment_lines(rng, language, count):
+    _, _, line_comment, block_comment, _ = LANGUAGES[language]
+    indent = "    " if language == "java" else ""
+    words = [" ".join(rng.choice(COMMENT_WORDS) for _ in range(rng.randint(3, 10))) for _ in range(count)]
+    if block_comment is not None and count > 2 and rng.random() < 0.3:
+        opener, closer = block_comment
+        return ([f"{indent}{opener}"] + [f"{indent} * {text}" for text in words[:-2]] + [f"{indent}{closer}"])
+    return [f"{indent}{line_comment} {text}" for text in words]
+
+
+def make_sample(name):
+    """
+    Returns (file extension, Pygments language, source) of a corpus sample; the same every time.
+    """
+    language, lines, (fewest, most), _ = CORPUS[name]
+    ext, lexer_name, _, _, template = LANGUAGES[language]
+    rng = random.Random(name)
+    parts = []
+    count = 0
+    if language == "go":
+        parts.append("package main\n\n")
+    elif language == "java":
+        parts.append("public class Sample {\n")
+    n = 0
+    while count < lines:
+        comment = comment_lines(rng, language, rng.randint(fewest, most))
+        if comment:
+            parts.append("\n".join(comment) + "\n")
+        function = template.format(n=n)
+        parts.append(function)
+        count += len(comment) + function.count("\n")
+        n += 1
+    if language == "java":
+        parts.append("}\n")
+    return ext, lexer_name, "".join(parts)
+
+
+# ---------------------------------------------------------------------
+# Stages. Each returns the SHA-256 of its output.
+# ---------------------------------------------------------------------
+def digest_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def run_parse(sample):
+    _, language, code = sample
+    hasher = hashlib.sha256()
+    for block in PygmentsParser(code, language).iter_comments_and_blocks():
+        record = (block["type"], block["content"], block["newline"], block["positions"]["string"],
+                  block["positions"]["line-char"])
+        hasher.update(json.dumps(record).encode("utf-8"))
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+def run_markdown(sample):
+    _, language, code = sample
+    return digest_text(MarkdownGenerator(code, language).generate_markdown())
+
+
+def run_highlight(markdown):
+    return digest_text(Task3Highlighter(markdown).process())
+
+
+def run_view(client, path):
+    webapp.render_cache = RenderCache(max_bytes=webapp.RENDER_CACHE_MAX_BYTES)
+    response = client.get(f"/view/{path}")
+    assert response.status_code == 200, (path, response.status_code)
+    return hashlib.sha256(response.get_data()).hexdigest()
+
+
+def run_shtype():
+    shtype = Shtype()
+    lookups = {ext: shtype.get_languages_by_extension(ext) for ext in sorted(webapp.CODE_EXTENSIONS)}
+    return digest_text(json.dumps(lookups, sort_keys=True))
+
+
+def timed(function, repeat):
+    """
+    Runs function repeat times; returns (digest of the last run, [seconds of each run]).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        digest = function()
+        times.append(time.perf_counter() - start)
+    return digest, times
+
+
+# ---------------------------------------------------------------------
+# Golden outputs and results.
+# ---------------------------------------------------------------------
+def load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def versions():
+    return {"pygments": pygments.__version__, "mistune": mistune.__version__}
+
+
+def run_suite(names, stages, repeat, golden):
+    """
+    Runs the stages over the named samples; returns the result records (one per sample and stage).
+    """
+    expected = (golden or {}).get("outputs", {})
+    results = []
+
+    def record(name, stage, digest, times, lines, size):
+        want = expected.get(name, {}).get(stage)
+        status = "new" if want is None else ("ok" if want == digest else "MISMATCH")
+        best = min(times)
+        results.append({"corpus": name, "stage": stage, "lines": lines, "bytes": size,
+                        "best": best, "median": statistics.median(times), "runs": len(times),
+                        "mb_per_s": (size / (1024 * 1024) / best) if size and best else None,
+                        "digest": digest, "golden": status})
+        print(f"{name:22s} {stage:10s} {best * 1000:10.1f} ms  {status}", flush=True)
+
+    if "shtype" in stages:
+        digest, times = timed(run_shtype, repeat)
+        record("-", "shtype", digest, times, 0, 0)
+
+    root = tempfile.mkdtemp(prefix="bench-suite-")
+    webapp.BASE_DIR = root
+    client = webapp.app.test_client()
+    try:
+        for name in names:
+            sample = make_sample(name)
+            ext, _, code = sample
+            runs = 1 if CORPUS[name][3] else repeat
+            lines = code.count("\n")
+            size = len(code.encode("utf-8"))
+            if "parse" in stages:
+                digest, times = timed(lambda: run_parse(sample), runs)
+                record(name, "parse", digest, times, lines, size)
+            if "markdown" in stages or "highlight" in stages:
+                markdown = MarkdownGenerator(code, sample[1]).generate_markdown()
+                if "markdown" in stages:
+                    digest, times = timed(lambda: run_markdown(sample), runs)
+                    record(name, "markdown", digest, times, lines, size)
+                if "highlight" in stages:
+                    digest, times = timed(lambda: run_highlight(markdown), runs)
+                    record(name, "highlight", digest, times, lines, len(markdown.encode("utf-8")))
+                del markdown
+            if "view" in stages:
+                path = name + ext
+                with open(os.path.join(root, path), "w", encoding="utf-8") as f:
+                    f.write(code)
+                digest, times = timed(lambda: run_view(client, path), runs)
+                record(name, "view", digest, times, lines, size)
+    finally:
+        shutil.rmtree(root)
+    return results
+
+
+def print_comparison(results, previous):
+    earlier = {(r["corpus"], r["stage"]): r for r in previous.get("results", [])}
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('created')}):")
+    for r in results:
+        old = earlier.get((r["corpus"], r["stage"]))
+        if old is None:
+            continue
+        print(f"  {r['corpus']:22s} {r['stage']:10s} {old['best'] * 1000:10.1f} -> {r['best'] * 1000:10.1f} ms "
+              f"({old['best'] / r['best']:.2f}x)")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argparser.add_argument("--large", action="store_true", help="include the 1M-line sample")
+    argparser.add_argument("--only", help="comma-separated sample names")
+    argparser.add_argument("--stages", default=",".join(STAGES + ["shtype"]), help="comma-separated stages")
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument("--output", help="result file (default: benchmarks/results/<time>.json)")
+    argparser.add_argument("--compare", help="earlier result file to compare with")
+    argparser.add_argument("--update-golden", action="store_true", help="record the current outputs as golden")
+    args = argparser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    if args.only:
+        names = args.only.split(",")
+        unknown = [name for name in names if name not in CORPUS]
+        if unknown:
+            argparser.error(f"unknown samples: {', '.join(unknown)} (known: {', '.join(CORPUS)})")
+    else:
+        names = [name for name, (_, _, _, large) in CORPUS.items() if args.large or not large]
+    stages = args.stages.split(",")
+
+    golden = load_json(GOLDEN_PATH)
+    if golden is not None and golden.get("versions") != versions():
+        print(f"Note: golden outputs were recorded with {golden.get('versions')}, running with {versions()}")
+    results = run_suite(names, stages, args.repeat, None if args.update_golden else golden)
+
+    created = time.strftime("%Y-%m-%dT%H:%M:%S")
+    report = {"created": created, "commit": git_commit(), "python": platform.python_version(),
+              "platform": platform.platform(), "versions": versions(), "results": results}
+    output = args.output or os.path.join(RESULTS_DIR, created.replace(":", "") + ".json")
+    write_json(output, report)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        print_comparison(results, load_json(args.compare))
+
+    if args.update_golden:
+        golden = golden or {}
+        outputs = golden.get("outputs", {})
+        for r in results:
+            outputs.setdefault(r["corpus"], {})[r["stage"]] = r["digest"]
+        write_json(GOLDEN_PATH, {"versions": versions(), "outputs": outputs})
+        print(f"Golden outputs written to {GOLDEN_PATH}")
+        return 0
+
+    mismatches = [r for r in results if r["golden"] == "MISMATCH"]
+    if mismatches:
+        print(f"{len(mismatches)} outputs differ from the golden outputs:")
+        for r in mismatches:
+            print(f"  {r['corpus']} {r['stage']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,8 @@ This solution uses three iterators:
    • Splits each block into individual “tokens” (each corresponding to one line).
    • Each token is classified as follows:
        - If the line is blank, token_type = "whitespace".
-       - If the block’s type is "comment" and the line (after lstrip) begins with "#", token_type = "comment".
+       - If the block’s type is "comment" and the line (after lstrip) begins with a comment marker of the
+         language (see commentsyntax.py), token_type = "comment".
          (This is assumed to be a full‑line comment.)
        - Otherwise, token_type = "code" (this includes inline comment parts that remain embedded within a code line).
    • We record for each token the actual text (“content”), the line number, and its starting column.
@@ -24,22 +25,88 @@ This solution uses three iterators:
 3. group_tokens(tokens):
    • Groups contiguous tokens (from the result of classify_modes) that have the same mode.
    • When outputting a group:
-       - If its mode is "code": join the tokens with newlines, and for any token that is of type "comment" and that starts at column 1, strip the leading comment marker (“#” and one following space, if any). Then wrap the group in a fenced code block (using a language identifier determined from the codetype).
-       - If its mode is "markdown": simply join the tokens with newlines.
+       - If its mode is "code": join the tokens with newlines, and for any token that is of type "comment" and that starts at column 1, strip the leading line comment marker (“#”, “//”, ... and one following space, if any). Then wrap the group in a fenced code block (using a language identifier determined from the codetype).
+       - If its mode is "markdown": simply join the tokens with newlines, comment markers which are not
+         Markdown themselves (“//”, “/*”, “*/”, ... but not “#”) stripped from the comment tokens.
    • Groups are separated by exactly one blank line.
    
 Inline comment tokens (i.e. those that come from code lines and do not start at column 1) remain unchanged.
 Empty tokens (those that are solely whitespace) are used only to break segments.
+
+iter_segments() yields the same segments one at a time, without holding the whole Markdown.
+
+Batch mode: python code2md.py SOURCE_DIR OUTPUT_DIR [--html] [--workers N] [--chunksize N]
 """
 
-from readblocks import PygmentsParser
-from pygments.lexers import get_lexer_by_name
+import os
+import sys
+import json
+import time
+import hashlib
+import functools
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+import commentsyntax
+from readblocks import PygmentsParser, get_lexer, block_start
+from pygments.util import ClassNotFound
+
+class LineToken:
+    """
+    One line-level token (see iter_tokens). Attribute access is the fast path; dict-style access
+    (tok["content"], tok["mode"] = ...) is kept for callers written against the former dicts.
+    """
+    __slots__ = ("token_type", "content", "line", "col", "mode")
+
+    def __init__(self, token_type, content, line, col, mode=None):
+        self.token_type = token_type
+        self.content = content
+        self.line = line
+        self.col = col
+        self.mode = mode
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__ and (key != "mode" or self.mode is not None)
+
+    def __eq__(self, other):
+        if not isinstance(other, LineToken):
+            return NotImplemented
+        return (self.token_type, self.content, self.line, self.col, self.mode) == \
+               (other.token_type, other.content, other.line, other.col, other.mode)
+
+    def __repr__(self):
+        return (f"LineToken({self.token_type!r}, {self.content!r}, line={self.line}, "
+                f"col={self.col}, mode={self.mode!r})")
 
 class MarkdownGenerator:
-    def __init__(self, code, codetype):
+    def __init__(self, code, codetype, first_line=1, hooks=None):
         self.code = code
         self.codetype = codetype
-        self.parser = PygmentsParser(code, codetype)
+        self.parser = PygmentsParser(code, codetype, first_line)
+        # The comment markers of the language (see commentsyntax.py).
+        self.comments = commentsyntax.for_language(self.parser.lexer.name)
+        # Optional function over the block stream, run between the parser and the tokens (see hooks.py).
+        self.hooks = hooks
+
+    def iter_blocks(self):
+        """
+        Yields the parser's blocks, passed through the hooks if there are any.
+        """
+        blocks = self.parser.iter_comments_and_blocks()
+        return self.hooks(blocks) if self.hooks is not None else blocks
     
     # --- Iterator 1: Deep Tokens
     def iter_tokens(self):
@@ -48,43 +115,52 @@ class MarkdownGenerator:
         For each block produced by the parser (which has keys "type", "content", "newline", "positions"),
         split the block by newline characters.
         
-        Each token is a dict with:
+        Each token is a LineToken with:
           - "token_type": "comment", "code", or "whitespace"
           - "content": the text of the line (with no newline)
           - "line": the line number (integer)
           - "col": the starting column (integer, taken from the block for the first line; subsequent lines get col 1)
         """
         tokens = []
-        for block in self.parser.iter_comments_and_blocks():
-            # block["content"] does not include its trailing newline(s)
-            # We split on "\n" (the parser already preserved newlines as separate empty tokens if appropriate)
-            lines = block["content"].split("\n")
-            # Obtain starting position info from block; assume block["positions"]["line-char"][0] is (line, col)
-            start_line, start_col = block["positions"]["line-char"][0]
-            current_line = start_line
-            for i, line in enumerate(lines):
-                if line == "":
-                    token_type = "whitespace"
-                else:
-                    if block["type"] == "comment" and line.lstrip().startswith("#"):
-                        token_type = "comment"
-                    else:
-                        token_type = "code"
-                tokens.append({
-                    "token_type": token_type,
-                    "content": line,
-                    "line": current_line,
-                    "col": start_col if i == 0 else 1
-                })
-                current_line += 1
-            # Note: We do not separately process block["newline"] here;
-            # a trailing newline produces an empty token from the splitting.
+        blocks = 0
+        for block in self.iter_blocks():
+            self.append_block_tokens(block, tokens)
+            blocks += 1
+        metrics.count("blocks", blocks)
+        metrics.count("tokens", len(tokens))
         return tokens
 
+    def append_block_tokens(self, block, tokens):
+        """
+        Splits one parser block into line tokens (see iter_tokens) and appends them to tokens.
+        """
+        append = tokens.append
+        # block["content"] does not include its trailing newline(s)
+        # We split on "\n" (the parser already preserved newlines as separate empty tokens if appropriate)
+        lines = block["content"].split("\n")
+        # Starting position of the block, located by the parser's LineOffsets (see readblocks.block_start).
+        start_line, start_col = block_start(block)
+        is_comment_block = block["type"] == "comment"
+        marker = self.comments.marker
+        col = start_col
+        for current_line, line in enumerate(lines, start_line):
+            if line == "":
+                token_type = "whitespace"
+            elif is_comment_block and marker(line.lstrip()) is not None:
+                token_type = "comment"
+            else:
+                token_type = "code"
+            append(LineToken(token_type, line, current_line, col))
+            col = 1
+        # Note: We do not separately process block["newline"] here;
+        # a trailing newline produces an empty token from the splitting.
+
     # --- Iterator 2: Classify Modes
-    def classify_modes(self, tokens):
+    def classify_modes(self, tokens, start=0, end=None):
         """
         Takes the list of tokens (from iter_tokens) and assigns a "mode" to each token.
+        Only tokens[start:end] are (re)classified; the tokens just outside that range are used as
+        context, so the range should not cut through a run of comment tokens.
         
         Initial assignment:
           - If token_type == "code": mode = "code"
@@ -92,24 +168,39 @@ class MarkdownGenerator:
         
         Then, for every token with mode "code", propagate that mode to adjacent tokens if they are comments.
         Propagation stops if there is a whitespace token.
+
+        Equivalently, a run of consecutive comment tokens becomes "code" as a whole if a code token
+        directly precedes or follows it. This is decided with one forward and one backward sweep,
+        so long comment runs are visited twice at most.
         """
-        # Initial assignment:
-        for tok in tokens:
-            tok["mode"] = "code" if tok["token_type"] == "code" else "markdown"
-        
-        n = len(tokens)
-        for i, tok in enumerate(tokens):
-            if tok["mode"] == "code":
-                # Propagate upward.
-                j = i - 1
-                while j >= 0 and tokens[j]["token_type"] == "comment":
-                    tokens[j]["mode"] = "code"
-                    j -= 1
-                # Propagate downward.
-                k = i + 1
-                while k < n and tokens[k]["token_type"] == "comment":
-                    tokens[k]["mode"] = "code"
-                    k += 1
+        if end is None:
+            end = len(tokens)
+        window = tokens[start:end] if start or end != len(tokens) else tokens
+
+        # Initial assignment, and forward sweep: comments following code (through comments only).
+        after_code = start > 0 and tokens[start - 1].token_type == "code"
+        for tok in window:
+            token_type = tok.token_type
+            if token_type == "code":
+                tok.mode = "code"
+                after_code = True
+            elif token_type == "comment":
+                tok.mode = "code" if after_code else "markdown"
+            else:
+                tok.mode = "markdown"
+                after_code = False
+
+        # Backward sweep: comments preceding code.
+        before_code = end < len(tokens) and tokens[end].token_type == "code"
+        for tok in reversed(window):
+            token_type = tok.token_type
+            if token_type == "code":
+                before_code = True
+            elif token_type == "comment":
+                if before_code:
+                    tok.mode = "code"
+            else:
+                before_code = False
         return tokens
 
     # --- Iterator 3: Group Tokens and Wrap Code Blocks
@@ -122,20 +213,22 @@ class MarkdownGenerator:
           
         When joining tokens:
           • For tokens that are comments and with starting col == 1 (i.e. full-line comments)
-            and when the segment mode is "code", remove the leading comment marker.
+            and when the segment mode is "code", remove the leading line comment marker.
+          • Comment tokens of "markdown" segments lose markers which are not Markdown (see
+            commentsyntax.CommentSyntax.strip).
           • Inline comment tokens (col > 1) are left unchanged.
         """
         if not tokens:
             return []
         segments = []
-        current_mode = tokens[0]["mode"]
+        current_mode = tokens[0].mode
         current_tokens = [tokens[0]]
         for tok in tokens[1:]:
-            if tok["mode"] == current_mode:
+            if tok.mode == current_mode:
                 current_tokens.append(tok)
             else:
                 segments.append({"mode": current_mode, "tokens": current_tokens})
-                current_mode = tok["mode"]
+                current_mode = tok.mode
                 current_tokens = [tok]
         segments.append({"mode": current_mode, "tokens": current_tokens})
         return segments
@@ -147,36 +240,111 @@ class MarkdownGenerator:
         Otherwise, output as plain Markdown.
         Joining is done with exactly "\n" between tokens.
         """
-        out_segments = []
-        for seg in segments:
-            # Process tokens:
-            lines = []
-            for tok in seg["tokens"]:
-                txt = tok["content"]
-                if tok["token_type"] == "comment" and tok["col"] == 1 and seg["mode"] == "code":
-                    # Full-line comment: remove leading "#" and one extra space if present.
-                    if txt.startswith("# "):
-                        txt = txt[2:]
-                    elif txt.startswith("#"):
-                        txt = txt[1:]
-                lines.append(txt)
-            seg_text = "\n".join(lines).rstrip("\n")
-            if seg["mode"] == "code":
-                lang = self._get_markdown_language(self.codetype)
-                seg_text = f"```{lang}\n{seg_text}\n```"
-            out_segments.append(seg_text)
+        out_segments = [self.segment_text(seg["mode"], seg["tokens"]) for seg in segments]
         # Join segments with exactly one blank line
         return "\n\n".join(out_segments)
 
+    def segment_text(self, mode, tokens):
+        """
+        Produces the text of one segment (see produce_segments_text).
+        """
+        # Process tokens:
+        lines = []
+        comments = self.comments
+        for tok in tokens:
+            txt = tok.content
+            if tok.token_type == "comment":
+                if mode != "code":
+                    # Shown as Markdown: without its comment marker, unless that is Markdown ("#").
+                    txt = comments.strip(txt)
+                elif tok.col == 1:
+                    # Full-line comment: remove its line comment marker and one extra space if present.
+                    txt = comments.strip_marker(txt)
+            lines.append(txt)
+        seg_text = "\n".join(lines).rstrip("\n")
+        if mode == "code":
+            lang = self._get_markdown_language(self.codetype)
+            seg_text = f"```{lang}\n{seg_text}\n```"
+        return seg_text
+
     def generate_markdown(self):
+        # Each step is timed as a stage of the current render, if one is recorded (see metrics.py).
         # First iterator: get deep tokens.
-        tokens = self.iter_tokens()
+        with metrics.stage("lex"):
+            tokens = self.iter_tokens()
         # Second iterator: classify tokens into modes.
-        tokens = self.classify_modes(tokens)
-        # Third: group tokens into segments.
-        segments = self.group_tokens(tokens)
-        # Then produce final output text.
-        return self.produce_segments_text(segments)
+        with metrics.stage("classify"):
+            tokens = self.classify_modes(tokens)
+        with metrics.stage("markdown"):
+            # Third: group tokens into segments.
+            segments = self.group_tokens(tokens)
+            metrics.count("segments", len(segments))
+            # Then produce final output text.
+            return self.produce_segments_text(segments)
+
+    def iter_segments(self):
+        """
+        Yields the text of each segment, as generate_markdown() would join them, without building
+        the token list: tokens are classified as soon as the mode of their comment run is known
+        (see classify_modes) and a segment is produced as soon as the mode changes.
+        "\n\n".join(iter_segments()) equals generate_markdown().
+        """
+        for mode, segment in self.iter_token_segments():
+            yield self.segment_text(mode, segment)
+
+    def iter_segments_with_modes(self):
+        """
+        Yields (mode, text) for each segment of iter_segments(): "code" segments are one fenced
+        code block each (see renderers.py, which renders them without parsing Markdown).
+        """
+        for mode, segment in self.iter_token_segments():
+            yield mode, self.segment_text(mode, segment)
+
+    def iter_token_segments(self):
+        """
+        Yields (mode, tokens) for each segment, as group_tokens() would group them, lazily (see
+        iter_segments).
+        """
+        mode = None
+        segment = []
+        for tok in self._iter_classified_tokens():
+            if tok.mode != mode:
+                if segment:
+                    yield mode, segment
+                mode = tok.mode
+                segment = []
+            segment.append(tok)
+        if segment:
+            yield mode, segment
+
+    def _iter_classified_tokens(self):
+        """
+        Yields the line tokens of iter_tokens() lazily, with modes assigned as classify_modes() does.
+        """
+        after_code = False
+        run = []  # comment tokens whose mode is not decided yet
+        tokens = []
+        for block in self.iter_blocks():
+            self.append_block_tokens(block, tokens)
+            for tok in tokens:
+                token_type = tok.token_type
+                if token_type == "comment":
+                    run.append(tok)
+                    continue
+                if run:
+                    # A comment run is code if code directly precedes or follows it.
+                    run_mode = "code" if after_code or token_type == "code" else "markdown"
+                    for comment in run:
+                        comment.mode = run_mode
+                        yield comment
+                    run = []
+                after_code = token_type == "code"
+                tok.mode = "code" if after_code else "markdown"
+                yield tok
+            tokens.clear()
+        for comment in run:
+            comment.mode = "code" if after_code else "markdown"
+            yield comment
 
     def _get_markdown_language(self, codetype):
         language_map = {
@@ -190,14 +358,218 @@ class MarkdownGenerator:
         if codetype in language_map:
             return language_map[codetype]
         try:
-            lexer = get_lexer_by_name(codetype)
+            lexer = get_lexer(codetype)
             if lexer.aliases:
                 return lexer.aliases[0]
         except Exception:
             pass
         return "plaintext"
 
+# ---------------------------------------------------------------------
+# Batch conversion of source trees.
+# ---------------------------------------------------------------------
+# The manifest in the output directory records size, mtime and SHA-256 of every converted file: files
+# with unchanged size and mtime are skipped without being read, and files whose content hash is
+# unchanged are not converted again.
+MANIFEST_NAME = ".code2md-manifest.json"
+MANIFEST_VERSION = 1
+
+def resolve_language(extension, shtype):
+    """
+    Returns a Pygments lexer name for the file extension (e.g. ".py" -> "Python"): the first of
+    Shtype's languages which get_lexer_by_name() accepts, or None.
+    """
+    return _first_known_language(tuple(shtype.get_languages_by_extension(extension)))
+
+@functools.lru_cache(maxsize=1024)
+def _first_known_language(languages):
+    for language in languages:
+        try:
+            get_lexer(language)
+        except ClassNotFound:
+            continue
+        return language
+    return None
+
+def iter_source_files(source_dir, shtype):
+    """
+    Yields (relative path, language) for every file below source_dir which can be converted.
+    Directories are walked in sorted order; hidden directories are skipped.
+    """
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            extension = os.path.splitext(name)[1].lower()
+            if not shtype.is_supported_extension(extension):
+                continue
+            language = resolve_language(extension, shtype)
+            if language is not None:
+                rel_path = os.path.relpath(os.path.join(root, name), source_dir)
+                yield rel_path, language
+
+def load_manifest(output_dir):
+    """
+    Returns the manifest entries (relative path -> dict) stored in output_dir, or {}.
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(output_dir, entries):
+    """
+    Writes the manifest atomically (temporary file + rename).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": entries}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+
+def output_paths(output_dir, rel_path, html):
+    """
+    Returns the output paths (Markdown, HTML or None) for a source file; output mirrors the tree
+    ("pkg/mod.py" becomes "pkg/mod.py.md" and "pkg/mod.py.html").
+    """
+    base = os.path.join(output_dir, rel_path)
+    return base + ".md", (base + ".html" if html else None)
+
+def markdown_to_html(md_content):
+    """
+    Renders Markdown to HTML as app.py does (Task3Highlighter, then Mistune with highlighted fences).
+    """
+    from highlighter import Task3Highlighter
+    import fences
+    return fences.markdown_to_html(Task3Highlighter(md_content).process())
+
+def _write_text(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def convert_file(task):
+    """
+    Worker function of the batch converter. task is
+    (source path, relative path, language, Markdown path, HTML path or None, known digest or None).
+
+    Returns (relative path, status, digest, size, error) where status is "converted", "unchanged"
+    (the content hash equals the known digest and the outputs exist) or "failed".
+    """
+    source_path, rel_path, language, md_path, html_path, known_digest = task
+    try:
+        with open(source_path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == known_digest and os.path.exists(md_path) and (html_path is None or os.path.exists(html_path)):
+            return rel_path, "unchanged", digest, len(data), None
+        md_content = MarkdownGenerator(data.decode("utf-8"), language).generate_markdown()
+        _write_text(md_path, md_content)
+        if html_path is not None:
+            _write_text(html_path, markdown_to_html(md_content))
+        return rel_path, "converted", digest, len(data), None
+    except Exception as e:
+        return rel_path, "failed", None, 0, f"{type(e).__name__}: {e}"
+
+def convert_tree(source_dir, output_dir, html=False, workers=None, chunksize=64, log=print):
+    """
+    Converts all supported files below source_dir into output_dir, in a ProcessPoolExecutor which
+    is handed the files in chunks of chunksize. The outputs of files converted by an earlier run
+    whose source is gone are deleted.
+    Returns a dict of counters: "converted", "unchanged", "skipped", "failed", "removed", "bytes",
+    "seconds".
+    """
+    from shtype import Shtype
+
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    old_entries = load_manifest(output_dir)
+    entries = {}
+    stats = {"converted": 0, "unchanged": 0, "skipped": 0, "failed": 0, "removed": 0, "bytes": 0}
+
+    tasks = []
+    pending = {}  # relative path -> (language, size, mtime_ns)
+    seen = set()
+    for rel_path, language in iter_source_files(source_dir, Shtype()):
+        seen.add(rel_path)
+        source_path = os.path.join(source_dir, rel_path)
+        md_path, html_path = output_paths(output_dir, rel_path, html)
+        st = os.stat(source_path)
+        old = old_entries.get(rel_path)
+        if old is not None and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns \
+                and old["language"] == language and (old.get("html") or not html) and os.path.exists(md_path):
+            # Unchanged since the last run: not even read.
+            entries[rel_path] = old
+            stats["skipped"] += 1
+            continue
+        known_digest = old["sha256"] if old is not None and old["language"] == language else None
+        pending[rel_path] = (language, st.st_size, st.st_mtime_ns)
+        tasks.append((source_path, rel_path, language, md_path, html_path, known_digest))
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rel_path, status, digest, size, error in executor.map(convert_file, tasks, chunksize=chunksize):
+                stats[status] += 1
+                if status == "failed":
+                    log(f"FAILED {rel_path}: {error}")
+                    continue
+                stats["bytes"] += size
+                language, st_size, st_mtime_ns = pending[rel_path]
+                # A converted file only has a (current) HTML output if it was requested.
+                has_html = html or (status == "unchanged" and old_entries[rel_path].get("html", False))
+                entries[rel_path] = {"size": st_size, "mtime_ns": st_mtime_ns, "sha256": digest,
+                                     "language": language, "html": has_html}
+
+    for rel_path in sorted(set(old_entries) - seen):
+        remove_outputs(output_dir, rel_path)
+        stats["removed"] += 1
+
+    save_manifest(output_dir, entries)
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+def remove_outputs(output_dir, rel_path):
+    """
+    Deletes the outputs of a source file, and the directories this leaves empty.
+    """
+    for path in output_paths(output_dir, rel_path, True):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    directory = os.path.dirname(os.path.join(output_dir, rel_path))
+    while os.path.abspath(directory) != os.path.abspath(output_dir):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Not empty (or already gone).
+            break
+        directory = os.path.dirname(directory)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a source tree to Markdown (and optionally HTML).")
+    parser.add_argument("source_dir", help="directory to convert")
+    parser.add_argument("output_dir", help="directory for the .md (and .html) files and the manifest")
+    parser.add_argument("--html", action="store_true", help="also render HTML, as the web app does")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=64, help="files handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    stats = convert_tree(args.source_dir, args.output_dir, html=args.html,
+                         workers=args.workers, chunksize=args.chunksize)
+    seconds = stats["seconds"]
+    processed = stats["converted"] + stats["unchanged"]
+    print(f"Converted {stats['converted']} files ({stats['unchanged']} unchanged, "
+          f"{stats['skipped']} skipped, {stats['failed']} failed, {stats['removed']} removed) in {seconds:.2f} s")
+    print(f"Throughput: {processed / seconds:.1f} files/s, {stats['bytes'] / seconds / 1e6:.2f} MB/s")
+    return 1 if stats["failed"] else 0
+
 if __name__ == "__main__":
+    # Without arguments, the example below is converted.
+    if len(sys.argv) > 1:
+        sys.exit(main())
     example_code = r'''# This is a full-line comment
 def example_function():
     """Block comment."""
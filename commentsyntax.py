@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+commentsyntax.py – Recognizing and stripping the comment markers of full-line comments, per language.
+
+The markers come from the comment syntax table Shtype derives from the Pygments lexers; a language
+without any gets DEFAULT ("#" comments).
+"""
+
+import functools
+import threading
+
+import readblocks
+from shtype import Shtype
+
+# Markers which are Markdown themselves (a heading): strip() keeps them, so Python comments are
+# shown as written.
+MARKDOWN_MARKERS = frozenset({"#"})
+
+# Language names and aliases whose CommentSyntax for_language() keeps.
+SYNTAX_CACHE_SIZE = 256
+
+_shtype = None
+_lock = threading.Lock()
+
+
+def _by_length(markers):
+    """
+    Returns ((length, set of markers), ...) of markers, longest first.
+    """
+    lengths = {}
+    for marker in markers:
+        lengths.setdefault(len(marker), set()).add(marker)
+    return tuple((length, frozenset(lengths[length])) for length in sorted(lengths, reverse=True))
+
+
+class CommentSyntax:
+    def __init__(self, line=(), block=(), doc=(), continuation=(), hashbang=()):
+        """
+        The arguments are the lists of a comment syntax table entry (see shtype.derive_comment_syntax).
+        """
+        self.line = tuple(line)
+        self.block = tuple((opener, closer) for opener, closer in block)
+        self.doc = tuple(doc)
+        self.continuation = tuple(continuation)
+        self.hashbang = tuple(hashbang)
+        self.closers = tuple(closer for _, closer in self.block)
+        # Grouped by length, marker() compares one slice of the line per length with a set (one
+        # length for most languages) instead of a chain of startswith calls or a regular expression.
+        self._starts = _by_length(self.line + tuple(opener for opener, _ in self.block) + self.closers
+                                  + self.doc + self.continuation)
+        self._line_markers = _by_length(self.line)
+        self._hashbangs = _by_length(self.hashbang)
+
+    def __bool__(self):
+        return bool(self.line or self.block)
+
+    def __repr__(self):
+        return f"CommentSyntax(line={self.line!r}, block={self.block!r}, doc={self.doc!r})"
+
+    def marker(self, text):
+        """
+        Returns the comment marker text starts with (the longest one), or None.
+        """
+        for length, markers in self._starts:
+            marker = text[:length]
+            if marker in markers:
+                return marker
+        return None
+
+    def is_comment(self, stripped):
+        """
+        Returns True if a line with its leading whitespace stripped is a comment line: it starts
+        with a comment marker and is not a hashbang line.
+        """
+        if self.marker(stripped) is None:
+            return False
+        for length, hashbangs in self._hashbangs:
+            if stripped[:length] in hashbangs:
+                return False
+        return True
+
+    def strip_marker(self, text):
+        """
+        Removes the line comment marker text starts with, and one following space if present.
+        """
+        for length, markers in self._line_markers:
+            if text[:length] in markers:
+                return text[length + 1:] if text[length:length + 1] == " " else text[length:]
+        return text
+
+    def strip(self, line):
+        """
+        Returns the text of a comment line shown as Markdown: without its leading whitespace and
+        comment marker (and one space after it), and without a block comment closer ending it (and
+        one space before it).
+        Lines starting with a marker of MARKDOWN_MARKERS, or with none, are returned unchanged.
+        """
+        start = len(line) - len(line.lstrip())
+        marker = self.marker(line[start:])
+        if marker is None or marker in MARKDOWN_MARKERS:
+            return line
+        start += len(marker)
+        if line[start:start + 1] == " ":
+            start += 1
+        end = len(line)
+        for closer in self.closers:
+            if end - len(closer) >= start and line[end - len(closer):] == closer:
+                end -= len(closer)
+                if end > start and line[end - 1] == " ":
+                    end -= 1
+                break
+        return line[start:end]
+
+
+DEFAULT = CommentSyntax(line=("#",), hashbang=("#!",))
+
+
+@functools.lru_cache(maxsize=SYNTAX_CACHE_SIZE)
+def for_language(name):
+    """
+    Returns the CommentSyntax of a language name or alias (e.g. "Python", "c", a fence's language),
+    or DEFAULT for a language without comment markers, an unknown one or None.
+    """
+    if not name:
+        return DEFAULT
+    global _shtype
+    lexer = readblocks.find_lexer(name)
+    with _lock:
+        if _shtype is None:
+            _shtype = Shtype()
+        entry = _shtype.get_comment_syntax(lexer.name if lexer is not None else name)
+    syntax = CommentSyntax(**entry) if entry else None
+    return syntax if syntax else DEFAULT
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+compression.py – Precompressed variants of rendered pages and Accept-Encoding negotiation.
+
+Optional package (for "br"):
+    pip install brotli
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional: without it, pages are only precompressed with gzip.
+    brotli = None
+
+# A page is compressed once and the variants are cached (see app.encoded_page), so the levels
+# favour size over speed.
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# Supported encodings, most preferred first.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+_ETAG_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def compress(data, encoding):
+    """
+    Returns the bytes data compressed with encoding ("gzip" or "br").
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # wbits 31: a gzip container (header and CRC) rather than a bare zlib stream.
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    raise ValueError(f"Unsupported encoding {encoding!r}")
+
+
+def compress_variants(data):
+    """
+    Returns {encoding: compressed bytes} of data for every supported encoding.
+    """
+    return {encoding: compress(data, encoding) for encoding in ENCODINGS}
+
+
+def negotiate(accept_encoding):
+    """
+    Returns the encoding for a response to a request with the given Accept-Encoding header value
+    (or None if it had none): a supported encoding the client accepts, or None.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def etag_for(etag, encoding):
+    """
+    Returns the ETag of the encoding variant of the representation whose ETag is etag: each variant
+    is a different representation, so its ETag gets a suffix.
+    """
+    return etag + _ETAG_SUFFIXES[encoding] if encoding else etag
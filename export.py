@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+export.py – Static export of the code browser: every directory listing and file view of app.py,
+rendered once into a directory which a plain web server can serve without running any code.
+
+Usage:
+    python export.py OUTPUT_DIR [--base-dir DIR] [--workers N] [--chunksize N] [--force]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import app as webapp
+import sourcefile
+
+MANIFEST_NAME = ".export-manifest.json"
+MANIFEST_VERSION = 1
+
+_client = None  # Flask test client of a worker process
+
+
+def page_path(output_dir, route, rel_path):
+    """
+    Returns where the page of route ("browse" or "view") for rel_path is written: where a static
+    server finds it under the route's URL ("/view/<file>" is redirected to "/view/<file>/", whose
+    index.html is served), so the absolute links in the pages work unchanged.
+    """
+    if route == "browse" and rel_path == "":
+        return os.path.join(output_dir, "index.html")
+    return os.path.join(output_dir, route, rel_path, "index.html")
+
+
+def line_page_name(first):
+    """
+    Returns the file name, in the directory of its view page, of the page of a huge file starting
+    at line first: a static server cannot answer ?line=N, so each page is a file of its own.
+    """
+    return "index.html" if first == 1 else f"lines-{first}.html"
+
+
+def iter_tree(base_dir, output_dir):
+    """
+    Yields (relative directory, relative file paths) for base_dir and every directory below it,
+    in sorted order; symlinked directories and output_dir (if inside base_dir) are skipped.
+    """
+    output_dir = os.path.abspath(output_dir)
+    for root, dirs, files in os.walk(base_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_dir)
+        rel_dir = os.path.relpath(root, base_dir)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        yield rel_dir, [os.path.join(rel_dir, name) for name in sorted(files)]
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(output_dir, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+
+
+def write_page(path, data, only_if_changed=False):
+    """
+    Writes a page atomically; returns False if only_if_changed and the page is already there.
+    """
+    if only_if_changed:
+        try:
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+        except OSError:
+            pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def remove_page(output_dir, route, rel_path):
+    """
+    Removes a page and the directories left empty by it.
+    """
+    path = page_path(output_dir, route, rel_path)
+    try:
+        os.remove(path)
+    except OSError:
+        return
+    directory = os.path.dirname(path)
+    if route == "view":
+        remove_line_pages(directory, set())
+    root = os.path.join(output_dir, route)
+    while directory != root and directory.startswith(root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def remove_line_pages(directory, keep):
+    """
+    Removes the pages of a huge file (see line_page_name) in directory whose names are not in keep.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if re.fullmatch(r"lines-\d+\.html", name) and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+
+def page_url(route, rel_path, **args):
+    """
+    Returns the app's URL of the page of route and rel_path, with args as query arguments.
+    """
+    with webapp.app.test_request_context():
+        return webapp.url_for(route if route == "browse" else "view_file", subpath=rel_path, **args)
+
+
+def render(route, rel_path, **args):
+    """
+    Returns (status code, body) of the app's response for the page of route and rel_path (args are
+    the query arguments): the same bytes the route sends.
+    """
+    response = _client.get(page_url(route, rel_path, **args))
+    return response.status_code, response.get_data()
+
+
+def export_line_pages(rel_path, out_path):
+    """
+    Writes the pages of a huge file (see app.view_file_lines), following the links between them,
+    each to the file of line_page_name next to out_path, with the links rewritten to those files.
+    Pages left from a longer version of the file are removed. Returns None, or the error of the
+    first page which could not be rendered.
+    """
+    directory = os.path.dirname(out_path)
+    view_url = page_url("view", rel_path)
+    # The links of app.line_page_links: view_url?line=N.
+    line_link = re.compile(f'href="{re.escape(view_url)}\\?line=(\\d+)"')
+    pending = [1]
+    written = set()
+    while pending:
+        first = pending.pop()
+        name = line_page_name(first)
+        if name in written:
+            continue
+        status, body = render("view", rel_path, line=first)
+        if status != 200:
+            return f"HTTP {status} for line {first}"
+
+        def static_link(match):
+            line = int(match.group(1))
+            pending.append(line)
+            return f'href="{view_url}/"' if line == 1 else f'href="{view_url}/{line_page_name(line)}"'
+
+        write_page(os.path.join(directory, name), line_link.sub(static_link, body.decode("utf-8")).encode("utf-8"))
+        written.add(name)
+    remove_line_pages(directory, written)
+    return None
+
+
+def init_worker(base_dir):
+    """
+    Prepares the app in a worker process (and in the main process, for the listings).
+    """
+    global _client
+    logging.getLogger().setLevel(logging.WARNING)
+    webapp.BASE_DIR = base_dir
+    # One page per listing: a static server cannot answer ?page=N.
+    webapp.LISTING_PAGE_SIZE = sys.maxsize
+    _client = webapp.app.test_client()
+
+
+def export_file(task):
+    """
+    Worker function: renders the view of one file. task is (relative path, output path, known
+    digest or None). Returns (relative path, status, digest, error) where status is "rendered",
+    "unchanged" (the content hash equals the known digest and the page exists) or "failed".
+    """
+    rel_path, out_path, known_digest = task
+    try:
+        with sourcefile.mapped(os.path.join(webapp.BASE_DIR, rel_path)) as data:
+            digest = hashlib.sha256(data).hexdigest()
+        if digest == known_digest and os.path.exists(out_path):
+            return rel_path, "unchanged", digest, None
+        if os.path.getsize(os.path.join(webapp.BASE_DIR, rel_path)) > webapp.MAX_RENDER_BYTES:
+            error = export_line_pages(rel_path, out_path)
+            if error is not None:
+                return rel_path, "failed", None, error
+            return rel_path, "rendered", digest, None
+        status, body = render("view", rel_path)
+        if status != 200:
+            return rel_path, "failed", None, f"HTTP {status}"
+        write_page(out_path, body)
+        # The file may have been paged before.
+        remove_line_pages(os.path.dirname(out_path), set())
+        return rel_path, "rendered", digest, None
+    except Exception as e:
+        return rel_path, "failed", None, f"{type(e).__name__}: {e}"
+
+
+def export_tree(base_dir, output_dir, workers=None, chunksize=16, force=False, log=print):
+    """
+    Exports all listings and file views of base_dir into output_dir. Files whose size and mtime
+    (or content hash) are unchanged since the manifest are not rendered again, unless the
+    configuration (app.config_digest) changed or force is set; pages of removed files are deleted.
+    Returns a dict of counters: "rendered", "unchanged", "skipped", "failed", "listings",
+    "removed", "seconds".
+    """
+    started = time.perf_counter()
+    base_dir = os.path.abspath(base_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    init_worker(base_dir)
+    config = webapp.config_digest()
+    old = load_manifest(output_dir) or {}
+    old_files = old.get("files", {}) if old.get("config") == config and not force else {}
+    files = {}
+    dirs = []
+    stats = {"rendered": 0, "unchanged": 0, "skipped": 0, "failed": 0, "listings": 0, "removed": 0}
+
+    # The style sheet of the file views, under its fingerprinted URL.
+    stylesheet = _client.get(webapp.STYLESHEET_URL).get_data()
+    write_page(os.path.join(output_dir, webapp.STYLESHEET_URL.lstrip("/")), stylesheet, only_if_changed=True)
+
+    tasks = []
+    pending = {}  # relative path -> (size, mtime_ns)
+    for rel_dir, rel_files in iter_tree(base_dir, output_dir):
+        dirs.append(rel_dir)
+        status, body = render("browse", rel_dir)
+        if status != 200:
+            log(f"FAILED listing of /{rel_dir}: HTTP {status}")
+            stats["failed"] += 1
+        else:
+            stats["listings"] += write_page(page_path(output_dir, "browse", rel_dir), body, only_if_changed=True)
+            if rel_dir == "":
+                write_page(os.path.join(output_dir, "browse", "index.html"), body, only_if_changed=True)
+        for rel_path in rel_files:
+            st = os.stat(os.path.join(base_dir, rel_path))
+            out_path = page_path(output_dir, "view", rel_path)
+            known = old_files.get(rel_path)
+            if known is not None and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns \
+                    and os.path.exists(out_path):
+                files[rel_path] = known
+                stats["skipped"] += 1
+                continue
+            pending[rel_path] = (st.st_size, st.st_mtime_ns)
+            tasks.append((rel_path, out_path, known["sha256"] if known is not None else None))
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(base_dir,)) as executor:
+            for rel_path, status, digest, error in executor.map(export_file, tasks, chunksize=chunksize):
+                stats[status] += 1
+                if status == "failed":
+                    log(f"FAILED {rel_path}: {error}")
+                    continue
+                size, mtime_ns = pending[rel_path]
+                files[rel_path] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest}
+
+    # Pages of files and directories which are gone.
+    for rel_path in set(old.get("files", {})) - set(files) - set(pending):
+        remove_page(output_dir, "view", rel_path)
+        stats["removed"] += 1
+    for rel_dir in set(old.get("dirs", [])) - set(dirs):
+        if rel_dir:
+            remove_page(output_dir, "browse", rel_dir)
+            stats["removed"] += 1
+
+    save_manifest(output_dir, {"version": MANIFEST_VERSION, "config": config, "files": files, "dirs": dirs})
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the code browser of a directory as a static site.")
+    parser.add_argument("output_dir", help="directory for the static site and the manifest")
+    parser.add_argument("--base-dir", default=os.getcwd(), help="directory to export (default: the current one)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=16, help="files handed to a worker at a time")
+    parser.add_argument("--force", action="store_true", help="render every file, even if unchanged")
+    args = parser.parse_args(argv)
+
+    stats = export_tree(args.base_dir, args.output_dir, workers=args.workers, chunksize=args.chunksize,
+                        force=args.force)
+    print(f"Rendered {stats['rendered']} files ({stats['unchanged']} unchanged, {stats['skipped']} skipped, "
+          f"{stats['failed']} failed), wrote {stats['listings']} listings, removed {stats['removed']} pages "
+          f"in {stats['seconds']:.2f} s")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
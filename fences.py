@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+fences.py – Markdown to HTML with server-side Pygments highlighting of the fenced code blocks.
+
+The highlighted HTML of a fence is memoized per snippet (fence_cache), shared by all documents.
+"""
+
+import os
+import re
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import mistune
+from mistune.util import safe_entity
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+
+import metrics
+import readblocks
+from rendercache import RenderCache
+
+CSS_CLASS = "pygments"
+STYLE = "default"
+
+FENCE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Process pool for very large documents (None disables it). Off by default: most documents are far
+# below POOL_MIN_BYTES, and under asgi.py rendering already runs in worker processes.
+POOL_WORKERS = None
+POOL_MIN_BYTES = 1024 * 1024
+POOL_CHUNK_BYTES = 256 * 1024
+
+# Highlighted fences by (lexer, SHA-256 of the code): a snippet repeated within a file or across
+# files is highlighted once.
+fence_cache = RenderCache(max_bytes=FENCE_CACHE_MAX_BYTES)
+
+# Placeholders carry a per-process token so that text in a document cannot be mistaken for one.
+_TOKEN = os.urandom(8).hex()
+_PLACEHOLDER = re.compile(f"\x02{_TOKEN}:(\\d+)\x03")
+
+_formatter = HtmlFormatter(nowrap=True)
+_plain_renderer = mistune.HTMLRenderer(escape=False)  # block_code() of fences without a known language
+_local = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_lexer(language):
+    """
+    Returns the Pygments lexer for a fence's language name, or None.
+    """
+    # stripnl=False: the code is highlighted exactly as written (Pygments strips blank lines by default).
+    return readblocks.find_lexer(language, False)
+
+
+def highlight_code(language, code):
+    """
+    Returns the highlighted HTML (token spans, without the <pre>) of code in language.
+    """
+    return highlight(code, get_lexer(language), _formatter)
+
+
+def highlight_group(language, codes):
+    """
+    Highlights several fences of one language; runs in the pool for large documents.
+    """
+    return [highlight_code(language, code) for code in codes]
+
+
+def stylesheet():
+    """
+    Returns the CSS of the token classes in highlighted fences.
+    """
+    return HtmlFormatter(style=STYLE).get_style_defs(f".{CSS_CLASS}") + "\n"
+
+
+def fence_language(info):
+    """
+    Returns the language a fence's info string names if Pygments knows it, otherwise None.
+    """
+    language = info.strip().split(None, 1)[0] if info and info.strip() else None
+    if language is None or get_lexer(language) is None:
+        return None
+    return language
+
+
+def _highlighted_block(info, html):
+    css_language = safe_entity(info.strip()).split(None, 1)[0]
+    return f'<pre class="{CSS_CLASS}"><code class="language-{css_language}">{html}</code></pre>\n'
+
+
+class FenceRenderer(mistune.HTMLRenderer):
+    """
+    Mistune's HTML renderer, but fences in a known language are recorded in self.fences (as
+    (language, code)) and replaced by a placeholder.
+    """
+
+    def __init__(self):
+        super().__init__(escape=False)
+        self.fences = []
+
+    def block_code(self, code, info=None):
+        language = fence_language(info)
+        if language is None:
+            return super().block_code(code, info)
+        self.fences.append((language, code))
+        return _highlighted_block(info, f"\x02{_TOKEN}:{len(self.fences) - 1}\x03")
+
+
+def _parser():
+    # Mistune parsers keep the renderer's state while rendering: one per thread.
+    if not hasattr(_local, "markdown"):
+        _local.renderer = FenceRenderer()
+        _local.markdown = mistune.create_markdown(escape=False, renderer=_local.renderer)
+    return _local.markdown, _local.renderer
+
+
+def markdown_to_html(text):
+    """
+    Converts Markdown to HTML with Mistune (escape=False, as app.py always did) and highlights its
+    fences: FenceRenderer leaves a placeholder for each, and they are highlighted together afterwards.
+    """
+    markdown, renderer = _parser()
+    renderer.fences = []
+    with metrics.stage("mistune"):
+        html = markdown(text)
+    fences, renderer.fences = renderer.fences, []
+    if not fences:
+        return html
+    with metrics.stage("fences"):
+        highlighted = highlight_fences(fences)
+        return _PLACEHOLDER.sub(lambda m: highlighted[int(m.group(1))], html)
+
+
+def code_blocks_html(blocks):
+    """
+    Returns the HTML of each (info string, code) in blocks, exactly as markdown_to_html() renders a
+    fence with that info string and content (code ending with a newline, as Mistune passes it), but
+    without parsing any Markdown: the fences in a known language are highlighted together (see
+    highlight_fences), the others escaped as Mistune does.
+    """
+    results = [None] * len(blocks)
+    known = []  # (index in blocks, language, code)
+    for i, (info, code) in enumerate(blocks):
+        language = fence_language(info)
+        if language is None:
+            results[i] = _plain_renderer.block_code(code, info)
+        else:
+            known.append((i, language, code))
+    if known:
+        with metrics.stage("fences"):
+            highlighted = highlight_fences([(language, code) for _, language, code in known])
+        for (i, _, _), html in zip(known, highlighted):
+            results[i] = _highlighted_block(blocks[i][0], html)
+    return results
+
+
+def highlight_fences(fences):
+    """
+    Returns the highlighted HTML of each (language, code) in fences, from fence_cache where
+    possible; the others are highlighted once each (in the pool for a large document) and cached.
+    """
+    results = [None] * len(fences)
+    missing = {}  # cache key -> (language, code, indexes in fences)
+    for i, (language, code) in enumerate(fences):
+        key = RenderCache.make_key("fence", hashlib.sha256(code.encode("utf-8")).hexdigest(),
+                                   get_lexer(language).aliases[0])
+        if key in missing:
+            missing[key][2].append(i)
+            continue
+        html = fence_cache.get(key)
+        if html is not None:
+            results[i] = html
+        else:
+            missing[key] = (language, code, [i])
+    metrics.count("fences", len(fences))
+    if not missing:
+        return results
+    metrics.count("fences_highlighted", len(missing))
+
+    groups = {}  # language -> [cache key]
+    for key, (language, _, _) in missing.items():
+        groups.setdefault(language, []).append(key)
+    size = sum(len(code) for _, code, _ in missing.values())
+    if POOL_WORKERS and size >= POOL_MIN_BYTES:
+        chunks = []  # (language, [cache key])
+        for language, keys in groups.items():
+            chunk, chunk_size = [], 0
+            for key in keys:
+                chunk.append(key)
+                chunk_size += len(missing[key][1])
+                if chunk_size >= POOL_CHUNK_BYTES:
+                    chunks.append((language, chunk))
+                    chunk, chunk_size = [], 0
+            if chunk:
+                chunks.append((language, chunk))
+        outputs = get_pool().map(highlight_group, [language for language, _ in chunks],
+                                 [[missing[key][1] for key in keys] for _, keys in chunks])
+        highlighted = {key: html for (_, keys), htmls in zip(chunks, outputs) for key, html in zip(keys, htmls)}
+    else:
+        highlighted = {key: highlight_code(language, code) for key, (language, code, _) in missing.items()}
+
+    for key, html in highlighted.items():
+        fence_cache.put(key, html)
+        for i in missing[key][2]:
+            results[i] = html
+    return results
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+        return _pool
+
+
+def get_stats():
+    """
+    Returns the counters of fence_cache and the number of lexers kept (see readblocks.find_lexer).
+    """
+    stats = fence_cache.get_stats()
+    stats["languages"] = readblocks.find_lexer.cache_info().currsize
+    return stats
@@ -6,11 +6,13 @@ markers while skipping shebang lines (e.g. "#!/usr/bin/env python3"), which are
 
 Behavior:
   • Reads a Markdown text (from a file or a string).
-  • Locates fenced code blocks (delimited by triple backticks).
+  • Locates fenced code blocks as CommonMark defines them (backticks or tildes, closed by a fence at
+    least as long; container blocks are not interpreted).
   • For each code block, processes its content line‑by‑line.
       - If a line, after stripping leading whitespace, starts with "#!" (a shebang),
         that line is passed through unchanged.
-      - If a comment line (starting with "#" after stripping whitespace) is found,
+      - If a comment line (starting with a comment marker of the fence's language after stripping
+        whitespace, see commentsyntax.py; "#" without one) is found,
         then any deliberate marker matching the regex pattern __WORD__:
         is wrapped in a <span> tag for highlighting.
       - Other lines are left unchanged.
@@ -21,64 +23,151 @@ No content is otherwise modified.
 
 import re
 
+import commentsyntax
+
+# Deliberate marker: two underscores, one or more word characters, two underscores, immediately
+# followed by a colon.
+MARKER_PATTERN = re.compile(r'__(\w+)__(:)')
+MARKER_OPEN = '<span class="highlight">'
+MARKER_CLOSE = '</span>'
+
+# Fence lines (matched at a line start, indented by at most 3 spaces): group 1 for backtick fences
+# (whose info string must not contain backticks), group 2 for tildes. A closing fence must have the
+# opening fence's character and at least its length; without one, the block runs to the end of the
+# document, and shorter or other fences inside it are content.
+OPENING_FENCE = re.compile(r'^ {0,3}(?:(`{3,})[^`\n]*|(~{3,})[^\n]*)$', re.MULTILINE)
+CLOSING_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})[ \t]*$', re.MULTILINE)
+
+def find_fence(text, pos, marker, pattern):
+    """
+    Returns the match of pattern (OPENING_FENCE or CLOSING_FENCE) on the first line at or after pos
+    whose fence is made of marker ("```" or "~~~"), or None. pos must be a line start or the end of
+    a line. Candidates are found with str.find, so text between fences is skipped quickly.
+    """
+    while True:
+        index = text.find(marker, pos)
+        if index < 0:
+            return None
+        if index == 0 or text[index - 1] == "\n":
+            line_start = index
+        else:
+            line_start = text.rfind("\n", 0, index) + 1
+            if index - line_start > 3 or text[line_start:index].strip(" "):
+                line_start = -1
+        if line_start >= 0:
+            m = pattern.match(text, line_start)
+            if m:
+                return m
+        # A fence has to start its line: continue on the next one.
+        pos = text.find("\n", index)
+        if pos < 0:
+            return None
+
 class Task3Highlighter:
     def __init__(self, markdown_text):
         self.markdown_text = markdown_text
 
-    def process_code_block(self, code_text):
+    def process_code_block(self, code_text, language=None):
         """
-        Process the content of a code block.
+        Process the content of a code block, in language (a fence's language name, e.g. "python").
 
         For each line in the code block:
           - If the line, after stripping whitespace, starts with "#!",
             do not process it (leave it unchanged).
-          - Otherwise, if the line is a comment line (its first non‑whitespace character is "#"),
+          - Otherwise, if the line is a comment line (its first non‑whitespace characters are a
+            comment marker of the language, see commentsyntax.py),
             process it by wrapping any deliberate marker of the form __WORD__:
             in a <span class="highlight">...</span>.
           - All other lines are left unchanged.
         Returns the processed code block as a single string.
         """
-        # Compile a regex pattern that matches a deliberate marker:
-        # Two underscores, one or more word characters, two underscores, immediately followed by a colon.
-        marker_pattern = re.compile(r'__(\w+)__(:)')
-        processed_lines = []
-        for line in code_text.split("\n"):
-            stripped = line.lstrip()
-            if stripped.startswith("#!"):
-                # This is a shebang line; leave it unchanged.
-                processed_lines.append(line)
+        return self._highlight_spans(code_text, [(0, len(code_text), commentsyntax.for_language(language))])
+
+    def _highlight_spans(self, text, spans):
+        """
+        Highlights the markers on comment lines within the given (start, end, CommentSyntax) spans
+        of text (sorted, each starting at a line start) and returns the result. Only the markers are
+        visited: the output is assembled from the untouched text between them.
+        """
+        if not spans:
+            return text
+        out = []
+        written = 0
+        k = 0
+        span_start, span_end, comments = spans[0]
+        line_start = -1
+        is_comment = False
+        for m in MARKER_PATTERN.finditer(text, span_start):
+            marker_start = m.start()
+            while marker_start >= span_end and k + 1 < len(spans):
+                k += 1
+                span_start, span_end, comments = spans[k]
+            if marker_start >= span_end:
+                break
+            if marker_start < span_start:
                 continue
-            if stripped.startswith("#"):
-                # Process deliberate markers in full-line comments.
-                # (Inline comments are left unchanged unless they begin at column 1.)
-                new_line = marker_pattern.sub(r'<span class="highlight">\g<0></span>', line)
-                processed_lines.append(new_line)
-            else:
-                processed_lines.append(line)
-        return "\n".join(processed_lines)
+            newline = text.rfind("\n", span_start, marker_start)
+            current_line = newline + 1 if newline >= 0 else span_start
+            if current_line != line_start:
+                line_start = current_line
+                # The marker itself starts with "_", so the text before it decides.
+                stripped = text[line_start:marker_start].lstrip()
+                is_comment = comments.is_comment(stripped)
+            if is_comment:
+                out.append(text[written:marker_start])
+                out.append(MARKER_OPEN)
+                out.append(m.group())
+                out.append(MARKER_CLOSE)
+                written = m.end()
+        if not out:
+            return text
+        out.append(text[written:])
+        return "".join(out)
 
     def process(self):
         """
         Process the entire Markdown text.
 
-        Finds all fenced code blocks (using triple backticks) in the Markdown text.
-        For each code block, process the code content with process_code_block(), then reassemble
-        the fenced block with its original language identifier (if any).
+        Finds all fenced code blocks (see OPENING_FENCE) in one pass over the Markdown text and
+        highlights the markers in their content (as process_code_block() does).
         Returns the modified Markdown text.
         """
-        # Regex to match fenced code blocks:
-        #   Group 1: optional language identifier.
-        #   Group 2: code block content.
-        code_fence_regex = re.compile(r"```(\w*)\n(.*?)\n```", re.DOTALL)
-
-        def replace_block(match):
-            language = match.group(1)  # may be empty
-            code_content = match.group(2)
-            processed_code = self.process_code_block(code_content)
-            return f"```{language}\n{processed_code}\n```"
-
-        new_markdown = code_fence_regex.sub(replace_block, self.markdown_text)
-        return new_markdown
+        # Only markers inside code blocks are looked at, and the output is assembled from the
+        # untouched text between them (the input itself is returned if nothing changes).
+        text = self.markdown_text
+        length = len(text)
+        spans = []  # (start, end, CommentSyntax) of the code block contents
+        pos = 0
+        # Next backtick and tilde opening fences (None: not searched yet, False: there is none).
+        backtick = tilde = None
+        while True:
+            if backtick is not False and (backtick is None or backtick.start() < pos):
+                backtick = find_fence(text, pos, "```", OPENING_FENCE) or False
+            if tilde is not False and (tilde is None or tilde.start() < pos):
+                tilde = find_fence(text, pos, "~~~", OPENING_FENCE) or False
+            if backtick is False and tilde is False:
+                break
+            if tilde is False or (backtick is not False and backtick.start() < tilde.start()):
+                opening, fence, info_start = backtick, backtick.group(1), backtick.end(1)
+            else:
+                opening, fence, info_start = tilde, tilde.group(2), tilde.end(2)
+            # The first word of the info string names the language.
+            info = text[info_start:opening.end()].split(None, 1)
+            comments = commentsyntax.for_language(info[0] if info else None)
+            content_start = min(opening.end() + 1, length)
+            content_end = pos = length
+            search = content_start
+            while True:
+                closing = find_fence(text, search, fence[:3], CLOSING_FENCE)
+                if closing is None:
+                    break
+                if len(closing.group(1)) >= len(fence):
+                    content_end = closing.start()
+                    pos = closing.end()
+                    break
+                search = closing.end()
+            spans.append((content_start, content_end, comments))
+        return self._highlight_spans(text, spans)
 
 # Example usage:
 if __name__ == "__main__":
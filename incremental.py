@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+incremental.py – Incremental re-conversion of an edited source file to Markdown.
+
+IncrementalMarkdownGenerator re-lexes only around each edit; the result is identical to
+MarkdownGenerator(new_code, codetype).generate_markdown().
+"""
+
+from bisect import bisect_left, bisect_right
+
+from code2md import MarkdownGenerator
+from readblocks import lexer_input
+
+
+# Offsets, line numbers and token indices after the edit are kept in _ShiftedList arrays, so
+# shifting them costs time proportional to the distance from the previous edit, not to the size.
+class _ShiftedList:
+    """
+    A non-decreasing list of integers in which the entries from index gap onwards are stored
+    relative to a common delta. Shifting everything after an edit only changes delta; the entries
+    between the previous and the current edit position are fixed up when the gap moves.
+    """
+    __slots__ = ("items", "gap", "delta")
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.gap = len(self.items)
+        self.delta = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.items)
+        value = self.items[index]
+        return value + self.delta if index >= self.gap else value
+
+    def tolist(self):
+        gap, delta = self.gap, self.delta
+        return self.items[:gap] + [value + delta for value in self.items[gap:]]
+
+    def bisect_left(self, value):
+        items, gap = self.items, self.gap
+        if gap < len(items) and value > items[gap] + self.delta:
+            return bisect_left(items, value - self.delta, gap)
+        return bisect_left(items, value, 0, gap)
+
+    def bisect_right(self, value):
+        items, gap = self.items, self.gap
+        if gap < len(items) and value >= items[gap] + self.delta:
+            return bisect_right(items, value - self.delta, gap)
+        return bisect_right(items, value, 0, gap)
+
+    def _move_gap(self, index):
+        items, delta = self.items, self.delta
+        if index < self.gap:
+            for k in range(index, self.gap):
+                items[k] -= delta
+        else:
+            for k in range(self.gap, index):
+                items[k] += delta
+        self.gap = index
+
+    def splice(self, start, end, values, shift):
+        """
+        Replaces entries [start, end) with values (absolute) and adds shift to all entries after them.
+        """
+        self._move_gap(end)
+        self.items[start:end] = values
+        self.gap = start + len(values)
+        self.delta += shift
+
+
+# Keeps the blocks, line tokens and Markdown segments of one document. Lexers which do not use
+# RegexLexer's own tokenizer (see readblocks.supports_restart) have no restart points; for them
+# every edit falls back to full_parse().
+class IncrementalMarkdownGenerator:
+    def __init__(self, code, codetype):
+        self.codetype = codetype
+        self.generator = MarkdownGenerator(code, codetype)
+        self.parser = self.generator.parser
+        self.code = code
+        self.full_parse()
+
+    # --- Full conversion
+    def full_parse(self):
+        """
+        Converts self.code from scratch and builds the incremental state. Returns the Markdown.
+        """
+        lexer = self.parser.lexer
+        text = lexer_input(lexer, self.code)
+        self.source = text
+        # Edits can be applied to the normalized text directly if normalization only strips
+        # leading/trailing newlines (no "\r", BOM, tab expansion or full strip).
+        self._plain = ("\r" not in self.code and not self.code.startswith("\ufeff")
+                       and not lexer.stripall and lexer.tabsize <= 0)
+        restart_points = [0]
+        self.restart_stacks = [("root",)]
+        open_points = []
+        # Block arrays: start offset, type, start line, start column, index of first token.
+        block_starts, self.block_types, block_lines, self.block_cols, block_token_starts = [], [], [], [], []
+        self.tokens = []
+        blocks = self.parser.iter_blocks_from(text, restart_points=restart_points,
+                                              restart_stacks=self.restart_stacks, open_points=open_points)
+        for block in blocks:
+            self._add_block(block, self.tokens, block_starts, block_lines, block_token_starts)
+        self.restart_points = _ShiftedList(restart_points)
+        self.open_points = _ShiftedList(open_points)
+        self.block_starts = _ShiftedList(block_starts)
+        self.block_lines = _ShiftedList(block_lines)
+        self.block_token_starts = _ShiftedList(block_token_starts)
+        self.generator.classify_modes(self.tokens)
+        seg_modes, seg_token_starts, seg_texts = self._group(self.tokens, 0, len(self.tokens))
+        self.seg_modes, self.seg_texts = seg_modes, seg_texts
+        self.seg_token_starts = _ShiftedList(seg_token_starts)
+        self.markdown = "\n\n".join(self.seg_texts)
+        return self.markdown
+
+    def _add_block(self, block, tokens, starts, lines, token_starts, token_offset=0, types=None, cols=None):
+        """
+        Records one block (start, line and first token index into the given lists, type and column
+        into types/cols, by default the state's own lists) and appends its line tokens to tokens.
+        token_offset is the index in the full token list at which tokens starts.
+        """
+        (line, col), _ = block["positions"]["line-char"]
+        starts.append(block["positions"]["string"][0])
+        lines.append(line)
+        token_starts.append(token_offset + len(tokens))
+        (self.block_types if types is None else types).append(block["type"])
+        (self.block_cols if cols is None else cols).append(col)
+        self.generator.append_block_tokens(block, tokens)
+
+    def _group(self, tokens, start, end):
+        """
+        Groups tokens[start:end] into segments; returns parallel lists (modes, token starts, texts).
+        """
+        modes, starts, texts = [], [], []
+        if start >= end:
+            return modes, starts, texts
+        segment_text = self.generator.segment_text
+        seg_start = start
+        current_mode = tokens[start].mode
+        for i in range(start + 1, end):
+            mode = tokens[i].mode
+            if mode != current_mode:
+                modes.append(current_mode)
+                starts.append(seg_start)
+                texts.append(segment_text(current_mode, tokens[seg_start:i]))
+                seg_start = i
+                current_mode = mode
+        modes.append(current_mode)
+        starts.append(seg_start)
+        texts.append(segment_text(current_mode, tokens[seg_start:end]))
+        return modes, starts, texts
+
+    # --- Incremental update
+    def apply_edit(self, start, end, replacement):
+        """
+        Replaces self.code[start:end] with replacement and updates the state.
+        Returns the new Markdown.
+        """
+        old_code = self.code
+        if not 0 <= start <= end <= len(old_code):
+            raise ValueError(f"Invalid edit range {start}:{end} for code of length {len(old_code)}")
+        self.code = old_code[:start] + replacement + old_code[end:]
+        self.generator.code = self.parser.code = self.code
+        if len(self.restart_points) <= 1:
+            # The lexer cannot be restarted mid-text.
+            return self.full_parse()
+
+        old = self.source
+        self._plain = self._plain and "\r" not in replacement
+        lead = _leading_newlines(old_code)
+        if self._plain and lead < start and end < len(old_code) - _trailing_newlines(old_code):
+            # Normalization only strips the (unchanged) leading and trailing newlines here.
+            prefix = start - lead
+            new = old[:prefix] + replacement + old[end - lead:]
+            new_change_end = prefix + len(replacement)
+        else:
+            new = lexer_input(self.parser.lexer, self.code)
+            prefix = _common_prefix(old, new, start - lead)
+            suffix = _common_suffix(old, new, len(old_code) - end, min(len(old), len(new)) - prefix)
+            new_change_end = len(new) - suffix
+        self.source = new
+        if new != old:
+            self._relex(old, new, prefix, new_change_end, len(new) - len(old))
+        return self.markdown
+
+    def _relex(self, old, new, change_start, new_change_end, delta):
+        parser = self.parser
+        restart_points = self.restart_points
+        restart_stacks = self.restart_stacks
+        block_starts = self.block_starts
+        block_types = self.block_types
+        block_lines = self.block_lines
+        old_len = len(old)
+
+        # Restart points are line starts where a lexer rule match begins, recorded with the lexer's
+        # state stack. Restart at least one line before the change (lookahead in the previous line
+        # may differ).
+        line_start = old.rfind("\n", 0, change_start) + 1
+        r_index = max(restart_points.bisect_right(line_start - 1) - 1, 0)
+        open_points = self.open_points
+        if len(open_points) and open_points[0] < change_start:
+            # An open construct (e.g. an unterminated /* comment whose rule failed) may be closed by
+            # the edit, changing how the text before it is lexed: restart before it. Several states
+            # may share its offset (zero-width matches).
+            r_index = min(r_index, max(restart_points.bisect_left(open_points[0]) - 1, 0))
+        restart = restart_points[r_index]
+        if restart == 0:
+            # The start of the text may lex differently from a resumed state (e.g. a zero-width
+            # match at offset 0 which pushes a state): convert it from scratch.
+            self.full_parse()
+            return
+        # The block containing the restart point is re-emitted as an open block. If a block starts
+        # exactly there, the previous block is opened instead, so it can merge with the new tokens.
+        j = max(block_starts.bisect_right(restart) - 1, 0)
+        if j > 0 and block_starts[j] == restart:
+            j -= 1
+        if restart > 0:
+            open_block = (block_types[j], block_starts[j], block_lines[j], self.block_cols[j])
+            restart_line = block_lines[j] + old.count("\n", block_starts[j], restart)
+        else:
+            open_block = None
+            restart_line = 1
+
+        # Stop at the first restart point after the change which was one in the previous pass too,
+        # with the same stack: from there on the lexer would produce the same tokens.
+        def stop(offset, block_type, stack):
+            if offset <= new_change_end:
+                return False
+            old_offset = offset - delta
+            k = restart_points.bisect_left(old_offset)
+            if k == len(restart_points) or restart_points[k] != old_offset or restart_stacks[k] != stack:
+                return False
+            return block_types[block_starts.bisect_right(old_offset) - 1] == block_type
+
+        new_points, new_stacks, new_open_points = [], [], []
+        blocks = list(parser.iter_blocks_from(new, restart, restart_line, 1, open_block,
+                                              restart_stacks[r_index], new_points, new_stacks, stop,
+                                              new_open_points))
+
+        if parser.open_block is not None:
+            # Resynchronized: re-emit the block spanning the resync point and reuse the rest.
+            cur_type, cur_start, cur_line, cur_col, resync, resync_line = parser.open_block
+            old_resync = resync - delta
+            i = block_starts.bisect_right(old_resync) - 1
+            old_end = block_starts[i + 1] if i + 1 < len(block_starts) else old_len
+            line_delta = resync_line - (block_lines[i] + old.count("\n", block_starts[i], old_resync))
+            end_line, end_col = self._block_end(old, i)
+            end_line += line_delta
+            if cur_type == block_types[i]:
+                blocks.append(parser._make_block(new, cur_type, cur_start, old_end + delta,
+                                                 cur_line, cur_col, end_line, end_col))
+            else:
+                blocks.append(parser._make_block(new, cur_type, cur_start, resync,
+                                                 cur_line, cur_col, resync_line, 1))
+                blocks.append(parser._make_block(new, block_types[i], resync, old_end + delta,
+                                                 resync_line, 1, end_line, end_col))
+            tail_block = i + 1
+            tail_restart = restart_points.bisect_left(old_resync)
+            tail_open = open_points.bisect_left(old_resync)
+        else:
+            line_delta = 0
+            tail_block = len(block_starts)
+            tail_restart = len(restart_points)
+            tail_open = len(open_points)
+
+        # Restart points: keep those up to the restart, then the new ones, then the shifted tail.
+        restart_points.splice(r_index + 1, tail_restart, new_points, delta)
+        restart_stacks[r_index + 1:tail_restart] = new_stacks
+        open_points.splice(open_points.bisect_left(restart), tail_open, new_open_points, delta)
+
+        # Blocks and tokens: replace blocks j .. tail_block - 1.
+        tokens = self.tokens
+        old_token_count = len(tokens)
+        token_start = self.block_token_starts[j]
+        token_end = self.block_token_starts[tail_block] if tail_block < len(block_starts) else old_token_count
+        new_tokens, starts, lines, token_starts, types, cols = [], [], [], [], [], []
+        for block in blocks:
+            self._add_block(block, new_tokens, starts, lines, token_starts, token_start, types, cols)
+        token_delta = len(new_tokens) - (token_end - token_start)
+        block_starts.splice(j, tail_block, starts, delta)
+        block_lines.splice(j, tail_block, lines, line_delta)
+        self.block_token_starts.splice(j, tail_block, token_starts, token_delta)
+        block_types[j:tail_block] = types
+        self.block_cols[j:tail_block] = cols
+        if line_delta:
+            for k in range(token_end, old_token_count):
+                tokens[k].line += line_delta
+        tokens[token_start:token_end] = new_tokens
+
+        # Modes: re-classify the new tokens, widened to whole adjacent comment runs (only those can
+        # change mode).
+        lo = token_start
+        hi = token_start + len(new_tokens)
+        while lo > 0 and tokens[lo - 1].token_type == "comment":
+            lo -= 1
+        while hi < len(tokens) and tokens[hi].token_type == "comment":
+            hi += 1
+        self.generator.classify_modes(tokens, lo, hi)
+
+        # Segments: regroup the segments touching [lo, hi) plus one neighbour on each side, so merges
+        # and splits are seen; the other segment texts are reused.
+        seg_starts = self.seg_token_starts
+        first = max(seg_starts.bisect_right(lo) - 2, 0)
+        old_hi = hi - token_delta
+        if old_hi < old_token_count:
+            last = min(seg_starts.bisect_right(old_hi), len(seg_starts) - 1)
+        else:
+            last = len(seg_starts) - 1
+        group_start = seg_starts[first]
+        group_end = seg_starts[last + 1] + token_delta if last + 1 < len(seg_starts) else len(tokens)
+        modes, starts, texts = self._group(tokens, group_start, group_end)
+        seg_starts.splice(first, last + 1, starts, token_delta)
+        self.seg_modes[first:last + 1] = modes
+        self.seg_texts[first:last + 1] = texts
+        self.markdown = "\n\n".join(self.seg_texts)
+
+    def _block_end(self, text, i):
+        """
+        Returns the (line, col) end position of block i in the previous pass.
+        """
+        if i + 1 < len(self.block_starts):
+            return self.block_lines[i + 1], self.block_cols[i + 1]
+        start = self.block_starts[i]
+        line = self.block_lines[i] + text.count("\n", start)
+        last_newline = text.rfind("\n", start)
+        col = self.block_cols[i] + len(text) - start if last_newline < 0 else len(text) - last_newline
+        return line, col
+
+
+def _leading_newlines(text):
+    n = 0
+    while n < len(text) and text[n] == "\n":
+        n += 1
+    return n
+
+
+def _trailing_newlines(text):
+    n = 0
+    while n < len(text) and text[-1 - n] == "\n":
+        n += 1
+    return n
+
+
+def _common_prefix(a, b, hint):
+    """
+    Returns a length n such that a[:n] == b[:n], trying hint first.
+    """
+    limit = min(len(a), len(b))
+    hint = max(min(hint, limit), 0)
+    if a[:hint] == b[:hint]:
+        return hint
+    lo, hi = 0, hint
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, hint, limit):
+    """
+    Returns a length n <= limit such that a and b end with the same n characters, trying hint first.
+    """
+    hint = max(min(hint, limit), 0)
+    if a[len(a) - hint:] == b[len(b) - hint:]:
+        return hint
+    lo, hi = 0, hint
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
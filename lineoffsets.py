@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+lineoffsets.py – Line and column numbers of character offsets in a source text.
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_NEWLINE = re.compile("\n")
+
+# Once the index is built, offsets further ahead than this are searched instead of counted to.
+FORWARD_COUNT_CHARS = 64 * 1024
+
+
+def line_starts(text):
+    """
+    Returns the offsets at which the lines of text start (the first is 0), as an array("Q"), or as
+    a NumPy array of int64 if NumPy is installed.
+    """
+    if numpy is not None:
+        if text.isascii():
+            codes = numpy.frombuffer(text.encode("ascii"), dtype=numpy.uint8)
+        else:
+            codes = numpy.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+        starts = numpy.flatnonzero(codes == 10).astype(numpy.int64)
+        starts += 1
+        return numpy.concatenate((numpy.zeros(1, dtype=numpy.int64), starts))
+    starts = array("Q", [0])
+    starts.extend(m.end() for m in _NEWLINE.finditer(text))
+    return starts
+
+
+# One LineOffsets per source is shared by the parser and MarkdownGenerator. Walking forwards costs
+# one str.count pass over the text and builds no index; only offsets behind the walk are searched
+# in starts. Lines count from first_line, columns from 1; an offset at a newline belongs to the
+# line the newline ends.
+class LineOffsets:
+    def __init__(self, text, first_line=1, position=0, line=None, column=1):
+        """
+        position, line and column seed the forward walk: the (line, column) of offset position, if
+        known (e.g. where an edited text is re-lexed from); by default, the start of the text.
+        """
+        self.text = text
+        self.first_line = first_line
+        self._starts = None
+        self._position = position
+        self._line = first_line if line is None else line
+        self._column = column
+
+    @property
+    def starts(self):
+        """
+        The offsets at which the lines start (see line_starts), built on first use.
+        """
+        if self._starts is None:
+            self._starts = line_starts(self.text)
+        return self._starts
+
+    @property
+    def line_count(self):
+        """
+        The number of lines, counting the empty line after a final newline.
+        """
+        return self.text.count("\n") + 1 if self._starts is None else len(self._starts)
+
+    def locate(self, offset):
+        """
+        Returns (line, column) of offset: counted forwards from the previous offset located if it is
+        not before it (and, once starts is built, at most FORWARD_COUNT_CHARS after it), otherwise
+        by binary search in starts.
+        """
+        position = self._position
+        if offset >= position and (self._starts is None or offset - position <= FORWARD_COUNT_CHARS):
+            text = self.text
+            newlines = text.count("\n", position, offset)
+            if newlines:
+                self._line += newlines
+                self._column = offset - text.rfind("\n", position, offset)
+            else:
+                self._column += offset - position
+            self._position = offset
+            return self._line, self._column
+        starts = self.starts
+        if numpy is not None:
+            index = int(numpy.searchsorted(starts, offset, side="right")) - 1
+        else:
+            index = bisect_right(starts, offset) - 1
+        return self.first_line + index, offset - int(starts[index]) + 1
+
+    def locate_many(self, offsets):
+        """
+        Returns (lines, columns) of a sequence of offsets, as two lists.
+        """
+        if numpy is not None:
+            starts = self.starts
+            offsets = numpy.asarray(offsets, dtype=numpy.int64)
+            indexes = numpy.searchsorted(starts, offsets, side="right") - 1
+            return (indexes + self.first_line).tolist(), (offsets - starts[indexes] + 1).tolist()
+        lines = []
+        columns = []
+        # locate() inlined for the offsets in order; a walk over the whole text counts it once.
+        text = self.text
+        position, line, column = self._position, self._line, self._column
+        for offset in offsets:
+            if offset < position:
+                self._position, self._line, self._column = position, line, column
+                found_line, found_column = self.locate(offset)
+                lines.append(found_line)
+                columns.append(found_column)
+                continue
+            newlines = text.count("\n", position, offset)
+            if newlines:
+                line += newlines
+                column = offset - text.rfind("\n", position, offset)
+            else:
+                column += offset - position
+            position = offset
+            lines.append(line)
+            columns.append(column)
+        self._position, self._line, self._column = position, line, column
+        return lines, columns
+
+    def line_start(self, line):
+        """
+        Returns the offset at which line starts (the text's length for lines after the last one).
+        """
+        index = line - self.first_line
+        starts = self.starts
+        return int(starts[index]) if index < len(starts) else len(self.text)
+
+    def line_end(self, line):
+        """
+        Returns the offset of the newline ending line (the text's length for the last line).
+        """
+        index = line - self.first_line + 1
+        starts = self.starts
+        return int(starts[index]) - 1 if index < len(starts) else len(self.text)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+listing.py – Cached directory listings for the folder browser (app.browse), optionally kept
+up to date with inotify.
+"""
+
+import os
+import struct
+import logging
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_DIRS = 256
+
+# inotify event masks (see inotify(7)).
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = (IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class DirEntryInfo:
+    """
+    One listed entry: its name and whether it is a directory and/or a (regular) file, as
+    os.path.isdir/os.path.isfile would tell (symbolic links are followed).
+    """
+    __slots__ = ("name", "is_dir", "is_file")
+
+    def __init__(self, name, is_dir, is_file):
+        self.name = name
+        self.is_dir = is_dir
+        self.is_file = is_file
+
+    def __repr__(self):
+        return f"DirEntryInfo({self.name!r}, is_dir={self.is_dir}, is_file={self.is_file})"
+
+
+def scan_directory(abs_path):
+    """
+    Lists a directory with os.scandir; returns DirEntryInfo objects sorted by lowercase name.
+    """
+    # The entry types come from the DirEntry objects, which usually know them from the directory
+    # read itself, without a stat per entry.
+    entries = []
+    with os.scandir(abs_path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+                is_file = not is_dir and entry.is_file()
+            except OSError:
+                is_dir = is_file = False
+            entries.append(DirEntryInfo(entry.name, is_dir, is_file))
+    entries.sort(key=lambda e: e.name.lower())
+    return entries
+
+
+class ListingCache:
+    def __init__(self, max_dirs=DEFAULT_MAX_DIRS, watch=False):
+        self.max_dirs = max_dirs
+        # abs_path -> (mtime_ns, entries), most recently used last.
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0}
+        self._watcher = None
+        if watch:
+            try:
+                self._watcher = DirectoryWatcher(self._on_change)
+            except OSError as e:
+                logging.error(f"Directory watching not available: {e}")
+
+    def list_dir(self, abs_path):
+        """
+        Returns the sorted DirEntryInfo list of a directory, from the cache if the directory's mtime
+        is unchanged. Raises OSError like os.scandir.
+        """
+        # Adding, removing or renaming an entry changes the directory's mtime; editing a file does
+        # not, and does not need to.
+        mtime_ns = os.stat(abs_path).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(abs_path)
+            if cached is not None and cached[0] == mtime_ns:
+                self._listings.move_to_end(abs_path)
+                self.stats["hits"] += 1
+                return cached[1]
+            self.stats["misses"] += 1
+        entries = scan_directory(abs_path)
+        self._store(abs_path, mtime_ns, entries)
+        return entries
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["directories"] = len(self._listings)
+        stats["watching"] = self._watcher.count() if self._watcher is not None else 0
+        return stats
+
+    def _store(self, abs_path, mtime_ns, entries):
+        evicted = []
+        with self._lock:
+            is_new = abs_path not in self._listings
+            self._listings[abs_path] = (mtime_ns, entries)
+            self._listings.move_to_end(abs_path)
+            while len(self._listings) > self.max_dirs:
+                evicted.append(self._listings.popitem(last=False)[0])
+        if self._watcher is not None:
+            if is_new:
+                self._watcher.add(abs_path)
+            for path in evicted:
+                self._watcher.remove(path)
+
+    def _on_change(self, abs_path):
+        # Called from the watcher thread: list the directory again right away, so hot directories
+        # stay pre-listed and requests do not wait for scandir.
+        with self._lock:
+            if abs_path not in self._listings:
+                return
+        try:
+            mtime_ns = os.stat(abs_path).st_mtime_ns
+            entries = scan_directory(abs_path)
+        except OSError:
+            with self._lock:
+                self._listings.pop(abs_path, None)
+            return
+        with self._lock:
+            if abs_path in self._listings:
+                self._listings[abs_path] = (mtime_ns, entries)
+                self.stats["refreshes"] += 1
+
+
+class DirectoryWatcher:
+    """
+    Watches directories with Linux inotify (through ctypes, no extra package) and calls
+    on_change(abs_path) from a background thread when the entries of a watched directory change.
+    Raises OSError if inotify is not available.
+    """
+
+    def __init__(self, on_change):
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+        except (AttributeError, OSError) as e:
+            raise OSError(f"inotify is not supported here ({e})") from None
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._fd = fd
+        self._on_change = on_change
+        self._paths = {}  # watch descriptor -> path
+        self._watches = {}  # path -> watch descriptor
+        self._lock = threading.Lock()
+        thread = threading.Thread(target=self._run, name="listing-watcher", daemon=True)
+        thread.start()
+
+    def count(self):
+        with self._lock:
+            return len(self._watches)
+
+    def add(self, abs_path):
+        wd = self._add_watch(self._fd, os.fsencode(abs_path), WATCH_MASK)
+        if wd < 0:
+            # E.g. the per-user watch limit is reached: the cache still works without it.
+            return
+        with self._lock:
+            self._paths[wd] = abs_path
+            self._watches[abs_path] = wd
+
+    def remove(self, abs_path):
+        with self._lock:
+            wd = self._watches.pop(abs_path, None)
+        if wd is not None:
+            self._rm_watch(self._fd, wd)
+
+    def _run(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError:
+                return
+            changed = []
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size + name_len
+                with self._lock:
+                    abs_path = self._paths.get(wd)
+                    if mask & IN_IGNORED:
+                        # The watch is gone (removed, or the directory was deleted).
+                        self._paths.pop(wd, None)
+                        if abs_path is not None and self._watches.get(abs_path) == wd:
+                            del self._watches[abs_path]
+                if abs_path is not None and abs_path not in changed:
+                    changed.append(abs_path)
+            for abs_path in changed:
+                self._on_change(abs_path)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+metrics.py – Per-stage timing of renders, Prometheus metrics and profiling of slow requests.
+"""
+
+import os
+import re
+import time
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+# Histogram buckets (seconds).
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The RenderMetrics of the running thread or task. stage() and count() do nothing without one (e.g.
+# in code2md's batch mode), so the instrumented code needs no extra arguments.
+_current = contextvars.ContextVar("render_metrics", default=None)
+
+
+# The measurements of one request: wall time per stage (repeated stages add up), counts (blocks,
+# tokens, segments) and bytes in/out.
+class RenderMetrics:
+    def __init__(self, route="view"):
+        self.route = route
+        self.status = None
+        self.started = time.perf_counter()
+        self.duration = None
+        self.stages = {}  # name -> seconds, in the order the stages first ran
+        self.counts = {}  # name -> count
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add_stage(self, name, seconds):
+        """
+        Adds time measured elsewhere (e.g. summed over many short calls) to stage name.
+        """
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, data):
+        """
+        Adds the stages and counts of as_dict() output (e.g. from a render in another process).
+        """
+        for name, seconds in data["stages"].items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        for name, n in data["counts"].items():
+            self.count(name, n)
+
+    def as_dict(self):
+        return {"stages": dict(self.stages), "counts": dict(self.counts)}
+
+    def elapsed(self):
+        return self.duration if self.duration is not None else time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Returns the Server-Timing header value: one entry per stage and the total so far (ms).
+        """
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def finish(self, status):
+        """
+        Ends the request and adds it to the registry (only the first call counts).
+        """
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+            self.status = status
+            registry.observe(self)
+
+
+@contextmanager
+def recording(render_metrics):
+    token = _current.set(render_metrics)
+    try:
+        yield render_metrics
+    finally:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def stage(name):
+    """
+    Times a block as stage name of the current render; does nothing if none is being recorded.
+    """
+    render_metrics = _current.get()
+    return render_metrics.stage(name) if render_metrics is not None else nullcontext()
+
+
+def add_stage(name, seconds):
+    render_metrics = _current.get()
+    if render_metrics is not None:
+        render_metrics.add_stage(name, seconds)
+
+
+def count(name, n=1):
+    render_metrics = _current.get()
+    if render_metrics is not None:
+        render_metrics.count(name, n)
+
+
+class Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="mdcode"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}  # (route, status) -> count
+            self.request_seconds = {}  # route -> Histogram
+            self.stage_seconds = {}  # stage -> Histogram
+            self.items = {}  # count name -> total
+            self.bytes = {"in": 0, "out": 0}
+            self.profiles = 0
+
+    def observe(self, render_metrics):
+        with self._lock:
+            key = (render_metrics.route, str(render_metrics.status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.request_seconds.setdefault(render_metrics.route, Histogram()).observe(render_metrics.duration)
+            for name, seconds in render_metrics.stages.items():
+                self.stage_seconds.setdefault(name, Histogram()).observe(seconds)
+            for name, n in render_metrics.counts.items():
+                self.items[name] = self.items.get(name, 0) + n
+            self.bytes["in"] += render_metrics.bytes_in
+            self.bytes["out"] += render_metrics.bytes_out
+
+    def render_prometheus(self):
+        """
+        Returns all metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        p = self.prefix
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+
+        def histogram(name, label, histograms):
+            for value, h in sorted(histograms.items()):
+                for bound, n in zip(DURATION_BUCKETS, h.buckets):
+                    lines.append(f'{p}_{name}_bucket{{{label}="{value}",le="{bound}"}} {n}')
+                lines.append(f'{p}_{name}_bucket{{{label}="{value}",le="+Inf"}} {h.count}')
+                lines.append(f'{p}_{name}_sum{{{label}="{value}"}} {h.sum:.6f}')
+                lines.append(f'{p}_{name}_count{{{label}="{value}"}} {h.count}')
+
+        with self._lock:
+            header("requests_total", "counter", "Instrumented requests by route and status.")
+            for (route, status), n in sorted(self.requests.items()):
+                lines.append(f'{p}_requests_total{{route="{route}",status="{status}"}} {n}')
+            header("request_duration_seconds", "histogram", "Wall time of instrumented requests.")
+            histogram("request_duration_seconds", "route", self.request_seconds)
+            header("render_stage_duration_seconds", "histogram", "Wall time per rendering stage and request.")
+            histogram("render_stage_duration_seconds", "stage", self.stage_seconds)
+            header("render_items_total", "counter", "Blocks, tokens and segments processed.")
+            for name, n in sorted(self.items.items()):
+                lines.append(f'{p}_render_items_total{{kind="{name}"}} {n}')
+            header("render_bytes_total", "counter", "Bytes of viewed source files (in) and of pages sent (out).")
+            for direction, n in sorted(self.bytes.items()):
+                lines.append(f'{p}_render_bytes_total{{direction="{direction}"}} {n}')
+            header("profiles_total", "counter", "cProfile dumps written for slow requests.")
+            lines.append(f"{p}_profiles_total {self.profiles}")
+        return "\n".join(lines) + "\n"
+
+
+# Finished requests, served in the Prometheus text format by app.py at /metrics.
+registry = MetricsRegistry()
+
+
+@contextmanager
+def profiled(label, threshold, directory):
+    """
+    Profiles the block with cProfile if threshold (seconds) is not None, and writes the profile to
+    directory if the block took at least threshold seconds (for pstats / snakeviz).
+    """
+    if threshold is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        if elapsed >= threshold:
+            os.makedirs(directory, exist_ok=True)
+            name = re.sub(r"[^\w.-]+", "_", label).strip("_")[:100]
+            path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{elapsed * 1000:.0f}ms-{name}.prof")
+            profiler.dump_stats(path)
+            with registry._lock:
+                registry.profiles += 1
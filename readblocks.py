@@ -1,11 +1,575 @@
+import re
+import sys
+import struct
+import hashlib
+import logging
+import functools
+import itertools
+from array import array
+from collections.abc import Mapping, Sequence
+
+import pygments
 from pygments.lexers import get_lexer_by_name
-from pygments.token import Token
-from pygments import lex
+from pygments.lexer import RegexLexer
+from pygments.token import Token, Whitespace, Error, _TokenType
+from pygments.util import ClassNotFound
+
+from lineoffsets import LineOffsets
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# "major.minor" of the installed Pygments, see CommentScanner.pygments_versions.
+_PYGMENTS_VERSION = ".".join(pygments.__version__.split(".")[:2])
+
+# The Pygments versions whose RegexLexer tokenizing loop iter_regex_tokens() reproduces.
+RESTART_PYGMENTS_VERSIONS = ("2.19",)
+
+# Character categories which contain "\n".
+_NEWLINE_CATEGORIES = {"CATEGORY_SPACE", "CATEGORY_NOT_DIGIT", "CATEGORY_NOT_WORD", "CATEGORY_LINEBREAK"}
+
+# Lexers kept by find_lexer() (per name and options), for the languages of files and fences.
+LEXER_CACHE_SIZE = 256
+
+# Lexer class -> {state: [(rexmatch, action, new_state, open_test), ...]}, see _restart_rules().
+_restart_rules_cache = {}
+
+# Use the lexer-free comment scanners (scanners.py) where one is registered for the lexer.
+USE_SCANNERS = True
+
+# Lexer class -> CommentScanner, see register_scanner(). The scanners of scanners.py are
+# registered on the first get_scanner() call.
+_scanners = {}
+_builtin_scanners_loaded = False
+
+# Shared store of parsed block lists (e.g. sharedcache.SharedCache), see set_block_store().
+_block_store = None
+
+# Block boundaries located per LineOffsets.locate_many() call, see PygmentsParser.iter_run_blocks().
+BOUNDARY_BATCH = 4096
+
+# Header of encode_block_runs() output: format tag, block count and the array typecode of the ends.
+_BLOCK_RUNS_HEADER = struct.Struct("<4sIc")
+_BLOCK_RUNS_TAG = b"MDB1"
+
+
+@functools.lru_cache(maxsize=LEXER_CACHE_SIZE)
+def find_lexer(name, stripnl=True):
+    """
+    Returns the lexer for a language name (as get_lexer_by_name), or None if Pygments has none.
+    Lexers are shared by every parser, fence and comment syntax lookup: tokenizing does not change
+    a lexer, so one instance serves them all. The LEXER_CACHE_SIZE most recent names are kept.
+    """
+    try:
+        return get_lexer_by_name(name, stripnl=stripnl)
+    except ClassNotFound:
+        return None
+
+
+def get_lexer(codetype):
+    """
+    Returns the lexer for codetype (see find_lexer); raises ClassNotFound if there is none.
+    """
+    lexer = find_lexer(codetype)
+    if lexer is None:
+        raise ClassNotFound(f"no lexer for alias {codetype!r} found")
+    return lexer
+
+
+class ScanAbort(Exception):
+    """
+    Raised by a comment scanner at a construct it cannot classify exactly as the lexer would; the
+    parser then takes the blocks from the lexer instead.
+    """
+
+
+class CommentScanner:
+    """
+    Base class of the lexer-free comment scanners (see scanners.py).
+
+    A scanner reproduces the comment / non-comment boundaries which one Pygments lexer class yields,
+    without producing tokens: scan(text) yields (block_type, start, end) runs in text order, where
+    text is the lexer input after Pygments' own normalization. Text between the runs is code; runs
+    are normally comments, and an empty "code" run marks an empty code token of the lexer (which
+    makes a block of its own if a comment follows). scan() raises ScanAbort for anything it cannot
+    reproduce exactly.
+
+    Lexer rules change between Pygments releases, so a scanner lists the Pygments versions
+    ("major.minor") it was verified against; with any other version the lexer is used.
+    """
+    pygments_versions = ()
+
+    def scan(self, text):
+        raise NotImplementedError
+
+
+def register_scanner(lexer_class, scanner):
+    """
+    Makes PygmentsParser use scanner (a CommentScanner) instead of lexing for lexer_class. Only
+    lexers of exactly that class are affected, not subclasses (whose rules may differ).
+    """
+    _scanners[lexer_class] = scanner
+
+
+def get_scanner(lexer):
+    """
+    Returns the CommentScanner for lexer, or None if there is none for its class and the installed
+    Pygments version (or USE_SCANNERS is off).
+    """
+    global _builtin_scanners_loaded
+    if not USE_SCANNERS:
+        return None
+    if not _builtin_scanners_loaded:
+        _builtin_scanners_loaded = True
+        try:
+            import scanners  # noqa: F401 (registers the built-in scanners)
+        except ImportError as e:
+            logging.error(f"Comment scanners not available: {e}")
+    scanner = _scanners.get(type(lexer))
+    if scanner is None or _PYGMENTS_VERSION not in scanner.pygments_versions:
+        return None
+    return scanner
+
+
+def set_block_store(store):
+    """
+    Makes PygmentsParser keep the block lists it parses in store (None: no store), an object with
+    get(key) -> bytes or None and put(key, bytes), such as sharedcache.SharedCache. Blocks are stored
+    compactly (see encode_block_runs) under a key made of the lexer, the Pygments version and the
+    SHA-256 of the text, and a parser with the same text and lexer takes them from there instead.
+    """
+    global _block_store
+    _block_store = store
+
+
+def block_store_key(lexer, text):
+    lexer_class = type(lexer)
+    digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+    return f"blocks:{lexer_class.__module__}.{lexer_class.__qualname__}:{pygments.__version__}:{digest}"
+
+
+def encode_block_runs(types, ends):
+    """
+    Encodes a block list as its block types (bytes: 1 for comment, 0 for code) and end offsets; the
+    blocks are contiguous, so this is all that is needed to rebuild them from the text. About five
+    bytes per block, against some hundred for a pickled block dictionary.
+    """
+    typecode = "I" if not ends or ends[-1] < 2 ** 32 else "Q"
+    offsets = array(typecode, ends)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return _BLOCK_RUNS_HEADER.pack(_BLOCK_RUNS_TAG, len(types), typecode.encode("ascii")) + \
+        bytes(types) + offsets.tobytes()
+
+
+def decode_block_runs(data):
+    """
+    Returns the (block_type, start, end) runs of an encode_block_runs() result, or None if data is
+    not one.
+    """
+    if len(data) < _BLOCK_RUNS_HEADER.size:
+        return None
+    tag, count, typecode = _BLOCK_RUNS_HEADER.unpack_from(data)
+    if tag != _BLOCK_RUNS_TAG or typecode not in (b"I", b"Q"):
+        return None
+    offsets = array(typecode.decode("ascii"))
+    types_end = _BLOCK_RUNS_HEADER.size + count
+    if len(data) != types_end + count * offsets.itemsize:
+        return None
+    offsets.frombytes(data[types_end:])
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    runs = []
+    start = 0
+    for is_comment, end in zip(data[_BLOCK_RUNS_HEADER.size:types_end], offsets):
+        runs.append(("comment" if is_comment else "code", start, end))
+        start = end
+    return runs
+
+
+def lexer_input(lexer, code):
+    """
+    Returns code as the lexer sees it, after Pygments' input normalization (e.g. "\r\n" -> "\n"):
+    the text all block offsets refer to.
+    """
+    preprocess = getattr(lexer, "_preprocess_lexer_input", None)
+    if preprocess is None:
+        # Not in this Pygments version: the tokens cover the normalized text.
+        return "".join(value for _, value in lexer.get_tokens(code))
+    return preprocess(code)
+
+
+def supports_restart(lexer):
+    """
+    Returns True if lexer tokenizes with RegexLexer's own state machine, so iter_regex_tokens() can
+    reproduce its tokens and expose the lexer state (needed for restarting in the middle of a text).
+    Lexers that override get_tokens_unprocessed (e.g. C/C++, which post-process names) are excluded,
+    and so is every lexer with a Pygments version whose loop was not checked against it.
+    """
+    return isinstance(lexer, RegexLexer) and _PYGMENTS_VERSION in RESTART_PYGMENTS_VERSIONS and \
+        type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed
+
+
+def _can_match_newline(items, flags):
+    """
+    Returns True if the parsed pattern items can consume a "\n" somewhere (conservatively).
+    """
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            if av == 10:
+                return True
+        elif op is sre_parse.NOT_LITERAL:
+            if av != 10:
+                return True
+        elif op is sre_parse.ANY:
+            if flags & re.DOTALL:
+                return True
+        elif op is sre_parse.IN:
+            found = False
+            for set_op, set_av in av:
+                if set_op is sre_parse.LITERAL:
+                    found = found or set_av == 10
+                elif set_op is sre_parse.RANGE:
+                    found = found or set_av[0] <= 10 <= set_av[1]
+                elif set_op is sre_parse.CATEGORY:
+                    found = found or str(set_av) in _NEWLINE_CATEGORIES
+            if found != (av[0][0] is sre_parse.NEGATE):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_can_match_newline(branch, flags) for branch in av[1]):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _can_match_newline(av[3], (flags | av[1]) & ~av[2]):
+                return True
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) or str(op) == "POSSESSIVE_REPEAT":
+            if _can_match_newline(av[2], flags):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _can_match_newline(av[1], flags):
+                return True
+        elif op is sre_parse.GROUPREF_EXISTS:
+            if _can_match_newline(av[1], flags) or (av[2] is not None and _can_match_newline(av[2], flags)):
+                return True
+        elif str(op) == "ATOMIC_GROUP":
+            if _can_match_newline(av, flags):
+                return True
+        elif op not in (sre_parse.AT, sre_parse.GROUPREF):
+            # Anything else: assume it can.
+            return True
+    return False
+
+
+def _literal_affix(items, from_end, skip_optional=None):
+    r"""
+    Returns (literal, complete): the literal text every match of the parsed pattern items starts
+    with, and whether the items consist of that literal only.
+
+    With from_end, returns a literal ending instead: optional items (like "x?") are left out, so a
+    text followed by the literal can complete a match (e.g. "*/" for /\*.*?\*/). skip_optional
+    (by default from_end) leaves them out of a literal start too: the literal of the usual match
+    (e.g. "/*" for C's /*, whose "/" and "*" may be split by a line continuation), not one that
+    every match has.
+    """
+    if skip_optional is None:
+        skip_optional = from_end
+    items = list(items)
+    if from_end:
+        items.reverse()
+    chars = []
+    complete = True
+    for op, av in items:
+        if op is sre_parse.IN and len(av) == 1 and av[0][0] is sre_parse.LITERAL:
+            op, av = av[0]
+        if op is sre_parse.LITERAL:
+            chars.append(chr(av))
+        elif op is sre_parse.AT and not chars:
+            continue
+        elif skip_optional and op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] == 0 \
+                and av[1] != sre_parse.MAXREPEAT:
+            continue
+        elif op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            literal, complete = _literal_affix(av[3], from_end, skip_optional)
+            chars.append(literal[::-1] if from_end else literal)
+            if not complete:
+                break
+        else:
+            complete = False
+            break
+    literal = "".join(chars)
+    return (literal[::-1] if from_end else literal), complete
+
+
+def _open_test(rexmatch):
+    r"""
+    Builds the open construct test of a lexer rule, or returns None if the rule cannot span lines.
+
+    A failed match attempt of a rule which can span lines (e.g. /\*.*?\*/ or an unterminated string)
+    may have scanned up to the end of the text, so it can succeed after an edit anywhere after it.
+    The test is applied to such failures: it returns True if the rest of the line (with the lines it
+    continues on with a backslash), completed with the literal text the rule ends with, would match,
+    i.e. the construct is open at that position.
+    """
+    pattern = rexmatch.__self__
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    flags = parsed.state.flags
+    if not _can_match_newline(parsed, flags):
+        return None
+    # The literal ending completes a match whatever the case; the start is only a quick check.
+    prefix = "" if flags & re.IGNORECASE else _literal_affix(parsed, False)[0]
+    suffix = _literal_affix(parsed, True)[0]
+
+    def open_test(text, pos):
+        if prefix and not text.startswith(prefix, pos):
+            return False
+        end = text.find("\n", pos) + 1 or len(text)
+        while end < len(text) and text.endswith("\\\n", pos, end):
+            # A line continuation (e.g. C's "/\<newline>*") may be part of the construct's start.
+            end = text.find("\n", end) + 1 or len(text)
+        return rexmatch(text[pos:end] + suffix) is not None
+    return open_test
+
+
+def _restart_rules(lexer):
+    """
+    Returns the lexer's processed token definitions with an open construct test (see _open_test)
+    appended to every rule.
+    """
+    lexer_class = type(lexer)
+    rules = _restart_rules_cache.get(lexer_class)
+    if rules is None:
+        rules = {state: [(rexmatch, action, new_state, _open_test(rexmatch))
+                         for rexmatch, action, new_state in statetokens]
+                 for state, statetokens in lexer._tokens.items()}
+        _restart_rules_cache[lexer_class] = rules
+    return rules
+
+
+def iter_regex_tokens(lexer, text, pos, state, open_points=None, skips=None):
+    """
+    Tokenizes text from offset pos with the state machine of a RegexLexer (see supports_restart()),
+    yielding (offset, token_type, value, at_boundary) tuples.
+
+    state is the state stack as a list (e.g. ["root"]); it is updated in place while lexing. When a
+    token has at_boundary set, it is the first token of a rule match, and state holds the stack with
+    which lexing from that offset reproduces the same tokens. Unlike slicing the text, starting at
+    pos keeps lookbehind assertions working.
+
+    If open_points is a list, the offsets at which a rule failed that could have matched with a
+    different text after it (an open construct, see _open_test) are appended to it. Lexing up to such
+    an offset depends on the text after it.
+
+    skips optionally maps states to the match method of a pattern which is tried before the rules at
+    every token start in that state; the text it matches is passed over without tokens. It must only
+    match tokens which are not comments and do not change the state (see scanners.py).
+    """
+    tokendefs = _restart_rules(lexer)
+    statetokens = tokendefs[state[-1]]
+    skip = skips.get(state[-1]) if skips else None
+    while 1:
+        if skip is not None:
+            m = skip(text, pos)
+            if m is not None:
+                pos = m.end()
+        for rexmatch, action, new_state, open_test in statetokens:
+            m = rexmatch(text, pos)
+            if m is None:
+                if open_test is not None and open_points is not None and open_test(text, pos) \
+                        and (not open_points or open_points[-1] != pos):
+                    open_points.append(pos)
+                continue
+            if action is not None:
+                if type(action) is _TokenType:
+                    yield pos, action, m.group(), True
+                else:
+                    at_boundary = True
+                    for index, token_type, value in action(lexer, m):
+                        yield index, token_type, value, at_boundary
+                        at_boundary = False
+            pos = m.end()
+            if new_state is not None:
+                # state transition
+                if isinstance(new_state, tuple):
+                    for new in new_state:
+                        if new == '#pop':
+                            if len(state) > 1:
+                                state.pop()
+                        elif new == '#push':
+                            state.append(state[-1])
+                        else:
+                            state.append(new)
+                elif isinstance(new_state, int):
+                    # pop, but keep at least one state on the stack
+                    if abs(new_state) >= len(state):
+                        del state[1:]
+                    else:
+                        del state[new_state:]
+                elif new_state == '#push':
+                    state.append(state[-1])
+                else:
+                    assert False, f"wrong state def: {new_state!r}"
+                statetokens = tokendefs[state[-1]]
+                skip = skips.get(state[-1]) if skips else None
+            break
+        else:
+            # No rule matched: at EOL, reset state to "root"; otherwise emit an error token.
+            if pos >= len(text):
+                break
+            if text[pos] == '\n':
+                yield pos, Whitespace, '\n', True
+                state[:] = ['root']
+                statetokens = tokendefs['root']
+                skip = skips.get('root') if skips else None
+                pos += 1
+                continue
+            yield pos, Error, text[pos], True
+            pos += 1
+
+
+class Block(Mapping):
+    """
+    One block of PygmentsParser.iter_comments_and_blocks(): its type and where it is in the source.
+    It is a read-only mapping with the keys of the block dictionaries ("type", "content", "newline",
+    "positions"), whose values are made on access, so a block costs one small object instead of a
+    dict holding a nested dict of tuples and a copy of its content. as_dict() returns a plain dict.
+    """
+    __slots__ = ("source", "type", "start", "end", "start_line", "start_col", "end_line", "end_col",
+                 "content_end")
+    _KEYS = ("type", "content", "newline", "positions")
+
+    def __init__(self, source, block_type, start, end, start_line, start_col, end_line, end_col):
+        self.source = source
+        self.type = block_type
+        self.start = start
+        self.end = end
+        self.start_line = start_line
+        self.start_col = start_col
+        self.end_line = end_line
+        self.end_col = end_col
+        # Trailing newlines are not part of the content, unless the block is just one newline.
+        content_end = end
+        if end - start > 1 and source[end - 1] == "\n":
+            content_end = end - 1
+            while content_end > start and source[content_end - 1] == "\n":
+                content_end -= 1
+        self.content_end = content_end
+
+    @property
+    def content(self):
+        return self.source[self.start:self.content_end]
+
+    @property
+    def newline(self):
+        return "\n" if self.content_end < self.end else ""
+
+    @property
+    def positions(self):
+        return {
+            "string": (self.start, self.end),
+            "line-char": ((self.start_line, self.start_col), (self.end_line, self.end_col))
+        }
+
+    def __getitem__(self, key):
+        if key == "type":
+            return self.type
+        if key == "content":
+            return self.source[self.start:self.content_end]
+        if key == "newline":
+            return self.newline
+        if key == "positions":
+            return self.positions
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def as_dict(self):
+        return {key: self[key] for key in self._KEYS}
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+def block_start(block):
+    """
+    Returns the (line, column) where a block starts: read from a Block directly, from the
+    "positions" of a block dictionary (e.g. one returned by a hook).
+    """
+    if type(block) is Block:
+        return block.start_line, block.start_col
+    return block["positions"]["line-char"][0]
+
+
+class BlockList(Sequence):
+    """
+    The blocks of one source in parallel arrays: a type code per block (1 for comment, 0 for code),
+    start and end offsets, and start and end lines and columns, about 33 bytes per block. Items are
+    Block views, made on access. See PygmentsParser.parse_blocks().
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.types = bytearray()
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.start_lines = array("I")
+        self.start_cols = array("I")
+        self.end_lines = array("I")
+        self.end_cols = array("I")
+
+    def append(self, block):
+        """
+        Adds a Block (or a block dictionary) of the source.
+        """
+        if isinstance(block, Block):
+            start, end = block.start, block.end
+            start_line, start_col, end_line, end_col = block.start_line, block.start_col, block.end_line, block.end_col
+        else:
+            start, end = block["positions"]["string"]
+            (start_line, start_col), (end_line, end_col) = block["positions"]["line-char"]
+        self.types.append(block["type"] == "comment")
+        self.starts.append(start)
+        self.ends.append(end)
+        self.start_lines.append(start_line)
+        self.start_cols.append(start_col)
+        self.end_lines.append(end_line)
+        self.end_cols.append(end_col)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Block(self.source, "comment" if self.types[index] else "code", self.starts[index],
+                     self.ends[index], self.start_lines[index], self.start_cols[index],
+                     self.end_lines[index], self.end_cols[index])
+
+    def nbytes(self):
+        """
+        Returns the memory taken by the arrays (the source text not included).
+        """
+        return len(self.types) + sum(a.itemsize * len(a) for a in (
+            self.starts, self.ends, self.start_lines, self.start_cols, self.end_lines, self.end_cols))
+
 
 class PygmentsParser:
-    def __init__(self, code, codetype):
+    def __init__(self, code, codetype, first_line=1):
+        """
+        first_line is the line number of the code's first line, for code taken from the middle of a
+        file (e.g. one page of a huge file); block positions count lines from there.
+        """
         self.code = code
-        self.lexer = get_lexer_by_name(codetype)
+        self.lexer = get_lexer(codetype)
+        self.first_line = first_line
+        self._line_offsets = None
 
     def iter_comments_and_blocks(self):
         """
@@ -20,89 +584,244 @@ class PygmentsParser:
           - "positions": dictionary containing the positions (both string and line-char ranges).
 
         This separation makes it easier later (for Markdown generation, etc.) to decide how the newline belongs.
+
+        Tokens are consumed lazily from the lexer, one at a time, so memory does not grow with the
+        token count. String positions refer to the source as the lexer sees it (after Pygments'
+        own input normalization, e.g. "\r\n" -> "\n"), which is kept in self.source; each block's
+        content is a single slice of that text.
+
+        If a comment scanner is registered for the lexer (see get_scanner), the blocks come from the
+        scanner instead, which finds the same boundaries much faster; self.scanned tells which way
+        the blocks were made. With a block store (see set_block_store), blocks parsed before (by any
+        process sharing the store) are taken from there; self.cached tells if they were, and a
+        block list read to the end is added to the store.
         """
-        tokens = list(lex(self.code, self.lexer))
-        position = 0
-        line = 1
-        column = 1
+        text = lexer_input(self.lexer, self.code)
+        self.source = text
+        self._line_offsets = None
+        self.scanned = False
+        self.cached = False
+        store = _block_store
+        key = None
+        if store is not None:
+            key = block_store_key(self.lexer, text)
+            runs = _read_block_runs(store, key)
+            if runs is not None and (not runs or runs[-1][2] == len(text)):
+                self.cached = True
+                self.open_block = None
+                yield from self.iter_run_blocks(text, runs)
+                return
+        scanner = get_scanner(self.lexer)
+        if scanner is None:
+            blocks = self.iter_blocks_from(text, line=self.first_line)
+        else:
+            blocks = self.iter_scanned_blocks(text, scanner)
+        if key is None:
+            yield from blocks
+            return
+        types = bytearray()
+        ends = []
+        for block in blocks:
+            types.append(block["type"] == "comment")
+            ends.append(block["positions"]["string"][1])
+            yield block
+        _write_block_runs(store, key, encode_block_runs(types, ends))
+
+    @property
+    def line_offsets(self):
+        """
+        The LineOffsets index of self.source (lines counted from self.first_line), made once per
+        source and shared by everything that needs line numbers of it: the block positions here
+        and the line tokens of code2md.MarkdownGenerator.
+        """
+        if self._line_offsets is None:
+            self._line_offsets = LineOffsets(self.source, self.first_line)
+        return self._line_offsets
+
+    def _line_offsets_for(self, text, position, line, column):
+        """
+        Returns the LineOffsets to locate the block boundaries of text from position on: the shared
+        one for a parse of the whole source, otherwise (e.g. an edited text being re-lexed from
+        position) one seeded with the known line and column of position.
+        """
+        if text is getattr(self, "source", None) and position == 0 and line == self.first_line:
+            return self.line_offsets
+        return LineOffsets(text, self.first_line, position, line, column)
+
+    def parse_blocks(self):
+        """
+        Returns all blocks of iter_comments_and_blocks() in a BlockList, for callers which keep them.
+        """
+        blocks = BlockList()
+        for block in self.iter_comments_and_blocks():
+            blocks.append(block)
+        blocks.source = self.source
+        return blocks
+
+    def iter_scanned_blocks(self, text, scanner):
+        """
+        Yields the blocks of text from the runs of scanner (a CommentScanner), as iter_blocks_from()
+        would from the lexer's tokens.
+
+        If the scanner aborts, the text is lexed after all and the lexer's blocks are yielded from
+        where the scanner's ended: the scanner only gives up at a construct it cannot handle, and a
+        block is yielded only once the run after it has started, so the blocks before that point are
+        the lexer's blocks.
+        """
+        self.scanned = True
+        self.open_block = None
+        count = 0
+        try:
+            for block in self.iter_run_blocks(text, _with_code_runs(scanner.scan(text), len(text))):
+                yield block
+                count += 1
+        except ScanAbort:
+            self.scanned = False
+            yield from itertools.islice(self.iter_blocks_from(text, line=self.first_line), count, None)
+
+    def iter_run_blocks(self, text, runs):
+        """
+        Yields the blocks of text made of (block_type, start, end) runs which cover it in order;
+        adjacent runs of the same type form one block. Lines count from self.first_line.
 
-        current_block = []
+        Only the block boundaries are located (a block ends where the next one starts), in batches
+        of BOUNDARY_BATCH with one LineOffsets.locate_many() call each.
+        """
+        line_offsets = self._line_offsets_for(text, 0, self.first_line, 1)
+        types = []  # types of the blocks of the batch; the last one may still grow
+        bounds = []  # their start offsets
         current_type = None
-        start_position = 0
-        start_line = 1
-        start_col = 1
-
-        for token_type, value in tokens:
-            token_lines = value.splitlines(keepends=True)
-            token_len = len(value)
-
-            # Save the current line/column BEFORE processing the token.
-            token_start_line = line
-            token_start_col = column
-
-            new_type = "comment" if token_type in Token.Comment else "code"
-
-            if new_type != current_type and current_block:
-                full_text = "".join(current_block)
-                # Separate any trailing newline(s) from the content.
-                if full_text.endswith("\n"):
-                    if full_text == "\n":
-                        # The entire block is just the newline; keep it in content.
-                        content = full_text
-                        newline = ""
-                    else:
-                        content = full_text.rstrip("\n")
-                        newline = "\n"
-                else:
-                    content = full_text
-                    newline = ""
-                yield {
-                    "type": current_type,
-                    "content": content,
-                    "newline": newline,
-                    "positions": {
-                        "string": (start_position, position),
-                        "line-char": ((start_line, start_col), (token_start_line, token_start_col))
-                    }
-                }
-                current_block = []
+        position = 0
+        for run_type, run_start, run_end in runs:
+            if run_type != current_type:
+                if len(types) > BOUNDARY_BATCH:
+                    yield from self._located_blocks(text, line_offsets, types[:-1], bounds)
+                    del types[:-1], bounds[:-1]
+                types.append(run_type)
+                bounds.append(run_start)
+                current_type = run_type
+            position = run_end
+        if types:
+            bounds.append(position)
+            yield from self._located_blocks(text, line_offsets, types, bounds)
+
+    def _located_blocks(self, text, line_offsets, types, bounds):
+        """
+        Yields the blocks of the given types from bounds[i] to bounds[i + 1], located together.
+        """
+        lines, columns = line_offsets.locate_many(bounds)
+        for i, block_type in enumerate(types):
+            yield self._make_block(text, block_type, bounds[i], bounds[i + 1],
+                                   lines[i], columns[i], lines[i + 1], columns[i + 1])
+
+    def iter_blocks_from(self, text, position=0, line=1, column=1, open_block=None, stack=None,
+                         restart_points=None, restart_stacks=None, stop=None, open_points=None):
+        """
+        Lexes text starting at offset position and yields blocks as iter_comments_and_blocks() does.
+
+        Used directly for incremental re-lexing (see incremental.py):
+          - position, line, column: where lexing starts; stack is the lexer state stack there
+            (None for the initial state). Restarting is only possible if supports_restart(self.lexer).
+          - open_block: optional (type, start, start_line, start_col) of a block which is still open at
+            position; following tokens of the same type extend it.
+          - restart_points, restart_stacks: if lists are given (and the lexer supports restarting),
+            every line start which is also the start of a rule match is appended to restart_points,
+            with the state stack there (a tuple) appended to restart_stacks. Offsets of open constructs
+            (see iter_regex_tokens) are appended to open_points, if a list is given.
+          - stop: optional callable(offset, block_type, stack) called at each such restart point; if it
+            returns True the generator ends there without yielding the open block, which is kept in
+            self.open_block as (type, start, start_line, start_col, offset, line).
+        """
+        comment_type = Token.Comment
+        track = restart_points is not None and supports_restart(self.lexer)
+        locate = self._line_offsets_for(text, position, line, column).locate
+
+        if open_block is not None:
+            current_type, start_position, start_line, start_col = open_block
+        else:
+            current_type = None
+            start_position = position
+            start_line = line
+            start_col = column
+
+        if track or stack is not None:
+            state = list(stack or ("root",))
+            tokens = iter_regex_tokens(self.lexer, text, position, state, open_points if track else None)
+        else:
+            tokens = ((index, token_type, value, False) for index, token_type, value
+                      in self.lexer.get_tokens_unprocessed(text[position:] if position else text))
+        first = True
+        stacks = {}
+        for _, token_type, value, at_boundary in tokens:
+            new_type = "comment" if token_type in comment_type else "code"
+
+            if track and at_boundary and not first and (position == 0 or text[position - 1] == "\n"):
+                key = tuple(state)
+                key = stacks.setdefault(key, key)
+                if stop is not None and stop(position, new_type, key):
+                    line = locate(position)[0]
+                    self.open_block = (current_type, start_position, start_line, start_col, position, line)
+                    return
+                restart_points.append(position)
+                restart_stacks.append(key)
+            first = False
+
+            if new_type != current_type and current_type is not None:
+                # Only block boundaries are located, not every token.
+                line, column = locate(position)
+                yield self._make_block(text, current_type, start_position, position,
+                                       start_line, start_col, line, column)
                 start_position = position
-                start_line = token_start_line
-                start_col = token_start_col
+                start_line = line
+                start_col = column
 
             current_type = new_type
-            current_block.append(value)
-            position += token_len
-
-            # Update line/column counters using the token's parts.
-            for part in token_lines:
-                if "\n" in part:
-                    line += part.count("\n")
-                    column = 1
-                else:
-                    column += len(part)
-
-        if current_block:
-            full_text = "".join(current_block)
-            if full_text.endswith("\n"):
-                if full_text == "\n":
-                    content = full_text
-                    newline = ""
-                else:
-                    content = full_text.rstrip("\n")
-                    newline = "\n"
-            else:
-                content = full_text
-                newline = ""
-            yield {
-                "type": current_type,
-                "content": content,
-                "newline": newline,
-                "positions": {
-                    "string": (start_position, position),
-                    "line-char": ((start_line, start_col), (line, column))
-                }
-            }
+            position += len(value)
+
+        self.open_block = None
+        if current_type is not None:
+            line, column = locate(position)
+            yield self._make_block(text, current_type, start_position, position,
+                                   start_line, start_col, line, column)
+
+    @staticmethod
+    def _make_block(text, block_type, start, end, start_line, start_col, end_line, end_col):
+        """
+        Builds one block for text[start:end] (see iter_comments_and_blocks).
+        """
+        return Block(text, block_type, start, end, start_line, start_col, end_line, end_col)
+
+
+def _read_block_runs(store, key):
+    # The store is only a cache: if it fails, the text is parsed as if there were no entry.
+    try:
+        data = store.get(key)
+    except Exception as e:
+        logging.error(f"Block store read failed: {e}")
+        return None
+    return decode_block_runs(data) if data is not None else None
+
+
+def _write_block_runs(store, key, data):
+    try:
+        store.put(key, data)
+    except Exception as e:
+        logging.error(f"Block store write failed: {e}")
+
+
+def _with_code_runs(runs, length):
+    """
+    Completes the (block_type, start, end) runs of a scanner with the code runs between them.
+    """
+    position = 0
+    for run_type, start, end in runs:
+        if start > position:
+            yield "code", position, start
+        yield run_type, start, end
+        position = end
+    if position < length:
+        yield "code", position, length
+
 
 if __name__ == "__main__":
     example_code = """
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+rendercache.py – A bounded, content-addressed cache for rendered pages.
+
+Entries live in a memory LRU with a byte budget, optionally backed by a disk directory and a
+sharedcache.SharedCache.
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def content_digest(data):
+    """
+    Returns the hex SHA-256 digest of the given bytes.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None, shared=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.shared = shared
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+        # key -> (text or bytes, size in bytes), most recently used last. The fingerprints are kept
+        # here too, under ("fingerprint", path), so they share the byte budget and the LRU eviction.
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "disk_hits": 0, "disk_writes": 0,
+                      "shared_hits": 0}
+
+    # --- Fingerprints
+    def lookup_digest(self, path, st):
+        """
+        Returns the remembered content digest for path if its size and mtime (from the
+        os.stat_result st) are unchanged, otherwise None.
+        """
+        # As long as os.stat() reports the same size and mtime, a file is not read (or hashed) again.
+        key = ("fingerprint", path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        size, mtime_ns, digest = entry[0]
+        if size == st.st_size and mtime_ns == st.st_mtime_ns:
+            return digest
+        return None
+
+    def remember_digest(self, path, st, digest):
+        """
+        Records the content digest of path for the size and mtime in st.
+        """
+        with self._lock:
+            self._store(("fingerprint", path), (st.st_size, st.st_mtime_ns, digest), len(path) + len(digest))
+
+    # --- Entries
+    @staticmethod
+    def make_key(kind, digest, variant=""):
+        """
+        Builds a cache key. kind is e.g. "md" or "html"; variant distinguishes renderings of
+        the same content (for example, the file extension which selects the language).
+        Keyed by the content digest, two paths with identical content share one entry, and an
+        edited file simply misses.
+        """
+        return f"{kind}:{digest}:{variant}"
+
+    def get(self, key):
+        """
+        Returns the cached text for key, or None. A disk or shared hit is promoted into memory.
+        """
+        return self._get(key, binary=False)
+
+    def get_bytes(self, key):
+        """
+        Returns the cached bytes for key (stored with put_bytes), or None.
+        """
+        return self._get(key, binary=True)
+
+    def put(self, key, text):
+        """
+        Stores text under key in memory (evicting as needed) and, if enabled, on disk and in the
+        shared cache.
+        """
+        self._put(key, text, text.encode("utf-8"))
+
+    def put_bytes(self, key, data):
+        """
+        Stores bytes (e.g. a compressed page) under key, like put().
+        """
+        self._put(key, data, data)
+
+    def _get(self, key, binary):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+        tier = "disk_hits"
+        data = self._disk_read(key)
+        if data is None and self.shared is not None:
+            tier = "shared_hits"
+            data = self.shared.get(key)
+        with self._lock:
+            if data is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats[tier] += 1
+            value = data if binary else data.decode("utf-8")
+            self._store(key, value, len(data))
+        return value
+
+    def _put(self, key, value, data):
+        # value is what get()/get_bytes() return, data its bytes for the size and the other tiers.
+        with self._lock:
+            self._store(key, value, len(data))
+        self._disk_write(key, data)
+        if self.shared is not None:
+            self.shared.put(key, data)
+
+    def clear(self):
+        """
+        Drops all in-memory entries and fingerprints (the disk and shared tiers are left untouched).
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_stats(self):
+        """
+        Returns a copy of the counters together with the current entry count and size.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def _store(self, key, value, nbytes):
+        # Caller holds the lock.
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old[1]
+        if nbytes > self.max_bytes:
+            # Larger than the whole budget: do not keep it in memory at all.
+            return
+        self._entries[key] = (value, nbytes)
+        self._size += nbytes
+        while self._size > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self._size -= evicted_bytes
+            self.stats["evictions"] += 1
+
+    # --- Disk tier (entries survive restarts and are never evicted by the memory budget)
+    def _disk_path(self, key):
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, name[:2], name)
+
+    def _disk_read(self, key):
+        if self.disk_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_write(self, key, data):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry.
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            self.stats["disk_writes"] += 1
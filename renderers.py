@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+renderers.py – Markdown to HTML backends, and rendering code files segment by segment.
+
+Segments are rendered on their own, so Markdown spanning segments (e.g. a reference-style link
+defined in another comment block) is not resolved.
+"""
+
+import re
+import html
+import functools
+
+try:
+    import cmarkgfm
+    from cmarkgfm.cmark import Options as CmarkOptions
+except ImportError:
+    cmarkgfm = None
+
+import metrics
+import fences
+from highlighter import Task3Highlighter
+
+BACKENDS = ("mistune", "cmark")
+
+# A fence as cmark renders it with CMARK_OPT_SOURCEPOS: the first word of its info string and its
+# escaped code. Raw HTML gets no source position, so a <pre><code class="language-..."> written in
+# a document is left alone.
+_CMARK_FENCE = re.compile(r'<pre data-sourcepos="\d+:\d+-\d+:\d+"><code class="language-([^"]*)">(.*?)</code></pre>\n',
+                          re.DOTALL)
+# The source position of any other element cmark renders, removed again.
+_CMARK_SOURCEPOS = re.compile(r'(<[a-z][a-z0-9]*) data-sourcepos="\d+:\d+-\d+:\d+"')
+
+_renderers = {}  # name -> renderer
+
+
+class MistuneRenderer:
+    name = "mistune"
+
+    def markdown_to_html(self, text):
+        return fences.markdown_to_html(text)
+
+
+# Raw HTML is kept as Mistune keeps it (CMARK_OPT_UNSAFE) and the fences are highlighted by
+# fences.code_blocks_html, so the two backends differ only where the parsers do.
+class CmarkRenderer:
+    name = "cmark"
+
+    def markdown_to_html(self, text):
+        with metrics.stage("cmark"):
+            result = cmarkgfm.markdown_to_html(
+                text, options=CmarkOptions.CMARK_OPT_UNSAFE | CmarkOptions.CMARK_OPT_SOURCEPOS)
+        matches = [m for m in _CMARK_FENCE.finditer(result) if fences.fence_language(html.unescape(m.group(1)))]
+        strip = functools.partial(_CMARK_SOURCEPOS.sub, r"\1")
+        if not matches:
+            return strip(result)
+        blocks = fences.code_blocks_html([(html.unescape(m.group(1)), html.unescape(m.group(2))) for m in matches])
+        out = []
+        written = 0
+        for m, block in zip(matches, blocks):
+            out.append(strip(result[written:m.start()]))
+            out.append(block)
+            written = m.end()
+        out.append(strip(result[written:]))
+        return "".join(out)
+
+
+def available_backends():
+    """
+    Returns the names of the backends which can be used here.
+    """
+    return tuple(name for name in BACKENDS if name != "cmark" or cmarkgfm is not None)
+
+
+def get_renderer(name="auto"):
+    """
+    Returns the renderer of backend name ("mistune", "cmark" or "auto"), made once per backend.
+    Raises ValueError for an unknown backend, or for "cmark" if cmarkgfm is not installed.
+    """
+    if name == "auto":
+        name = "cmark" if cmarkgfm is not None else "mistune"
+    renderer = _renderers.get(name)
+    if renderer is None:
+        if name == "mistune":
+            renderer = MistuneRenderer()
+        elif name == "cmark":
+            if cmarkgfm is None:
+                raise ValueError("The cmark backend needs the cmarkgfm package (pip install cmarkgfm)")
+            renderer = CmarkRenderer()
+        else:
+            raise ValueError(f"Unknown Markdown backend {name!r}; expected one of {', '.join(BACKENDS)} or auto")
+        _renderers[name] = renderer
+    return renderer
+
+
+# A "code" segment is one fence MarkdownGenerator wrote itself, so it is turned into <pre> HTML
+# without running a Markdown parser over the code; only comment segments are parsed. This differs
+# from the whole document only where Markdown spans segments there: an unclosed fence or HTML block
+# in a comment, or a code line that is a closing fence by itself.
+def code_segment_block(text):
+    """
+    Returns (info string, code) of a "code" segment of MarkdownGenerator ("```lang\\n...\\n```"),
+    with Task3Highlighter's markers added and the code ending with a newline as Mistune passes it,
+    or None if text is not such a fence.
+    """
+    first_newline = text.find("\n")
+    if (not text.startswith("```") or first_newline < 0 or not text.endswith("\n```")
+            or len(text) < first_newline + 5):
+        return None
+    info = text[3:first_newline]
+    code = text[first_newline + 1:-3]
+    with metrics.stage("highlight"):
+        code = Task3Highlighter(None).process_code_block(code, info.split(None, 1)[0] if info.strip() else None)
+    return info, code
+
+
+def markdown_segment_html(text, renderer):
+    with metrics.stage("highlight"):
+        text = Task3Highlighter(text).process()
+    return renderer.markdown_to_html(text)
+
+
+def segment_html(mode, text, renderer=None):
+    """
+    Returns the HTML of one segment (e.g. for streaming).
+    """
+    block = code_segment_block(text) if mode == "code" else None
+    if block is None:
+        return markdown_segment_html(text, renderer or get_renderer("mistune"))
+    return fences.code_blocks_html([block])[0]
+
+
+def iter_segments_html(segments, renderer=None):
+    """
+    Yields the HTML of each (mode, text) segment, one at a time.
+    """
+    for mode, text in segments:
+        yield segment_html(mode, text, renderer)
+
+
+def render_segments(segments, renderer=None):
+    """
+    Returns the HTML of all (mode, text) segments; the code segments are highlighted together (see
+    fences.code_blocks_html).
+    """
+    renderer = renderer or get_renderer("mistune")
+    pieces = []
+    blocks = []  # (info string, code) of the code segments
+    positions = []  # their index in pieces
+    for mode, text in segments:
+        block = code_segment_block(text) if mode == "code" else None
+        if block is None:
+            pieces.append(markdown_segment_html(text, renderer))
+        else:
+            positions.append(len(pieces))
+            pieces.append(None)
+            blocks.append(block)
+    if blocks:
+        for position, block_html in zip(positions, fences.code_blocks_html(blocks)):
+            pieces[position] = block_html
+    return "".join(pieces)
@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+"""
+scanners.py – Lexer-free comment scanners for readblocks.PygmentsParser.
+
+The scanners give the same blocks as the lexers (see tests/test_scanners.py); where they cannot
+tell, they raise ScanAbort and the file is lexed after all.
+"""
+
+import re
+import keyword
+from collections import deque
+
+from pygments.lexers.python import PythonLexer
+from pygments.lexers.javascript import JavascriptLexer
+from pygments.lexers.go import GoLexer
+from pygments.lexers.jvm import JavaLexer
+from pygments.lexers.c_cpp import CLexer, CppLexer
+from pygments.lexers.shell import BashLexer
+from pygments.token import Token
+
+from readblocks import CommentScanner, ScanAbort, register_scanner, iter_regex_tokens
+
+# The scanners do not implement the languages; they reproduce what the lexer makes of the text,
+# quirks included (e.g. a single-quoted Python string ends at the end of the line, and "#" inside an
+# f-string replacement field is not a comment). Where a lexer rule makes a comment boundary depend
+# on more than a scanner tracks (mostly invalid code, e.g. "def" followed by a line break), the
+# scanner raises ScanAbort.
+
+# The Pygments versions whose lexer rules the scanners reproduce.
+VERIFIED_PYGMENTS_VERSIONS = ("2.19",)
+
+
+def _line_end(text, pos):
+    end = text.find("\n", pos)
+    return end if end != -1 else len(text)
+
+
+# --- Python ---------------------------------------------------------------------------------
+
+# What matters in the lexer's root state: its docstring rule (at line starts), soft keywords,
+# comments, strings and the keywords whose rules consume whitespace (possibly line breaks).
+_PY_ROOT = re.compile(
+    r"(?P<doc>^\s*[rRuUbB]{0,2}(?:\"{3}|'{3}))"
+    r"|(?P<soft>^[ \t]*(?:match|case)\b)"
+    r"|(?P<comment>#)"
+    r"|(?P<quote>[\"'])"
+    r"|(?P<keyword>\b(?:def|class|from|import)\b)",
+    re.MULTILINE)
+
+# The lexer's rules (Pygments 2.19).
+_PY_SOFT_KEYWORD = re.compile(
+    r"(^[ \t]*)(match|case)\b(?![ \t]*(?:[:,;=^&|@~)\]}]|(?:"
+    + "|".join(k for k in keyword.kwlist if k[0].islower()) + r")\b))",
+    re.MULTILINE)
+_PY_SOFT_KEYWORD_INNER = re.compile(r"(\s+)([^\n_]*)(_\b)", re.MULTILINE)
+_PY_KEYWORD_SPACE = re.compile(r"(?:\s|\\\s)+", re.MULTILINE)
+_PY_FORMAT_FIELD = re.compile(
+    r"\{((\w+)((\.\w+)|(\[[^\]]+\]))*)?(\![sra])?"
+    r"(\:(.?[<>=\^])?[-+ ]?#?0?(\d+)?,?(\.\d+)?[E-GXb-gnosx%]?)?\}",
+    re.MULTILINE)
+_PY_FSTRING_FIELD_END = re.compile(r"(=\s*)?(\![sraf])?[}:]", re.MULTILINE)
+# The "import" and "from" states, as far as whitespace goes.
+_PY_NAME = re.compile(r"[^\W\d]\w*")
+_PY_IMPORT_NAMES = re.compile(r"(?:\s+as\s+|\.|[^\W\d]\w*|\s*,\s*)*")
+_PY_FROM_NAMES = re.compile(r"[.\w]*(?:\s+import\b)?")
+
+# Inside an f-string replacement field: brackets, the end of the field and strings.
+_PY_FIELD_EVENTS = re.compile(r"[{}()\[\]:=!\"']")
+
+# String prefix -> (f-string, raw, named escapes "\N{...}").
+_PY_STR = (False, False, True)
+_PY_PREFIXES = {
+    "": _PY_STR, "u": _PY_STR,
+    "b": (False, False, False),
+    "r": (False, True, False), "rb": (False, True, False), "br": (False, True, False),
+    "f": (True, False, True),
+    "rf": (True, True, False), "fr": (True, True, False),
+}
+
+# Replacement field frames (outside / inside brackets) on the string stack.
+_FIELD = "field"
+_FIELD_INNER = "field-inner"
+
+# (quote, triple, f-string, raw) -> search function for the characters that matter in the string.
+_py_string_events = {}
+
+
+def _py_string_frame(text, pos, kind):
+    """
+    Returns the stack frame of the string starting at pos (its first quote) and the offset after
+    its opening quote(s).
+    """
+    fstring, raw, named = kind
+    quote = text[pos]
+    triple = quote * 3 if text.startswith(quote * 3, pos) else None
+    key = (quote, triple is not None, fstring, raw)
+    search = _py_string_events.get(key)
+    if search is None:
+        chars = quote + "{"
+        if fstring:
+            chars += "}"
+        if not (raw and triple):
+            chars += "\\\\"
+        if not triple:
+            chars += "\n"
+        search = _py_string_events[key] = re.compile(f"[{chars}]").search
+    frame = (quote, triple, fstring, named, search)
+    return frame, pos + (3 if triple else 1)
+
+
+def _py_string_kind(text, pos):
+    """
+    Returns the kind (see _PY_PREFIXES) of the string whose quote is at pos, from the name before it.
+    """
+    start = pos
+    while start > 0 and (text[start - 1].isalnum() or text[start - 1] == "_"):
+        start -= 1
+    if start == pos:
+        return _PY_STR
+    prefix = text[start:pos]
+    before = text[start - 1:start]
+    if not prefix.isascii() or prefix[0].isdigit() or before == "@" or not before.isascii():
+        # A number, decorator or non-ASCII name may end in what looks like a prefix.
+        raise ScanAbort
+    return _PY_PREFIXES.get(prefix.lower(), _PY_STR)
+
+
+def _py_string_end(text, pos, kind):
+    """
+    Skips the string starting at pos (its first quote) and returns the offset where the lexer is in
+    its root state again: after the closing quote, at the line break which ends an unterminated
+    single-quoted string (the lexer returns to its root state there, even from inside an f-string
+    replacement field), or at the end of the text.
+    """
+    frame, pos = _py_string_frame(text, pos, kind)
+    stack = [frame]
+    while stack:
+        frame = stack[-1]
+        if type(frame) is tuple:
+            quote, triple, fstring, named, search = frame
+            m = search(text, pos)
+            if m is None:
+                return len(text)
+            i = m.start()
+            char = text[i]
+            if char == quote:
+                if triple is None:
+                    stack.pop()
+                    pos = i + 1
+                elif text.startswith(triple, i):
+                    stack.pop()
+                    pos = i + 3
+                else:
+                    pos = i + 1
+            elif char == "\\":
+                if named and text.startswith("\\N{", i):
+                    close = text.find("}", i + 3)
+                    if close != -1 and text.find("\n", i + 3, close) == -1:
+                        pos = close + 1
+                        continue
+                pos = i + 2 if text[i + 1:i + 2] in ("\\", "'", '"', "\n") else i + 1
+            elif char == "\n":
+                return i
+            elif char == "{":
+                if text.startswith("{{", i):
+                    pos = i + 2
+                elif fstring:
+                    stack.append(_FIELD)
+                    pos = i + 1
+                else:
+                    field = _PY_FORMAT_FIELD.match(text, i)
+                    pos = field.end() if field else i + 1
+            else:
+                pos = i + 2 if text.startswith("}}", i) else i + 1
+        else:
+            m = _PY_FIELD_EVENTS.search(text, pos)
+            if m is None:
+                return len(text)
+            i = m.start()
+            char = text[i]
+            if char in "{([":
+                stack.append(_FIELD_INNER)
+                pos = i + 1
+            elif char in "\"'":
+                frame, pos = _py_string_frame(text, i, _py_string_kind(text, i))
+                stack.append(frame)
+            elif frame is _FIELD_INNER:
+                if char in ")]}":
+                    stack.pop()
+                pos = i + 1
+            elif char in "}:":
+                stack.pop()
+                pos = i + 1
+            elif char in "=!":
+                end = _PY_FSTRING_FIELD_END.match(text, i)
+                if end:
+                    stack.pop()
+                    pos = end.end()
+                else:
+                    pos = i + 1
+            else:
+                pos = i + 1
+    return pos
+
+
+class PythonScanner(CommentScanner):
+    pygments_versions = VERIFIED_PYGMENTS_VERSIONS
+
+    def scan(self, text):
+        search = _PY_ROOT.search
+        pos = 0
+        while True:
+            m = search(text, pos)
+            if m is None:
+                return
+            group = m.lastgroup
+            start = m.start()
+            if group == "comment":
+                pos = _line_end(text, start)
+                yield "comment", start, pos
+            elif group == "quote":
+                pos = _py_string_end(text, start, _py_string_kind(text, start))
+            elif group == "doc":
+                quote_pos = m.end() - 3
+                close = text.find(text[quote_pos:m.end()], m.end())
+                if close != -1:
+                    pos = close + 3
+                else:
+                    # Not a docstring for the lexer either: an unterminated string.
+                    pos = _py_string_end(text, quote_pos, _py_string_kind(text, quote_pos))
+            elif group == "soft":
+                pos = self._soft_keyword_end(text, start, m.end())
+            else:
+                self._check_keyword(text, m.group(group), m.end())
+                pos = m.end()
+
+    @staticmethod
+    def _soft_keyword_end(text, start, end):
+        # "match"/"case" statements: the lexer lexes the pattern up to a "_" separately.
+        m = _PY_SOFT_KEYWORD.match(text, start)
+        if m is None:
+            return end
+        end = m.end()
+        inner = _PY_SOFT_KEYWORD_INNER.match(text, end)
+        while inner is not None:
+            if "\n" in inner.group(1) or any(c in inner.group(2) for c in "#'\""):
+                raise ScanAbort
+            end = inner.end()
+            inner = _PY_SOFT_KEYWORD_INNER.match(text, end)
+        return end
+
+    @staticmethod
+    def _check_keyword(text, word, end):
+        # The lexer's rules for these keywords take the whitespace after them, which changes where
+        # its line-start rules apply if it contains a line break.
+        space = _PY_KEYWORD_SPACE.match(text, end)
+        if space is None:
+            return
+        if "\n" in space.group():
+            raise ScanAbort
+        end = space.end()
+        if word in ("def", "class"):
+            # A name directly followed by a quote is the lexer's function or class name, not the
+            # prefix of the string.
+            name = _PY_NAME.match(text, end)
+            if name and text[name.end():name.end() + 1] in ("'", '"'):
+                raise ScanAbort
+        if word == "class":
+            # Anything up to the class name would be an error token, even "#" or a quote.
+            if not text[end:end + 1].isidentifier():
+                raise ScanAbort
+        elif word == "import":
+            if "\n" in _PY_IMPORT_NAMES.match(text, end).group():
+                raise ScanAbort
+        elif word == "from":
+            if "\n" in _PY_FROM_NAMES.match(text, end).group():
+                raise ScanAbort
+
+
+# --- JavaScript -----------------------------------------------------------------------------
+
+_JS_CODE_EVENTS = re.compile(r"[/\"'`]|<!--")
+_JS_FIELD_EVENTS = re.compile(r"[/\"'`}]|<!--")
+_JS_TEMPLATE_EVENTS = re.compile(r"[`\\$]")
+# The lexer's rules (Pygments 2.19).
+_JS_HASHBANG = re.compile(r"#! ?/.*?$", re.DOTALL | re.MULTILINE)
+_JS_REGEX = re.compile(r"/(\\.|[^[/\\\n]|\[(\\.|[^\]\\\n])*])+/([gimuysd]+\b|\B)",
+                       re.DOTALL | re.MULTILINE)
+_JS_STRINGS = {
+    '"': re.compile(r'"(\\\\|\\[^\\]|[^"\\])*"', re.DOTALL | re.MULTILINE),
+    "'": re.compile(r"'(\\\\|\\[^\\]|[^'\\])*'", re.DOTALL | re.MULTILINE),
+}
+# Tokens after which the lexer takes "/" for the start of a regular expression.
+_JS_REGEX_KEYWORDS = frozenset((
+    "typeof", "instanceof", "in", "void", "delete", "new",
+    "for", "while", "do", "break", "return", "continue", "switch", "case", "default", "if",
+    "else", "throw", "try", "catch", "finally", "yield", "await", "async", "this", "of",
+    "static", "export", "import", "debugger", "extends", "super",
+    "var", "let", "const", "with", "function", "class"))
+_JS_OPERATOR_CHARS = "+-~?:=<>!*%&|^/"
+_JS_NUMBER_CHARS = frozenset("0123456789abcdefABCDEFxXoOn")
+# How many comments in a row the regular expression test looks back over.
+_JS_RECENT_COMMENTS = 256
+
+
+class JavascriptScanner(CommentScanner):
+    pygments_versions = VERIFIED_PYGMENTS_VERSIONS
+
+    def scan(self, text):
+        # Code is scanned in regions: the file and each ${...} field of a template literal. A region
+        # starts at its barrier; regex_at_barrier tells if the lexer expects a regular expression
+        # there. recent holds the latest comments, literal_end the end of the latest literal.
+        n = len(text)
+        pos = barrier = 0
+        regex_at_barrier = True
+        field = False
+        template = False
+        regions = []
+        recent = deque(maxlen=_JS_RECENT_COMMENTS)
+        literal_end = -1
+        m = _JS_HASHBANG.match(text)
+        if m:
+            yield "comment", 0, m.end()
+            pos = barrier = m.end()
+            regex_at_barrier = False
+        while True:
+            if template:
+                m = _JS_TEMPLATE_EVENTS.search(text, pos)
+                if m is None:
+                    return
+                i = m.start()
+                char = text[i]
+                if char == "`":
+                    barrier, regex_at_barrier, field = regions.pop()
+                    template = False
+                    pos = literal_end = i + 1
+                elif char == "\\":
+                    pos = i + 2
+                elif text.startswith("${", i):
+                    template = False
+                    field = True
+                    pos = barrier = i + 2
+                    regex_at_barrier = False
+                else:
+                    pos = i + 1
+                continue
+
+            m = (_JS_FIELD_EVENTS if field else _JS_CODE_EVENTS).search(text, pos)
+            if m is None:
+                return
+            i = m.start()
+            char = text[i]
+            if char == "/":
+                end = None
+                if text.startswith("//", i):
+                    end = _line_end(text, i)
+                elif text.startswith("/*", i):
+                    close = text.find("*/", i + 2)
+                    if close != -1:
+                        end = close + 2
+                if end is not None:
+                    if i == 0:
+                        # The lexer's zero-width line start token comes first.
+                        yield "code", 0, 0
+                    yield "comment", i, end
+                    recent.append((i, end))
+                    pos = end
+                elif self._expects_regex(text, i, barrier, regex_at_barrier, recent, literal_end):
+                    regex = _JS_REGEX.match(text, i)
+                    if regex:
+                        pos = literal_end = regex.end()
+                    else:
+                        # The rest of the line is an error for the lexer.
+                        end = text.find("\n", i)
+                        if end == -1:
+                            return
+                        pos = barrier = end + 1
+                        regex_at_barrier = True
+                else:
+                    pos = i + 1
+            elif char == "<":
+                run = i
+                while run > 0 and text[run - 1] == "<":
+                    run -= 1
+                if (i - run) % 2:
+                    # The lexer takes the "<" for the end of a "<<" operator.
+                    pos = i + 1
+                    continue
+                if i == 0:
+                    yield "code", 0, 0
+                yield "comment", i, i + 4
+                recent.append((i, i + 4))
+                pos = i + 4
+            elif char == "`":
+                regions.append((barrier, regex_at_barrier, field))
+                template = True
+                pos = i + 1
+            elif char == "}":
+                template = True
+                field = False
+                pos = i + 1
+            else:
+                string = _JS_STRINGS[char].match(text, i)
+                if string:
+                    pos = literal_end = string.end()
+                else:
+                    pos = i + 1
+
+    @staticmethod
+    def _expects_regex(text, pos, barrier, regex_at_barrier, recent, literal_end):
+        """
+        Returns True if the lexer is in its "slashstartsregex" state at the "/" at pos: the last
+        token before it (skipping whitespace and comments) is one after which it expects a regular
+        expression, or a line start was passed where its line start rule applies.
+        """
+        index = len(recent) - 1
+        while True:
+            if pos > 0 and text[pos - 1] == "\n":
+                return True
+            start = pos
+            while start > barrier and text[start - 1].isspace():
+                start -= 1
+            if start <= barrier:
+                return regex_at_barrier
+            if index >= 0 and recent[index][1] == start:
+                pos = recent[index][0]
+                index -= 1
+                continue
+            if index < 0 and len(recent) == recent.maxlen:
+                raise ScanAbort
+            break
+        if start == literal_end:
+            return False
+        char = text[start - 1]
+        if char in "{([;,":
+            return True
+        if char in _JS_OPERATOR_CHARS:
+            if char == ">" and text[start - 2:start - 1] == "=":
+                # "=>" is punctuation, unless the "=" belongs to an operator before it.
+                if text[start - 3:start - 2] and text[start - 3] in _JS_OPERATOR_CHARS:
+                    raise ScanAbort
+                return False
+            return True
+        if char == "\\":
+            return text[start:start + 1] == "\n"
+        if char.isalnum() or char in "_$":
+            word_start = start
+            while word_start > barrier and (text[word_start - 1].isalnum() or text[word_start - 1] in "_$"):
+                word_start -= 1
+            word = text[word_start:start]
+            before = text[word_start - 1:word_start]
+            if not word.isascii() or before == "\\":
+                raise ScanAbort
+            if word[0].isdigit():
+                if _JS_NUMBER_CHARS.issuperset(word):
+                    return False
+                raise ScanAbort
+            if before == "#":
+                return False
+            return word in _JS_REGEX_KEYWORDS
+        return False
+
+
+# --- Go -------------------------------------------------------------------------------------
+
+_GO_EVENTS = re.compile(r"[/\"'`]")
+# The lexer's rules (Pygments 2.19); its /(\\\n)?[*](.|\n)*?[*](\\\n)?/ is split in two.
+_GO_COMMENT_OPEN = re.compile(r"/(\\\n)?[*]")
+_GO_COMMENT_CLOSE = re.compile(r"[*](\\\n)?/")
+_GO_LITERALS = {
+    "'": re.compile(r"""'(\\['"\\abfnrtv]|\\x[0-9a-fA-F]{2}|\\[0-7]{1,3}"""
+                    r"""|\\u[0-9a-fA-F]{4}|\\U[0-9a-fA-F]{8}|[^\\])'""", re.MULTILINE),
+    "`": re.compile(r"`[^`]*`", re.MULTILINE),
+    '"': re.compile(r'"(\\\\|\\[^\\]|[^"\\])*"', re.MULTILINE),
+}
+
+
+class GoScanner(CommentScanner):
+    pygments_versions = VERIFIED_PYGMENTS_VERSIONS
+
+    def scan(self, text):
+        search = _GO_EVENTS.search
+        pos = 0
+        while True:
+            m = search(text, pos)
+            if m is None:
+                return
+            i = m.start()
+            char = text[i]
+            if char == "/":
+                if text.startswith("//", i):
+                    pos = _line_end(text, i)
+                    yield "comment", i, pos
+                    continue
+                opening = _GO_COMMENT_OPEN.match(text, i)
+                closing = opening and _GO_COMMENT_CLOSE.search(text, opening.end())
+                if closing:
+                    pos = closing.end()
+                    yield "comment", i, pos
+                else:
+                    pos = i + 1
+            else:
+                literal = _GO_LITERALS[char].match(text, i)
+                pos = literal.end() if literal else i + 1
+
+
+# --- Java -----------------------------------------------------------------------------------
+
+_JAVA_EVENTS = re.compile(
+    r"(?P<record>^\s*(?:(?:public|private|protected|static|strictfp)\s+)*record\b)"
+    r"|(?P<slash>/)|(?P<quote>\")|(?P<char>')"
+    r"|(?P<keyword>\b(?:class|interface|var|package|import)\b)",
+    re.MULTILINE)
+# The lexer's rules (Pygments 2.19).
+_JAVA_CHAR = re.compile(r"'\\.'|'[^\\]'|'\\u[0-9a-fA-F]{4}'", re.DOTALL | re.MULTILINE)
+_JAVA_STRING_EVENTS = re.compile(r'[\\"]')
+_JAVA_SPACE = re.compile(r"\s+")
+_JAVA_IMPORT = re.compile(r"import(?:\s+static)?\s+")
+# Text the "class", "var" and "import" states turn into error tokens before the name they expect
+# (the lexer's own rules only match names); a comment or string start there would be lost.
+_JAVA_CLASS_GAP = re.compile(r"(?:[^\w$/\"']|\d)*")
+_JAVA_VAR_GAP = re.compile(r"(?:[^\w$/\"'\n]|\d)*")
+_JAVA_IMPORT_GAP = re.compile(r"[^\w./\"'\n]*")
+
+
+class JavaScanner(CommentScanner):
+    pygments_versions = VERIFIED_PYGMENTS_VERSIONS
+
+    def scan(self, text):
+        search = _JAVA_EVENTS.search
+        pos = 0
+        while True:
+            m = search(text, pos)
+            if m is None:
+                return
+            group = m.lastgroup
+            i = m.start(group)
+            pos = m.end()
+            if group == "slash":
+                if text.startswith("//", i):
+                    end = text.find("\n", i)
+                    if end != -1:
+                        yield "comment", i, end
+                        pos = end
+                elif text.startswith("/*", i):
+                    close = text.find("*/", i + 2)
+                    if close != -1:
+                        pos = close + 2
+                        yield "comment", i, pos
+            elif group == "quote":
+                if text.startswith('"""\n', i):
+                    pos = self._string_end(text, i + 4, True)
+                else:
+                    pos = self._string_end(text, i + 1, False)
+            elif group == "char":
+                char = _JAVA_CHAR.match(text, i)
+                if char:
+                    pos = char.end()
+            elif group == "record":
+                self._check_gap(text, _JAVA_CLASS_GAP, pos)
+            else:
+                self._check_keyword(text, m.group(group), i, pos)
+
+    @staticmethod
+    def _string_end(text, pos, text_block):
+        search = _JAVA_STRING_EVENTS.search
+        while True:
+            m = search(text, pos)
+            if m is None:
+                return len(text)
+            i = m.start()
+            if text[i] == "\\":
+                pos = i + 2 if text[i + 1:i + 2] in ("\\", '"') else i + 1
+            elif not text_block:
+                return i + 1
+            elif text.startswith('"""', i):
+                return i + 3
+            else:
+                pos = i + 1
+
+    @staticmethod
+    def _check_gap(text, gap, pos):
+        end = gap.match(text, pos).end()
+        if text[end:end + 1] in ("/", '"', "'"):
+            raise ScanAbort
+
+    def _check_keyword(self, text, word, start, end):
+        before = text[start - 1:start]
+        if before in ("$", "@"):
+            return
+        if before == ".":
+            # ".class" is an attribute, unless the "." ends a number.
+            word_start = start - 1
+            while word_start > 0 and (text[word_start - 1].isalnum() or text[word_start - 1] in "_$"):
+                word_start -= 1
+            if word_start == start - 1 or not text[word_start].isdigit():
+                return
+        if word in ("class", "interface"):
+            self._check_gap(text, _JAVA_CLASS_GAP, end)
+        elif word == "import":
+            m = _JAVA_IMPORT.match(text, start)
+            if m:
+                self._check_gap(text, _JAVA_IMPORT_GAP, m.end())
+        else:
+            space = _JAVA_SPACE.match(text, end)
+            if space:
+                self._check_gap(text, _JAVA_VAR_GAP if word == "var" else _JAVA_IMPORT_GAP, space.end())
+
+
+# --- C, C++ and shell -----------------------------------------------------------------------
+
+# Runs of tokens which the C and C++ lexers (Pygments 2.19) lex without comments or state changes:
+# in the statement states blanks, line breaks, operators and punctuation except "/", plain integers
+# and names other than the keywords that enter a state or prefixes of literals; in the root state,
+# where the function and declaration rules start at names, only blanks and line breaks. Line starts
+# are only passed over where no preprocessor, comment or label rule can match.
+_C_LINE = r"(?=[ \t]*[^\s#/])(?![ \t]*[\w$\\]+\s*:)"
+_C_BLANKS = r"[ \t]+|\n" + _C_LINE
+_C_TOKENS = (_C_BLANKS + r"|[~!%^&*+=|?:<>\-()\[\],.]|\d+(?![\w$'.])"
+             r"|(?!(?:struct|union|case|class|concept|typename|namespace|enum)\b)[^\W\d][\w$]*(?![\w$\"'\\])")
+_C_SKIPS = {"root": re.compile(f"(?:(?<=[^\\n])|{_C_LINE})(?:{_C_BLANKS})+"),
+            "statement": re.compile(f"(?:(?<=[^\\n])|{_C_LINE})(?:{_C_TOKENS})+"),
+            "function": re.compile(f"(?:(?<=[^\\n])|{_C_LINE})(?:{_C_TOKENS}|;)+")}
+# The same for the shell lexer: whitespace and words which end where the lexer's word rule ends them.
+_SH_WORDS = re.compile(r"(?:\s+|[\w./,:+%@~^!?*-]+(?=[=\s\[\]{}()$\"'`\\<&|;]|\Z))+")
+_SH_SKIPS = {"root": _SH_WORDS, "paren": _SH_WORDS, "backticks": _SH_WORDS}
+
+
+class SkippingScanner(CommentScanner):
+    """
+    Lexes with the lexer's own state machine (readblocks.iter_regex_tokens), passing over the runs
+    of tokens which the skips patterns (per state) match: for lexers whose comments depend on more
+    state than a scanner of their own could track, such as C's re-lexed function signatures.
+    """
+    pygments_versions = VERIFIED_PYGMENTS_VERSIONS
+
+    def __init__(self, lexer_class, skips):
+        self.lexer = lexer_class()
+        self.skips = {state: pattern.match for state, pattern in skips.items()}
+
+    def scan(self, text):
+        comment = Token.Comment
+        start = end = None
+        for index, token_type, value, _ in iter_regex_tokens(self.lexer, text, 0, ["root"], skips=self.skips):
+            if token_type in comment:
+                if index != end:
+                    if start is not None:
+                        yield "comment", start, end
+                    start = index
+                end = index + len(value)
+            elif not value:
+                if start is not None:
+                    yield "comment", start, end
+                    start = end = None
+                yield "code", index, index
+        if start is not None:
+            yield "comment", start, end
+
+
+# Lexing classifies every token, yet splitting into blocks only needs the comment spans; for the
+# common languages the lexer is most of the time a render takes.
+register_scanner(PythonLexer, PythonScanner())
+register_scanner(JavascriptLexer, JavascriptScanner())
+register_scanner(GoLexer, GoScanner())
+register_scanner(JavaLexer, JavaScanner())
+# The C lexers' get_tokens_unprocessed() only retypes names, so their rules give the same blocks.
+register_scanner(CLexer, SkippingScanner(CLexer, _C_SKIPS))
+register_scanner(CppLexer, SkippingScanner(CppLexer, _C_SKIPS))
+register_scanner(BashLexer, SkippingScanner(BashLexer, _SH_SKIPS))
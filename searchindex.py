@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+searchindex.py – An incrementally maintained inverted index of the converted files of a tree.
+
+Segments are kept apart by kind: "prose" (comments shown as Markdown, Markdown files) and "code".
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+import threading
+
+INDEX_VERSION = 1
+KINDS = ("prose", "code")
+
+_TERM = re.compile(r"\w+")
+
+
+def terms_of(text):
+    return _TERM.findall(text.lower())
+
+
+class SearchIndex:
+    def __init__(self, segmenter, extensions, path=None, refresh_seconds=10, max_file_bytes=None):
+        """
+        segmenter(abs_path, ext) returns the segments of a file as [(kind, first line, text)];
+        extensions are the file extensions to index; files larger than max_file_bytes are skipped.
+        """
+        self.segmenter = segmenter
+        self.extensions = set(extensions)
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.max_file_bytes = max_file_bytes
+        self.base_dir = None
+        self._files = {}  # relative path -> (size, mtime_ns, [(kind, line, text)])
+        self._postings = {}  # term -> {relative path: [segment numbers]}
+        self._lock = threading.Lock()  # guards _files and _postings
+        self._refresh_lock = threading.Lock()  # one refresh at a time
+        self._refreshed = None
+        self._thread = None  # the background refresher (see start)
+        self._target = None  # the base_dir it keeps the index of
+        self._wake = threading.Event()
+        self._stopped = False
+        self.stats = {"refreshes": 0, "converted": 0, "removed": 0, "errors": 0, "seconds": 0.0}
+        if path is not None:
+            self.load()
+
+    # --- Maintenance
+    def refresh(self, base_dir, wait=True):
+        """
+        Brings the index up to date with the files under base_dir (a different base_dir starts a
+        new index). With wait=False, returns at once if another thread is refreshing. Returns True
+        if anything changed.
+        """
+        if not self._refresh_lock.acquire(blocking=wait):
+            return False
+        try:
+            started = time.perf_counter()
+            if base_dir != self.base_dir:
+                with self._lock:
+                    self._files = {}
+                    self._postings = {}
+                    self.base_dir = base_dir
+                    self._refreshed = None
+            with self._lock:
+                known = {rel: entry[:2] for rel, entry in self._files.items()}
+            seen = set()
+            changed = False
+            for rel_path, st in self._iter_files(base_dir):
+                seen.add(rel_path)
+                # Only new and changed files are converted again.
+                if known.get(rel_path) == (st.st_size, st.st_mtime_ns):
+                    continue
+                try:
+                    segments = self.segmenter(os.path.join(base_dir, rel_path), os.path.splitext(rel_path)[1].lower())
+                except Exception as e:
+                    # Binary or unreadable files are left out (and retried when they change).
+                    logging.debug(f"Not indexing {rel_path}: {e}")
+                    self.stats["errors"] += 1
+                    segments = []
+                with self._lock:
+                    self._remove(rel_path)
+                    self._add(rel_path, st.st_size, st.st_mtime_ns, segments)
+                self.stats["converted"] += 1
+                changed = True
+            with self._lock:
+                for rel_path in set(self._files) - seen:
+                    self._remove(rel_path)
+                    self.stats["removed"] += 1
+                    changed = True
+            self._refreshed = time.monotonic()
+            self.stats["refreshes"] += 1
+            self.stats["seconds"] += time.perf_counter() - started
+            if changed and self.path is not None:
+                self.save()
+            return changed
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_if_due(self, base_dir):
+        if base_dir != self.base_dir or self._refreshed is None \
+                or time.monotonic() - self._refreshed >= self.refresh_seconds:
+            # The first refresh of a tree is waited for; later ones are skipped if one is running.
+            self.refresh(base_dir, wait=self._refreshed is None or base_dir != self.base_dir)
+
+    def is_ready(self, base_dir):
+        """
+        Returns True once the index has been brought up to date with base_dir at least once; until
+        then, queries see the files indexed so far.
+        """
+        return self._refreshed is not None and self.base_dir == base_dir
+
+    # --- Background refreshes
+    def start(self, base_dir):
+        """
+        Keeps the index of base_dir up to date in a background thread, refreshed every
+        refresh_seconds, so queries never wait for the tree to be walked or converted. Calling it
+        again with another base_dir switches the thread to that tree.
+        """
+        with self._lock:
+            changed = base_dir != self._target
+            self._target = base_dir
+            self._stopped = False
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+                self._thread.start()
+        if changed:
+            self._wake.set()
+
+    def stop(self):
+        """
+        Stops the background thread after its current refresh.
+        """
+        with self._lock:
+            thread = self._thread
+            self._stopped = True
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    self._thread = None
+                    return
+                base_dir = self._target
+            self._wake.clear()
+            try:
+                self.refresh(base_dir)
+            except Exception:
+                logging.exception(f"Refreshing the search index of {base_dir} failed")
+            self._wake.wait(self.refresh_seconds)
+
+    def _iter_files(self, base_dir):
+        for root, dirs, files in os.walk(base_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in self.extensions:
+                    continue
+                abs_path = os.path.join(root, name)
+                try:
+                    st = os.stat(abs_path)
+                except OSError:
+                    continue
+                if self.max_file_bytes is not None and st.st_size > self.max_file_bytes:
+                    continue
+                yield os.path.relpath(abs_path, base_dir), st
+
+    def _add(self, rel_path, size, mtime_ns, segments):
+        # Caller holds the lock.
+        self._files[rel_path] = (size, mtime_ns, segments)
+        for number, (_, _, text) in enumerate(segments):
+            for term in set(terms_of(text)):
+                self._postings.setdefault(term, {}).setdefault(rel_path, []).append(number)
+
+    def _remove(self, rel_path):
+        # Caller holds the lock.
+        entry = self._files.pop(rel_path, None)
+        if entry is None:
+            return
+        for term in set(term for _, _, text in entry[2] for term in terms_of(text)):
+            paths = self._postings.get(term)
+            if paths is not None:
+                paths.pop(rel_path, None)
+                if not paths:
+                    del self._postings[term]
+
+    # --- Queries
+    def search(self, query, kind=None, limit=100):
+        """
+        Returns up to limit results for the words of query, best first (most matching segments):
+        dicts with "path", "score" (the number of matching segments) and "segments", a list of
+        {"kind", "line", "snippet"} (the first line containing a word). kind ("prose" or "code")
+        restricts the segments searched.
+        """
+        terms = list(dict.fromkeys(terms_of(query)))
+        if not terms:
+            return []
+        matches = []  # (path, segment numbers)
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if not all(postings):
+                return []
+            # Rarest term first, so the intersections start from the smallest set.
+            postings.sort(key=len)
+            for rel_path, numbers in postings[0].items():
+                candidates = set(numbers)
+                for paths in postings[1:]:
+                    candidates.intersection_update(paths.get(rel_path, ()))
+                    if not candidates:
+                        break
+                if kind is not None:
+                    segments = self._files[rel_path][2]
+                    candidates = [number for number in candidates if segments[number][0] == kind]
+                if candidates:
+                    matches.append((rel_path, candidates))
+            matches.sort(key=lambda match: (-len(match[1]), match[0]))
+            # Snippets are only made for the results returned.
+            results = []
+            for rel_path, candidates in matches[:limit]:
+                segments = self._files[rel_path][2]
+                found = []
+                for number in sorted(candidates):
+                    segment_kind, line, text = segments[number]
+                    offset, snippet = _first_matching_line(text, terms)
+                    found.append({"kind": segment_kind, "line": line + offset, "snippet": snippet})
+                results.append({"path": rel_path, "score": len(found), "segments": found})
+        return results
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats, files=len(self._files), terms=len(self._postings))
+        stats["seconds"] = round(stats["seconds"], 3)
+        return stats
+
+    # --- Persistence
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read the search index {self.path}: {e}")
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        with self._lock:
+            self.base_dir = data["base_dir"]
+            for rel_path, (size, mtime_ns, segments) in data["files"].items():
+                self._add(rel_path, size, mtime_ns, [tuple(segment) for segment in segments])
+
+    def save(self):
+        with self._lock:
+            data = {"version": INDEX_VERSION, "base_dir": self.base_dir,
+                    "files": {rel: [size, mtime_ns, segments] for rel, (size, mtime_ns, segments) in self._files.items()}}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Could not save the search index {self.path}: {e}")
+
+
+def _first_matching_line(text, terms):
+    """
+    Returns (line offset in text, line) of the first line of text containing one of terms.
+    """
+    wanted = set(terms)
+    for offset, line in enumerate(text.split("\n")):
+        if wanted.intersection(terms_of(line)):
+            return offset, line.strip()
+    return 0, text.split("\n", 1)[0].strip()
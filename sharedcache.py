@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+sharedcache.py – A size-bounded cache in an SQLite file, shared by all processes on the machine.
+"""
+
+import os
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Seconds a write waits for the other processes' writes.
+BUSY_TIMEOUT = 5.0
+# The last use of an entry is updated at most this often, so hot entries do not turn every read
+# into a write.
+TOUCH_SECONDS = 60
+# Values shorter than this are stored uncompressed.
+COMPRESS_MIN_BYTES = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    compressed INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals (id, bytes) VALUES (0, 0);
+"""
+
+
+# A failing database (locked too long, corrupt, disk full) is logged and treated as a miss: the
+# cache never fails a render.
+class SharedCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection()
+
+    def _connection(self):
+        """
+        Returns this thread's connection, opening it (again, after a fork) if needed.
+        """
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            # WAL: readers never wait for the writer.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def get(self, key):
+        """
+        Returns the bytes stored under key, or None.
+        """
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, compressed, used FROM entries WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            value, compressed, used = row
+            now = int(time.time())
+            if now - used >= TOUCH_SECONDS:
+                connection.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+            value = zlib.decompress(value) if compressed else bytes(value)
+        except (sqlite3.Error, zlib.error) as e:
+            logging.error(f"Shared cache read failed: {e}")
+            self._count("errors")
+            return None
+        self._count("hits")
+        return value
+
+    def put(self, key, value):
+        """
+        Stores the bytes value under key, evicting least recently used entries if the cache
+        grows over max_bytes. Values larger than a quarter of max_bytes are not stored.
+        """
+        compressed = len(value) >= COMPRESS_MIN_BYTES
+        if compressed:
+            # Level 1: most of the gain for a fraction of the time.
+            value = zlib.compress(value, 1)
+        size = len(value) + len(key)
+        if size > self.max_bytes // 4:
+            return
+        try:
+            connection = self._connection()
+            # A short write transaction; it takes the write lock at once instead of upgrading.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                connection.execute("INSERT OR REPLACE INTO entries (key, value, compressed, size, used) "
+                                   "VALUES (?, ?, ?, ?, ?)", (key, value, int(compressed), size, int(time.time())))
+                connection.execute("UPDATE totals SET bytes = bytes + ? WHERE id = 0",
+                                   (size - (row[0] if row else 0),))
+                evicted = self._evict(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logging.error(f"Shared cache write failed: {e}")
+            self._count("errors")
+            return
+        self._count("writes")
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, connection):
+        # Inside the write transaction. Returns the number of evicted entries. Least recently used
+        # entries go until the total is below 90% of max_bytes, so eviction is not run on every write.
+        (total,) = connection.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()
+        if total <= self.max_bytes:
+            return 0
+        target = total - self.max_bytes * 9 // 10
+        keys = []
+        freed = 0
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY used"):
+            keys.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+        connection.execute("UPDATE totals SET bytes = bytes - ? WHERE id = 0", (freed,))
+        return len(keys)
+
+    def clear(self):
+        """
+        Deletes all entries (for every process using the file).
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM entries")
+        connection.execute("UPDATE totals SET bytes = 0 WHERE id = 0")
+        connection.execute("COMMIT")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        try:
+            connection = self._connection()
+            (stats["entries"],) = connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+            (stats["bytes"],) = connection.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Shared cache statistics failed: {e}")
+        stats["max_bytes"] = self.max_bytes
+        return stats
@@ -11,44 +11,305 @@ Methods provided:
   - list_supported_extensions(): returns a sorted list of supported extensions.
   - get_languages_by_extension(extension): returns the list of language names for the extension.
   - get_extensions_by_language(language): returns the list of extensions for the given language name.
+  - get_languages_by_filename(filename): like get_languages_by_extension, but also matches other
+    filename patterns (e.g. "Makefile", "*.cmake.in").
+  - get_lexer_class(name): returns the lexer class for a language name or alias.
+  - get_fence_name(language): returns the Markdown fence name (the lexer's first alias).
+  - get_comment_syntax(name): returns the comment syntax of a language (see derive_comment_syntax).
+
+Index:
+  The mappings load from an index file built ahead of time with "python shtype.py --build-index [DIR]";
+  without a current one they are built in memory, and the file is never written on first use.
 
 Note:
-  File patterns that do not follow the form "*.ext" are ignored.
+  File patterns that do not follow the form "*.ext" are ignored by the extension mappings.
   The language name used is the lexer's long name.
 """
 
+import os
 import re
-from pygments.lexers import get_all_lexers
+import sys
+import json
+import fnmatch
+import tempfile
+
+import pygments
+
+# Querying Pygments for all lexers is slow; the index file holds the mappings and the comment syntax
+# of every language. It lives in this module's __pycache__ directory, or $SHTYPE_INDEX_DIR.
+INDEX_FORMAT = 3
+INDEX_DIR = os.environ.get("SHTYPE_INDEX_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+
+def index_path(index_dir=None):
+    """
+    Returns the path of the index file for the installed Pygments version.
+    """
+    return os.path.join(index_dir or INDEX_DIR, f"shtype-index-pygments-{pygments.__version__}.json")
+
+def build_index():
+    """
+    Queries Pygments (including plugin lexers) and returns the index as a dict with keys:
+      - "format", "pygments": index format and Pygments version
+      - "extensions": extension -> sorted language names (from "*.ext" patterns)
+      - "languages": language name -> sorted extensions
+      - "patterns": other filename pattern -> sorted language names
+      - "aliases": lowercase alias -> language name
+      - "names": the language names
+      - "fences": language name -> Markdown fence name (the first alias)
+      - "comments": language name -> comment syntax (empty here, see add_comment_syntax)
+    """
+    from pygments.lexers import get_all_lexers
+
+    ext_to_lang, lang_to_ext, patterns = {}, {}, {}
+    index = {"format": INDEX_FORMAT, "pygments": pygments.__version__,
+             "aliases": {}, "names": [], "fences": {}, "comments": {}}
+    for language_name, aliases, filenames, _ in get_all_lexers(plugins=True):
+        index["names"].append(language_name)
+        if aliases:
+            index["fences"][language_name] = aliases[0]
+        for alias in aliases:
+            index["aliases"].setdefault(alias.lower(), language_name)
+        for pattern in filenames:
+            # Only consider patterns like "*.ext" for the extension mappings.
+            m = re.match(r"\*\.(\w+)$", pattern)
+            if m:
+                ext = "." + m.group(1)
+                ext_to_lang.setdefault(ext, set()).add(language_name)
+                lang_to_ext.setdefault(language_name, set()).add(ext)
+            else:
+                patterns.setdefault(pattern, set()).add(language_name)
+    index["extensions"] = {ext: sorted(langs) for ext, langs in ext_to_lang.items()}
+    index["languages"] = {lang: sorted(exts) for lang, exts in lang_to_ext.items()}
+    index["patterns"] = {pattern: sorted(langs) for pattern, langs in patterns.items()}
+    return index
+
+def _comment_kind(token_type):
+    """
+    Returns the comment syntax key of a lexer rule's token type (see derive_comment_syntax), or None;
+    "comment" for a plain Comment, whose rule decides whether it is a line or a block comment.
+    """
+    from pygments.token import Comment, String
+    if token_type in Comment.Hashbang:
+        return "hashbang"
+    if token_type in Comment.Preproc or token_type in Comment.Special:
+        return None
+    if token_type in Comment.Single:
+        return "line"
+    if token_type in Comment.Multiline:
+        return "block"
+    if token_type is Comment:
+        return "comment"
+    if token_type in String.Doc:
+        return "doc"
+    return None
+
+def _closing_literal(tokens, state):
+    """
+    Returns the literal of the comment rule which leaves state (a comment state a block comment's
+    opener enters, e.g. "*/" in SQL's "multiline-comments"), or "".
+    """
+    from readblocks import _literal_affix, sre_parse
+    if not isinstance(state, tuple) or len(state) != 1:
+        return ""
+    for pattern, action, new_state in tokens.get(state[0], ()):
+        if new_state == "#pop" and _comment_kind(action) in ("block", "comment", "doc"):
+            literal, complete = _literal_affix(sre_parse.parse(pattern.pattern, pattern.flags), False)
+            if complete:
+                return literal
+    return ""
+
+def _lexer_rules(lexer_class):
+    """
+    Returns {state: [(compiled pattern, action, new state), ...]} of a RegexLexer class, from its
+    token definitions (tokens, with those inherited) with the included states expanded. A new state naming one
+    state is a 1-tuple (as RegexLexer keeps it); "#pop" and the like are kept as written.
+    """
+    from pygments.lexer import Future, default, include
+
+    definitions = lexer_class.tokens
+    if definitions and all(isinstance(rules, dict) for rules in definitions.values()):
+        # Definitions per variant of the lexer (e.g. C#'s Unicode levels): the first one.
+        definitions = next(iter(definitions.values()))
+    else:
+        definitions = lexer_class.get_tokendefs()
+
+    def expand(state, seen):
+        for rule in definitions.get(state, ()):
+            if isinstance(rule, include):
+                if rule not in seen:
+                    seen.add(rule)
+                    yield from expand(rule, seen)
+            elif isinstance(rule, tuple) and not isinstance(rule, default):
+                regex, action = rule[0], rule[1]
+                new_state = rule[2] if len(rule) > 2 else None
+                if isinstance(new_state, str) and not new_state.startswith("#"):
+                    new_state = (new_state,)
+                try:
+                    pattern = re.compile(regex.get() if isinstance(regex, Future) else regex, lexer_class.flags)
+                except (re.error, TypeError):
+                    continue
+                yield pattern, action, new_state
+
+    return {state: list(expand(state, {state})) for state in definitions}
+
+class _GroupProbe:
+    """
+    Stands for a match of a rule when calling its callback (e.g. bygroups()): group n is at offset
+    n, so the tokens yielded tell the token type of each group.
+    """
+    def group(self, n=0):
+        return " "
+
+    def start(self, n=0):
+        return n
+
+    def end(self, n=0):
+        return n + 1
+
+def _comment_rule_parts(action, pattern, lexer):
+    """
+    Yields (token type, parsed pattern items) of a lexer rule: the whole pattern for a token type,
+    and each group for bygroups() (e.g. Java's (//.*?)(\\n)).
+    """
+    from pygments.token import _TokenType
+    from readblocks import sre_parse
+    if isinstance(action, _TokenType):
+        yield action, sre_parse.parse(pattern.pattern, pattern.flags)
+    elif callable(action) and pattern.groups:
+        group_types = {}
+        try:
+            for position, token_type, _ in action(lexer, _GroupProbe()):
+                if isinstance(token_type, _TokenType):
+                    group_types.setdefault(position, token_type)
+        except Exception:
+            # Callbacks which need a real match (e.g. named groups, lexing the text).
+            pass
+        for op, av in sre_parse.parse(pattern.pattern, pattern.flags):
+            if op is sre_parse.SUBPATTERN and av[0] in group_types:
+                yield group_types[av[0]], av[3]
+
+def derive_comment_syntax(lexer_class):
+    """
+    Derives the comment syntax of a language from the rules of its lexer (a RegexLexer): the literal
+    text its comment rules' matches start and end with. Returns a dict with sorted lists:
+      - "line": line comment markers, from Comment.Single (e.g. "#", "//")
+      - "block": [opener, closer] of block comments, from Comment.Multiline (e.g. ["/*", "*/"])
+      - "doc": doc comment prefixes, from String.Doc rules starting with a comment marker (e.g.
+        Rust's "///" and "/**")
+      - "continuation": the prefix of the inner lines of block comments (e.g. "*" for /* */)
+      - "hashbang": from Comment.Hashbang (e.g. "#!")
+    A plain Comment rule is a block comment if it can span lines (or enters a comment state), else
+    a line comment. Comment.Preproc (C's "#include") and Comment.Special rules are not comments
+    here. Rules without a literal start (e.g. [;#].*), and with letters in it if the rule matches
+    case-insensitively, are left out.
+    """
+    from pygments.lexer import RegexLexer
+    from readblocks import _literal_affix, _can_match_newline
+
+    found = {"line": set(), "block": set(), "doc": set(), "continuation": set(), "hashbang": set()}
+    tokens = lexer = None
+    if lexer_class is not None and issubclass(lexer_class, RegexLexer):
+        try:
+            tokens = _lexer_rules(lexer_class)
+            lexer = lexer_class()
+        except Exception:
+            tokens = None
+    for rules in (tokens or {}).values():
+        for pattern, action, new_state in rules:
+            for token_type, items in _comment_rule_parts(action, pattern, lexer):
+                kind = _comment_kind(token_type)
+                if kind is None:
+                    continue
+                opener, complete = _literal_affix(items, False, skip_optional=True)
+                if not opener or opener != opener.strip() \
+                        or (pattern.flags & re.IGNORECASE and opener.lower() != opener.upper()):
+                    continue
+                if kind == "comment":
+                    # Plain Comment: a block comment if it can span lines, or enters a comment state.
+                    kind = "block" if complete or isinstance(new_state, tuple) \
+                        or _can_match_newline(items, items.state.flags) else "line"
+                if kind == "block":
+                    closer = _closing_literal(tokens, new_state) or ("" if complete else _literal_affix(items, True)[0])
+                    if len(closer) >= 2 and closer == closer.strip() and closer != opener:
+                        found["block"].add((opener, closer))
+                else:
+                    found[kind].add(opener)
+    markers = found["line"] | {opener for opener, _ in found["block"]}
+    found["doc"] = {prefix for prefix in found["doc"]
+                    if any(prefix != marker and prefix.startswith(marker) for marker in markers)}
+    if any(closer.startswith("*") for _, closer in found["block"]):
+        # The inner lines of /* ... */ and (* ... *) comments usually start with " * ".
+        found["continuation"].add("*")
+    return {key: sorted(list(item) if key == "block" else item for item in values)
+            for key, values in found.items()}
+
+def add_comment_syntax(index):
+    """
+    Derives the comment syntax of every language of the index which is not in it yet.
+    """
+    shtype = Shtype()
+    shtype._index = index
+    for language in index["names"]:
+        shtype.get_comment_syntax(language)
+    return index
+
+def write_index(index, path):
+    """
+    Writes the index compactly and atomically (temporary file + rename).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), sort_keys=True)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+def load_index(path=None):
+    """
+    Returns the index for the installed Pygments version: read from path (default: index_path()),
+    or built in memory when missing or stale (see --build-index).
+    """
+    path = path or index_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("format") == INDEX_FORMAT and index.get("pygments") == pygments.__version__:
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_index()
 
 class Shtype:
-    def __init__(self):
-        # Mappings:
-        #   ext_to_lang: key = file extension (with dot, e.g. ".py"), value = set of language names
-        #   lang_to_ext: key = language name, value = set of file extensions
-        self.ext_to_lang = {}
-        self.lang_to_ext = {}
-        self._build_mappings()
-
-    def _build_mappings(self):
-        """
-        Iterate over all lexers from Pygments and build two mappings:
-          - From extension to language names.
-          - From language names to file extensions.
-        Only patterns matching the glob format "*.ext" are considered.
-        """
-        for longname, aliases, filenames, mimetypes in get_all_lexers():
-            language_name = longname  # Use the long language name.
-            if filenames:
-                for pattern in filenames:
-                    # Only consider patterns like "*.ext"
-                    m = re.match(r"\*\.(\w+)$", pattern)
-                    if m:
-                        ext = "." + m.group(1)
-                        self.ext_to_lang.setdefault(ext, set()).add(language_name)
-                        self.lang_to_ext.setdefault(language_name, set()).add(ext)
-        # Convert sets to sorted lists
-        self.ext_to_lang = {ext: sorted(langs) for ext, langs in self.ext_to_lang.items()}
-        self.lang_to_ext = {lang: sorted(exts) for lang, exts in self.lang_to_ext.items()}
+    def __init__(self, index_path=None):
+        # Mappings (loaded lazily from the index, see load_index):
+        #   ext_to_lang: key = file extension (with dot, e.g. ".py"), value = list of language names
+        #   lang_to_ext: key = language name, value = list of file extensions
+        self.index_path = index_path
+        self._index = None
+        self._names = None
+        self._lexer_classes = {}
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = load_index(self.index_path)
+        return self._index
+
+    def _language(self, name):
+        """
+        Returns the language name of a language name or alias, or None if it is unknown.
+        """
+        if self._names is None:
+            self._names = frozenset(self.index["names"])
+        return name if name in self._names else self.index["aliases"].get(name.lower())
+
+    @property
+    def ext_to_lang(self):
+        return self.index["extensions"]
+
+    @property
+    def lang_to_ext(self):
+        return self.index["languages"]
 
     def is_supported_extension(self, extension):
         """
@@ -77,8 +338,67 @@ class Shtype:
         """
         return self.lang_to_ext.get(language, [])
 
-# If run as a stand-alone script, print out some sample mappings.
+    def get_languages_by_filename(self, filename):
+        """
+        Returns a sorted list of language names for a file name (without directory): those of its
+        extension, plus those whose other filename patterns match (e.g. "Makefile", "*.cmake.in").
+        """
+        languages = set(self.get_languages_by_extension(os.path.splitext(filename)[1]))
+        for pattern, langs in self.index["patterns"].items():
+            if fnmatch.fnmatchcase(filename, pattern):
+                languages.update(langs)
+        return sorted(languages)
+
+    def get_lexer_class(self, name):
+        """
+        Returns the lexer class for a language name (e.g. "Python") or alias (e.g. "py", case-insensitive),
+        importing only its module. Returns None if the name is unknown.
+        """
+        from pygments.lexers import find_lexer_class
+
+        language = self._language(name)
+        if language is None:
+            return None
+        cls = self._lexer_classes.get(language)
+        if cls is None:
+            cls = self._lexer_classes[language] = find_lexer_class(language)
+        return cls
+
+    def get_fence_name(self, language):
+        """
+        Returns the name to use after a Markdown code fence for a language name (the lexer's first
+        alias, e.g. "Python" -> "python"), or None if the language has no aliases.
+        """
+        return self.index["fences"].get(language)
+
+    def get_comment_syntax(self, name):
+        """
+        Returns the comment syntax of a language name or alias (see derive_comment_syntax), or None
+        if the name is unknown. Taken from the index, or derived on first use and kept in memory.
+        """
+        language = self._language(name)
+        if language is None:
+            return None
+        comments = self.index["comments"]
+        syntax = comments.get(language)
+        if syntax is None:
+            try:
+                lexer_class = self.get_lexer_class(language)
+            except Exception:
+                # Plugin lexers which are gone, or modules failing to import.
+                lexer_class = None
+            syntax = comments[language] = derive_comment_syntax(lexer_class)
+        return syntax
+
+# If run as a stand-alone script, print out some sample mappings
+# (or, with --build-index [DIR], generate the index file).
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["--build-index"]:
+        path = index_path(sys.argv[2] if len(sys.argv) > 2 else None)
+        write_index(add_comment_syntax(build_index()), path)
+        print(f"Wrote {path}")
+        sys.exit(0)
+
     shtype = Shtype()
     print("Supported Extensions:")
     for ext in shtype.list_supported_extensions():
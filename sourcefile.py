@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+sourcefile.py – Size-aware reading of viewed files: binary detection, memory-mapped reading and
+paging through huge files by line.
+"""
+
+import os
+import mmap
+import codecs
+import hashlib
+import threading
+from array import array
+from contextlib import contextmanager
+from collections import OrderedDict
+
+SNIFF_BYTES = 8192
+LINE_INDEX_STEP = 1000
+LINE_INDEX_CACHE_SIZE = 16
+# Bytes counted / decoded per step when indexing or reading a mapped file.
+CHUNK_BYTES = 16 * 1024 * 1024
+DECODE_CHUNK_BYTES = 256 * 1024
+# Sub-blocks of a chunk searched for a line index entry; keeps the per-line work in C.
+_BLOCK_BYTES = 4096
+
+
+class BinaryFileError(ValueError):
+    """Raised for files that do not look like UTF-8 text (see looks_binary)."""
+
+
+def looks_binary(prefix):
+    """
+    Returns True if prefix (the first bytes of a file) contains a NUL byte or is not valid UTF-8
+    (a multi-byte character cut off at the end of the prefix is fine).
+    """
+    if b"\0" in prefix:
+        return True
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def is_binary_file(path):
+    with open(path, "rb") as f:
+        return looks_binary(f.read(SNIFF_BYTES))
+
+
+@contextmanager
+def mapped(path):
+    """
+    Yields a read-only memory mapping of the file (b"" for an empty file, which cannot be mapped).
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def read_digest_and_text(path):
+    """
+    Returns (hex SHA-256 digest, text) of the file, read through a memory mapping. Raises
+    BinaryFileError if the file looks binary.
+    """
+    # Both are computed straight from the mapping, so the raw bytes are never copied into the
+    # process. Invalid UTF-8 after the sniffed prefix is replaced rather than failing the request.
+    with mapped(path) as data:
+        if looks_binary(data[:SNIFF_BYTES]):
+            raise BinaryFileError(path)
+        return hashlib.sha256(data).hexdigest(), str(data, "utf-8", "replace")
+
+
+def read_text(path):
+    """
+    Returns the text of the file, decoded from a memory mapping (invalid UTF-8 is replaced).
+    """
+    with mapped(path) as data:
+        return str(data, "utf-8", "replace")
+
+
+class LineIndex:
+    """
+    Byte offsets of the lines 1, 1 + step, 1 + 2 * step, ... of a file, and its line count (a last
+    line without a trailing newline counts; an empty file has 0 lines).
+    """
+    # Built with one pass of bytes.count / bytes.find over the mapping; a page of lines is then one
+    # lookup and a scan of at most step lines instead of a scan from the start of the file.
+
+    def __init__(self, data, step=LINE_INDEX_STEP):
+        self.step = step
+        self.size = len(data)
+        self.offsets = array("Q", [0])
+        newlines = 0  # before the current block
+        wanted = step  # newlines before the next indexed line
+        for base in range(0, self.size, CHUNK_BYTES):
+            chunk = data[base:base + CHUNK_BYTES]
+            count = chunk.count(b"\n")
+            if newlines + count < wanted:
+                newlines += count
+                continue
+            for start in range(0, len(chunk), _BLOCK_BYTES):
+                end = start + _BLOCK_BYTES
+                count = chunk.count(b"\n", start, end)
+                while newlines + count >= wanted:
+                    position = start
+                    for _ in range(wanted - newlines):
+                        position = chunk.find(b"\n", position, end) + 1
+                    self.offsets.append(base + position)
+                    count -= wanted - newlines
+                    newlines = wanted
+                    start = position
+                    wanted += step
+                newlines += count
+        self.newlines = newlines
+        ends_with_newline = self.size > 0 and data[self.size - 1:self.size] == b"\n"
+        self.line_count = newlines + (self.size > 0 and not ends_with_newline)
+
+    def offset(self, data, line):
+        """
+        Returns the byte offset where line (1-based) starts in data, the file's mapping (its size
+        for lines after the last one).
+        """
+        if line > self.newlines + 1:
+            return self.size
+        entry = (line - 1) // self.step
+        position = self.offsets[entry]
+        for _ in range(line - 1 - entry * self.step):
+            position = data.find(b"\n", position) + 1
+        return position
+
+
+# The indexes of recently paged files (LRU), validated by size and mtime.
+_line_indexes = OrderedDict()  # path -> (size, mtime_ns, LineIndex)
+_line_indexes_lock = threading.Lock()
+
+
+def line_index(path, st):
+    """
+    Returns the LineIndex of the file, whose os.stat result is st, from the cache if it is still
+    valid for the file's size and mtime.
+    """
+    key = (st.st_size, st.st_mtime_ns)
+    with _line_indexes_lock:
+        cached = _line_indexes.get(path)
+        if cached is not None and cached[:2] == key:
+            _line_indexes.move_to_end(path)
+            return cached[2]
+    with mapped(path) as data:
+        index = LineIndex(data)
+    with _line_indexes_lock:
+        _line_indexes[path] = key + (index,)
+        _line_indexes.move_to_end(path)
+        while len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+            _line_indexes.popitem(last=False)
+    return index
+
+
+def read_lines(path, index, first, count, max_bytes):
+    """
+    Returns (text, lines, truncated): the text of lines first..first+count-1 of the file (index is
+    its LineIndex) and the number of lines in it. If the lines take more than max_bytes, only the
+    complete lines within max_bytes are returned (truncated is True); if not even the first line
+    fits, its first max_bytes are returned as one line.
+    """
+    with mapped(path) as data:
+        start = index.offset(data, first)
+        end = index.offset(data, first + count)
+        truncated = end - start > max_bytes
+        if truncated:
+            end = start + max_bytes
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        pieces = [decoder.decode(data[position:min(position + DECODE_CHUNK_BYTES, end)])
+                  for position in range(start, end, DECODE_CHUNK_BYTES)]
+        if not truncated:
+            pieces.append(decoder.decode(b"", final=True))
+    text = "".join(pieces)
+    if truncated:
+        cut = text.rfind("\n")
+        if cut != -1:
+            text = text[:cut + 1]
+    lines = text.count("\n")
+    if text and not text.endswith("\n"):
+        lines += 1
+    return text, lines, truncated
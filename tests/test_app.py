@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+
+import app as webapp
+
+logging.disable(logging.DEBUG)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, "BASE_DIR", str(tmp_path))
+    return webapp.app.test_client()
+
+
+def test_search_escapes_unknown_kind(client):
+    response = client.get("/search?q=x&in=<script>alert(1)</script>")
+    assert response.status_code == 400
+    assert b"<script>" not in response.data
+    assert b"&lt;script&gt;" in response.data
+
+
+def test_bundle_escapes_missing_directory(client):
+    response = client.get("/bundle/<script>alert(1)</script>")
+    assert response.status_code == 404
+    assert b"<script>" not in response.data
+
+
+def test_streamed_page_matches_buffered_page():
+    content = "".join(f'# Request {n}\n# __NOTE__: cached\nlog("request", {n})  # inline\n\n' for n in range(200))
+    buffered = webapp.render_page("big.py", webapp.markdown_to_html(webapp.generate_markdown(content, ".py")), "/")
+    assert "".join(webapp.iter_page_stream(None, ".py", content, "big.py", "/")) == buffered
+
+
+def test_view_stays_in_base_dir(client, tmp_path):
+    outside = tmp_path.parent / f"{tmp_path.name}-outside.txt"
+    outside.write_text("secret\n")
+    response = client.get(f"/view/../{outside.name}")
+    assert response.status_code == 404
+    assert b"secret" not in response.data
+
+
+class RecordingWarmer:
+    def __init__(self):
+        self.live = self.started = 0
+
+    def request_started(self):
+        self.live += 1
+        self.started += 1
+
+    def request_finished(self):
+        self.live -= 1
+
+
+def test_only_live_requests_pause_warmup(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, "warmer", RecordingWarmer())
+    (tmp_path / "m.py").write_text("# Module.\nx = 1\n")
+    assert webapp.warm_path("m.py") == "warmed"
+    assert (webapp.warmer.started, webapp.warmer.live) == (0, 0)
+    assert client.get("/view/m.py").status_code == 200
+    assert (webapp.warmer.started, webapp.warmer.live) == (1, 0)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+import pytest
+
+import app as webapp
+import asgi
+from warmup import AccessStats
+
+logging.disable(logging.DEBUG)
+
+
+def run_request(method, path, query=b""):
+    scope = {"type": "http", "method": method, "path": path, "query_string": query, "headers": [],
+             "http_version": "1.1", "scheme": "http", "server": ("localhost", 80), "root_path": ""}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    return messages
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for i in range(3):
+        (tmp_path / f"m{i}.py").write_text(f"# Module {i}.\n\nx = {i}\n" * 50)
+    monkeypatch.setattr(webapp, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(webapp, "STREAM_CHUNK_BYTES", 1)
+    return tmp_path
+
+
+def test_flask_responses_are_streamed(tree):
+    messages = run_request("GET", "/bundle/")
+    assert messages[0]["type"] == "http.response.start" and messages[0]["status"] == 200
+    bodies = messages[1:]
+    assert len(bodies) > 2
+    assert all(message["more_body"] for message in bodies[:-1])
+    assert not bodies[-1].get("more_body", False)
+    page = b"".join(message["body"] for message in bodies)
+    assert b"Module 2" in page
+
+
+def test_head_has_no_body(tree):
+    messages = run_request("HEAD", "/bundle/")
+    assert messages[0]["status"] == 200
+    assert b"".join(message.get("body", b"") for message in messages[1:]) == b""
+    assert not messages[-1].get("more_body", False)
+
+
+@pytest.mark.parametrize("path", ["/view//{outside}", "/view/../{name}", "/view/sub/../../{name}"])
+def test_view_stays_in_base_dir(tree, path):
+    outside = tree.parent / f"{tree.name}-outside.txt"
+    outside.write_text("secret\n")
+    (tree / "sub").mkdir()
+    messages = run_request("GET", path.format(outside=str(outside).lstrip("/"), name=outside.name))
+    assert messages[0]["status"] == 404
+    assert b"secret" not in b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_view_follows_no_symlink_out_of_base_dir(tree):
+    outside = tree.parent / f"{tree.name}-outside.txt"
+    outside.write_text("secret\n")
+    (tree / "link.txt").symlink_to(outside)
+    assert run_request("GET", "/view/link.txt")[0]["status"] == 404
+
+
+class RecordingWarmer:
+    def __init__(self):
+        self.live = self.started = 0
+
+    def request_started(self):
+        self.live += 1
+        self.started += 1
+
+    def request_finished(self):
+        self.live -= 1
+
+
+@pytest.mark.parametrize("streamed", [False, True], ids=["rendered", "streamed"])
+def test_view_is_counted_and_pauses_warmup(tree, monkeypatch, streamed):
+    monkeypatch.setattr(webapp, "access_stats", AccessStats())
+    monkeypatch.setattr(webapp, "warmer", RecordingWarmer())
+    if streamed:
+        monkeypatch.setattr(webapp, "STREAM_THRESHOLD_BYTES", 1)
+    else:
+        # Rendered in this process, without starting a process pool.
+        monkeypatch.setattr(webapp.hook_pipeline, "is_portable", lambda: False)
+    assert run_request("GET", "/view/m1.py")[0]["status"] == 200
+    assert webapp.access_stats.most_common(10) == ["m1.py"]
+    assert webapp.warmer.started >= 1 and webapp.warmer.live == 0
+
+
+def test_large_files_are_streamed(tree, monkeypatch):
+    monkeypatch.setattr(webapp, "STREAM_THRESHOLD_BYTES", 1)
+    messages = run_request("GET", "/view/m2.py")
+    assert messages[0]["status"] == 200
+    bodies = messages[1:]
+    assert len(bodies) > 2 and all(message["more_body"] for message in bodies[:-1])
+    page = b"".join(message["body"] for message in bodies).decode("utf-8")
+    assert page == "".join(webapp.iter_page_stream(None, ".py", (tree / "m2.py").read_text(), "m2.py", "/browse/"))
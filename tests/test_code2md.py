@@ -0,0 +1,58 @@
+import random
+
+from code2md import LineToken, MarkdownGenerator, convert_tree, resolve_language
+
+
+class FakeShtype:
+    def __init__(self, mapping):
+        self.mapping = mapping
+
+    def get_languages_by_extension(self, extension):
+        return self.mapping.get(extension, [])
+
+
+def test_resolve_language_follows_each_shtype():
+    assert resolve_language(".x", FakeShtype({".x": ["Python"]})) == "Python"
+    assert resolve_language(".x", FakeShtype({".x": ["No such language", "C"]})) == "C"
+    assert resolve_language(".x", FakeShtype({})) is None
+
+
+def reference_classify_modes(tokens):
+    # The former propagation: from every code token, walk up and down through the comment tokens.
+    for tok in tokens:
+        tok.mode = "code" if tok.token_type == "code" else "markdown"
+    for i, tok in enumerate(tokens):
+        if tok.mode == "code":
+            j = i - 1
+            while j >= 0 and tokens[j].token_type == "comment":
+                tokens[j].mode = "code"
+                j -= 1
+            k = i + 1
+            while k < len(tokens) and tokens[k].token_type == "comment":
+                tokens[k].mode = "code"
+                k += 1
+    return tokens
+
+
+def test_classify_modes_matches_walking_from_each_code_token():
+    rng = random.Random(1234)
+    for _ in range(2000):
+        types = [rng.choice(("code", "comment", "comment", "whitespace")) for _ in range(rng.randint(0, 60))]
+        tokens = [LineToken(t, t, i + 1, 1) for i, t in enumerate(types)]
+        modes = [t.mode for t in MarkdownGenerator("", "python").classify_modes(tokens)]
+        tokens = [LineToken(t, t, i + 1, 1) for i, t in enumerate(types)]
+        assert modes == [t.mode for t in reference_classify_modes(tokens)], types
+
+
+def test_batch_removes_outputs_of_deleted_sources(tmp_path):
+    source, output = tmp_path / "src", tmp_path / "out"
+    (source / "pkg").mkdir(parents=True)
+    (source / "a.py").write_text("# A.\nx = 1\n")
+    (source / "pkg" / "b.py").write_text("# B.\ny = 2\n")
+    assert convert_tree(str(source), str(output), html=True, workers=1, log=None)["converted"] == 2
+    assert (output / "pkg" / "b.py.md").exists() and (output / "pkg" / "b.py.html").exists()
+    (source / "pkg" / "b.py").unlink()
+    stats = convert_tree(str(source), str(output), workers=1, log=None)
+    assert (stats["skipped"], stats["removed"]) == (1, 1)
+    assert not (output / "pkg").exists()
+    assert (output / "a.py.md").exists()
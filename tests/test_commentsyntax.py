@@ -0,0 +1,24 @@
+import os
+
+import commentsyntax
+from code2md import MarkdownGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_python_markdown_is_unchanged_by_its_syntax():
+    with open(os.path.join(ROOT, "code2md.py"), encoding="utf-8") as f:
+        code = f.read()
+    md_gen = MarkdownGenerator(code, "python")
+    current = md_gen.generate_markdown()
+    md_gen = MarkdownGenerator(code, "python")
+    md_gen.comments = commentsyntax.DEFAULT
+    assert current == md_gen.generate_markdown()
+
+
+def test_marker_is_the_longest_matching_start():
+    syntax = commentsyntax.for_language("c")
+    starts = syntax.line + tuple(opener for opener, _ in syntax.block) + syntax.closers + syntax.continuation
+    for line in ("// a", "/* b", "/** c", "*/", " * d", "* e", "x // f", "/", ""):
+        matching = [marker for marker in starts if line.startswith(marker)]
+        assert syntax.marker(line) == (max(matching, key=len) if matching else None), line
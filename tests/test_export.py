@@ -0,0 +1,32 @@
+import logging
+import re
+
+import app as webapp
+import export
+
+
+def test_paged_views_link_to_exported_pages(tmp_path, monkeypatch):
+    base_dir, output_dir = tmp_path / "tree", tmp_path / "site"
+    base_dir.mkdir()
+    monkeypatch.setattr(webapp, "BASE_DIR", str(base_dir))
+    monkeypatch.setattr(webapp, "LISTING_PAGE_SIZE", webapp.LISTING_PAGE_SIZE)
+    monkeypatch.setattr(webapp, "MAX_RENDER_BYTES", 10)
+    monkeypatch.setattr(webapp, "VIEW_PAGE_LINES", 3)
+    export.init_worker(str(base_dir))
+    logging.disable(logging.DEBUG)
+    big = base_dir / "big.py"
+    out_path = export.page_path(str(output_dir), "view", "big.py")
+
+    big.write_text("".join(f"x{n} = {n}\n" for n in range(1, 11)))
+    assert export.export_file(("big.py", out_path, None))[1] == "rendered"
+    pages = {path.name: path.read_text() for path in (output_dir / "view" / "big.py").iterdir()}
+    assert set(pages) == {"index.html", "lines-4.html", "lines-7.html", "lines-10.html"}
+    for name, page in pages.items():
+        assert "?line=" not in page
+        for link in re.findall(r'href="/view/big\.py/([^"]*)"', page):
+            assert (link or "index.html") in pages
+    assert "x4" in pages["lines-4.html"] and "x3" not in pages["lines-4.html"]
+
+    big.write_text("".join(f"y{n} = {n}\n" for n in range(1, 6)))
+    assert export.export_file(("big.py", out_path, None))[1] == "rendered"
+    assert {path.name for path in (output_dir / "view" / "big.py").iterdir()} == {"index.html", "lines-4.html"}
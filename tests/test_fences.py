@@ -0,0 +1,42 @@
+import re
+import html
+
+import mistune
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+import commentsyntax
+import fences
+import readblocks
+
+
+def test_lexer_lookups_are_shared_and_bounded():
+    assert fences.get_lexer("python") is readblocks.find_lexer("python", False)
+    assert readblocks.get_lexer("python") is readblocks.find_lexer("python")
+    assert fences.get_lexer("no-such-language") is None
+    assert fences.fence_language("no-such-language x") is None
+    assert readblocks.find_lexer.cache_info().maxsize == readblocks.LEXER_CACHE_SIZE
+    assert commentsyntax.for_language.cache_info().maxsize == commentsyntax.SYNTAX_CACHE_SIZE
+
+
+def test_unknown_fence_language_renders_plain():
+    html = fences.markdown_to_html("```no-such-language\n<x>\n```\n")
+    assert "pygments" not in html and "&lt;x&gt;" in html
+
+
+def test_memoized_fences_match_highlighting_each_fence():
+    snippets = {"python": "def f(a):\n    # c\n    return a < 1\n", "c": "int f(void) { /* c */ return 1; }\n"}
+    document = "\n".join(f"Text {n}\n\n```{language}\n{code}```\n" for n in range(3)
+                         for language, code in sorted(snippets.items()))
+
+    def highlighted(m):
+        lexer = get_lexer_by_name(m.group(1), stripnl=False)
+        code = highlight(html.unescape(m.group(2)), lexer, HtmlFormatter(nowrap=True))
+        return f'<pre class="{fences.CSS_CLASS}"><code class="language-{m.group(1)}">{code}</code></pre>'
+
+    expected = re.sub(r'<pre><code class="language-(\w+)">(.*?)</code></pre>', highlighted,
+                      mistune.markdown(document, escape=False), flags=re.S)
+    fences.fence_cache.clear()
+    assert fences.markdown_to_html(document) == expected
+    assert fences.markdown_to_html(document) == expected
@@ -0,0 +1,54 @@
+import glob
+import os
+import re
+
+import pytest
+
+from code2md import MarkdownGenerator
+from highlighter import Task3Highlighter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPAN = '<span class="highlight">__X__:</span>'
+
+# CommonMark fences the former regex got wrong, and comment markers per fence language.
+FENCE_CASES = [
+    ("~~~\n# __X__:\n~~~\n", f"~~~\n# {SPAN}\n~~~\n"),
+    ("````md\n```\n# __X__:\n```\n````\n", f"````md\n```\n# {SPAN}\n```\n````\n"),
+    ("   ```\n# __X__:\n   ```  \n# __X__:\n", f"   ```\n# {SPAN}\n   ```  \n# __X__:\n"),
+    ("    ```\n# __X__:\n    ```\n", "    ```\n# __X__:\n    ```\n"),
+    ("```c++\n# __X__:\n// __X__:\n```\n", f"```c++\n# __X__:\n// {SPAN}\n```\n"),
+    ("```unknown\n# __X__:\n```\n", f"```unknown\n# {SPAN}\n```\n"),
+    ("``` a`b\n# __X__:\n```\n", "``` a`b\n# __X__:\n```\n"),
+    ("~~~\n# __X__:\n```\n# __X__:\n", f"~~~\n# {SPAN}\n```\n# {SPAN}\n"),
+    ("text ```\n# __X__:\n```\n", "text ```\n# __X__:\n```\n"),
+    ("```\n#!x __X__:\nx # __X__:\n  # __X__: __Y__:\n```",
+     f"```\n#!x __X__:\nx # __X__:\n  # {SPAN} <span class=\"highlight\">__Y__:</span>\n```"),
+]
+
+
+def reference_process(markdown_text):
+    # The former Task3Highlighter.process(), right for plain ``` fences.
+    def process_line(line):
+        stripped = line.lstrip()
+        if stripped.startswith("#") and not stripped.startswith("#!"):
+            return re.sub(r'__(\w+)__(:)', r'<span class="highlight">\g<0></span>', line)
+        return line
+
+    def replace_block(match):
+        code = "\n".join(process_line(line) for line in match.group(2).split("\n"))
+        return f"```{match.group(1)}\n{code}\n```"
+
+    return re.sub(r"```(\w*)\n(.*?)\n```", replace_block, markdown_text, flags=re.DOTALL)
+
+
+@pytest.mark.parametrize("markdown, expected", FENCE_CASES)
+def test_fences(markdown, expected):
+    assert Task3Highlighter(markdown).process() == expected
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "*.py"))))
+def test_generated_markdown_matches_former_highlighter(path):
+    with open(path, encoding="utf-8") as f:
+        code = re.sub(r"^(\s*#.*)$", r"\1 __NOTE__: and __TODO__:", f.read(), flags=re.MULTILINE)
+    markdown = MarkdownGenerator(code, "python").generate_markdown()
+    assert Task3Highlighter(markdown).process() == reference_process(markdown)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+
+import pytest
+
+import app as webapp
+import asgi
+import hooks
+from code2md import MarkdownGenerator
+
+logging.disable(logging.DEBUG)
+
+SOURCE = "# A comment.\n\nx = 1   \n"
+
+
+@pytest.fixture
+def pipeline():
+    yield webapp.hook_pipeline
+    webapp.hook_pipeline.replace([])
+
+
+def markdown_with(*block_hooks):
+    pipeline = hooks.HookPipeline()
+    pipeline.replace(block_hooks)
+    return MarkdownGenerator(SOURCE, "python", hooks=pipeline.compiled()).generate_markdown()
+
+
+def test_hooks_touch_only_their_block_types():
+    assert "A comment" not in markdown_with(hooks.BlockHook("d", hooks.drop, ["comment"]))
+    assert "x = 1" in markdown_with(hooks.BlockHook("d", hooks.drop, ["comment"]))
+    assert "x = 1\n" in markdown_with(hooks.BlockHook("s", hooks.strip_trailing_whitespace, ["code"]))
+
+
+def test_version_changes_with_the_hook_set():
+    pipeline = hooks.HookPipeline()
+    assert pipeline.version == ""
+    pipeline.add(hooks.BlockHook("d", hooks.drop, ["comment"]))
+    version = pipeline.version
+    pipeline.add(hooks.BlockHook("d", hooks.drop, ["code"]))
+    assert pipeline.version not in ("", version)
+
+
+def test_add_hook_route(pipeline):
+    client = webapp.app.test_client()
+    assert client.post("/hooks/add", data={"name": "x", "function": "nope"}).status_code == 400
+    response = client.post("/hooks/add", data={"name": "x", "function": "drop", "types": "<b>"})
+    assert response.status_code == 400 and b"<b>" not in response.data
+    assert client.post("/hooks/add", data={"name": "x", "function": "drop", "types": "comment"}).status_code == 200
+    assert "+hooks." in webapp.render_variant(".py")
+
+
+def test_add_hook_route_defaults_to_logging(pipeline):
+    # The former contract: a name alone adds a hook which leaves the blocks unchanged.
+    response = webapp.app.test_client().post("/hooks/add", data={"name": "x"})
+    assert response.status_code == 200
+    assert [hook.function for hook in pipeline.hooks()] == [hooks.log_block]
+    assert markdown_with(*pipeline.hooks()) == markdown_with()
+
+
+def test_portability():
+    pipeline = hooks.HookPipeline()
+    pipeline.add(hooks.BlockHook("d", hooks.drop))
+    assert pipeline.is_portable()
+    pipeline.add(hooks.BlockHook("l", lambda block: block))
+    assert not pipeline.is_portable()
+
+
+def test_worker_renders_with_the_parent_hooks(tmp_path, pipeline):
+    path = tmp_path / "m.py"
+    path.write_text(SOURCE)
+    pipeline.add(hooks.BlockHook("drop-comments", hooks.drop, ["comment"]))
+    render_pool = asgi.RenderPool(workers=1)
+    try:
+        final_html, render_metrics = asyncio.run(
+            render_pool.render(str(path), "digest-with-hooks", ".py", SOURCE))
+    finally:
+        render_pool.shutdown()
+    assert "A comment" not in final_html and "x" in final_html
+    assert "hook.drop-comments" in render_metrics["stages"]
+    assert render_pool.stats["in_process"] == 0
+
+
+def test_closure_hooks_render_in_process(tmp_path, pipeline):
+    path = tmp_path / "m.py"
+    path.write_text(SOURCE)
+    pipeline.add(hooks.BlockHook("closure", lambda block: None, ["comment"]))
+    render_pool = asgi.RenderPool(workers=1)
+    try:
+        final_html, _ = asyncio.run(render_pool.render(str(path), "digest-with-closure", ".py", SOURCE))
+    finally:
+        render_pool.shutdown()
+    assert "A comment" not in final_html
+    assert render_pool.stats["in_process"] == 1
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import readblocks
+from code2md import MarkdownGenerator
+from incremental import IncrementalMarkdownGenerator
+
+SAMPLES = {
+    "python": 'import os\n# comment\n\ndef f(x):\n    """doc\n    string"""\n    return x  # inline\n\n# tail\n',
+    "javascript": '/*head\n * x\n **/\n// line\nfunction f(a) {\n  return "s" + `t${a}`; /* c */\n}\n\n// end\n',
+    "java": '/** doc */\npublic class A {\n  // c\n  int x = 1; /* b\n  c */\n}\n',
+    "go": '// Package p\npackage p\n\n/* block */\nfunc f() string { return `raw\n` }\n',
+    "html": '<!-- c -->\n<p>x</p>\n<script>// s\nvar a;</script>\n',
+    "css": '/* c */\nbody { color: red; }\n',
+}
+
+# Pieces of the edits: comment and string delimiters, line breaks and continuations.
+ALPHABET = ["\n", " ", "/", "*", "#", "'", '"', "`", "x", "{", "}", "//", "/*", "*/", '"""', "\n\n",
+            "<!--", "-->", "\\"]
+
+# (language, code, start, end, replacement) of edits which once broke the parity.
+REGRESSIONS = [
+    ("javascript", "/*head\n * x\n **/", 12, 14, "'"),
+    ("javascript", " \n/*\n ", 5, 6, "{*/"),
+    ("go", "/\\\n*\n*<", 5, 7, "*/` "),
+    ("html", "<!\n<\np", 5, 6, "#-->"),
+]
+
+
+@pytest.fixture(autouse=True)
+def lexed_only(monkeypatch):
+    # The incremental state comes from the lexer; the scanners are compared with it in test_scanners.py.
+    monkeypatch.setattr(readblocks, "USE_SCANNERS", False)
+
+
+def expected(code, language):
+    return MarkdownGenerator(code, language).generate_markdown()
+
+
+@pytest.mark.parametrize("language, code, start, end, replacement", REGRESSIONS)
+def test_edit_regressions(language, code, start, end, replacement):
+    doc = IncrementalMarkdownGenerator(code, language)
+    assert doc.apply_edit(start, end, replacement) == expected(doc.code, language)
+
+
+@pytest.mark.parametrize("language", sorted(SAMPLES))
+def test_random_edits_match_full_conversion(language):
+    assert readblocks.supports_restart(readblocks.get_lexer(language))
+    for seed in range(20):
+        rng = random.Random(seed)
+        doc = IncrementalMarkdownGenerator(SAMPLES[language], language)
+        for _ in range(40):
+            start = rng.randrange(len(doc.code) + 1)
+            end = min(len(doc.code), start + rng.choice([0, 0, 1, 2, 5]))
+            replacement = "".join(rng.choice(ALPHABET) for _ in range(rng.choice([0, 1, 1, 2, 3])))
+            before = doc.code
+            assert doc.apply_edit(start, end, replacement) == expected(doc.code, language), \
+                (before, start, end, replacement)
+
+
+def test_restart_less_lexer_falls_back_to_full_conversion():
+    doc = IncrementalMarkdownGenerator("/* a */\nint x;\n", "c")
+    assert doc.apply_edit(8, 8, "// b\n") == expected(doc.code, "c")
@@ -0,0 +1,28 @@
+import random
+
+import lineoffsets
+from lineoffsets import LineOffsets
+
+
+def counted(text, offset, first_line=1):
+    line_start = text.rfind("\n", 0, offset) + 1
+    return first_line + text.count("\n", 0, offset), offset - line_start + 1
+
+
+def test_locate_matches_counting_newlines():
+    rng = random.Random(1)
+    text = "".join(rng.choice(["a", "bc", "\n", "\n\n", " "]) for _ in range(2000))
+    offsets = [rng.randrange(len(text) + 1) for _ in range(300)]
+    index = LineOffsets(text, first_line=7)
+    for offset in offsets + sorted(offsets):
+        assert index.locate(offset) == counted(text, offset, 7)
+    lines, columns = LineOffsets(text, first_line=7).locate_many(offsets)
+    assert list(zip(lines, columns)) == [counted(text, offset, 7) for offset in offsets]
+
+
+def test_locate_many_without_numpy(monkeypatch):
+    monkeypatch.setattr(lineoffsets, "numpy", None)
+    text = "a\nbb\n\nccc"
+    offsets = [9, 0, 2, 5, 6, 4]
+    lines, columns = LineOffsets(text).locate_many(offsets)
+    assert list(zip(lines, columns)) == [counted(text, offset) for offset in offsets]
@@ -0,0 +1,34 @@
+import os
+import re
+
+import app as webapp
+from listing import ListingCache
+
+
+def test_listing_matches_the_directory(tmp_path, monkeypatch):
+    for name in ("b.py", "A.txt", "c.go"):
+        (tmp_path / name).write_text("x\n")
+    (tmp_path / "Sub").mkdir()
+    monkeypatch.setattr(webapp, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(webapp, "listing_cache", ListingCache())
+    client = webapp.app.test_client()
+
+    page = client.get("/browse/").get_data(as_text=True)
+    names = sorted(os.listdir(tmp_path), key=str.lower)
+    assert re.findall(r'<a href="[^"]*">([^<]*?)(?: \(lang: [^)]*\))?</a>', page) == names
+    assert "[DIR] <a" in page and "b.py (lang: Python)" in page
+
+    (tmp_path / "aaa_new.py").write_text("x\n")
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 1))
+    assert "aaa_new.py" in client.get("/browse/").get_data(as_text=True)
+
+
+def test_listing_pages(tmp_path, monkeypatch):
+    for n in range(5):
+        (tmp_path / f"f{n}.txt").write_text("x\n")
+    monkeypatch.setattr(webapp, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(webapp, "listing_cache", ListingCache())
+    monkeypatch.setattr(webapp, "LISTING_PAGE_SIZE", 2)
+    client = webapp.app.test_client()
+    page = client.get("/browse/?page=3").get_data(as_text=True)
+    assert "f4.txt" in page and "f3.txt" not in page and "Entries 5–5 of 5" in page
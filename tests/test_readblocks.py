@@ -0,0 +1,84 @@
+import glob
+import os
+
+import pytest
+from pygments import lex
+from pygments.token import Token
+
+import readblocks
+from readblocks import PygmentsParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = [
+    ("python", "# c\ndef f():\n    \"\"\"Doc.\"\"\"\n    return 1  # inline\n\n\n# tail\n"),
+    ("python", "\n\n# leading blank lines\nx = 1\n"),
+    ("python", "x = 1\r\n# crlf\r\n"),
+    ("c", "/* a */\nint f(void) { // b\n  return 0;\n}\n"),
+    ("javascript", "// a\nlet x = `t ${1}`; /* b */\n"),
+    ("python", ""),
+]
+
+
+def reference_blocks(code, lexer):
+    # The former parser: every token of the lexer, merged into comment and code blocks.
+    blocks = []
+    current, current_type = [], None
+    position = start = 0
+    line = column = start_line = start_col = 1
+    for token_type, value in lex(code, lexer):
+        new_type = "comment" if token_type in Token.Comment else "code"
+        if new_type != current_type and current:
+            blocks.append((current_type, "".join(current), (start, position), ((start_line, start_col), (line, column))))
+            current, start, start_line, start_col = [], position, line, column
+        current_type = new_type
+        current.append(value)
+        position += len(value)
+        for part in value.splitlines(keepends=True):
+            if "\n" in part:
+                line, column = line + part.count("\n"), 1
+            else:
+                column += len(part)
+    if current:
+        blocks.append((current_type, "".join(current), (start, position), ((start_line, start_col), (line, column))))
+    result = []
+    for block_type, text, string, line_char in blocks:
+        if text.endswith("\n") and text != "\n":
+            content, newline = text.rstrip("\n"), "\n"
+        else:
+            content, newline = text, ""
+        result.append({"type": block_type, "content": content, "newline": newline,
+                       "positions": {"string": string, "line-char": line_char}})
+    return result
+
+
+def parsed_blocks(code, language):
+    return [dict(block) for block in PygmentsParser(code, language).iter_comments_and_blocks()]
+
+
+@pytest.fixture(params=[True, False], ids=["scanners", "lexer"])
+def use_scanners(request, monkeypatch):
+    monkeypatch.setattr(readblocks, "USE_SCANNERS", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("language, code", SOURCES)
+def test_blocks_match_former_parser(language, code, use_scanners):
+    assert parsed_blocks(code, language) == reference_blocks(code, readblocks.get_lexer(language))
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "*.py"))))
+def test_repository_sources_match_former_parser(path, use_scanners):
+    with open(path, encoding="utf-8") as f:
+        code = f.read()
+    assert parsed_blocks(code, "python") == reference_blocks(code, readblocks.get_lexer("python"))
+
+
+@pytest.mark.parametrize("language, code", SOURCES)
+def test_block_list_matches_blocks(language, code):
+    parser = PygmentsParser(code, language)
+    blocks = parsed_blocks(code, language)
+    block_list = parser.parse_blocks()
+    assert [dict(block) for block in block_list] == blocks
+    assert [block.as_dict() for block in block_list[:]] == blocks
+
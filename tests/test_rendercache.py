@@ -0,0 +1,24 @@
+import os
+
+import pygments
+
+import app
+from rendercache import RenderCache
+
+
+def test_fingerprints_are_evicted_with_the_entries(tmp_path):
+    cache = RenderCache(max_bytes=2000)
+    st = os.stat(tmp_path)
+    for i in range(1000):
+        cache.remember_digest(f"/tree/file{i}.py", st, f"{i:064x}")
+    assert cache.get_stats()["bytes"] <= 2000
+    assert cache.lookup_digest("/tree/file999.py", st) == f"{999:064x}"
+    assert cache.lookup_digest("/tree/file0.py", st) is None
+
+
+def test_keys_change_with_the_package_versions(monkeypatch):
+    digest = app.config_digest()
+    monkeypatch.setattr(pygments, "__version__", "0.0")
+    assert app.config_digest() != digest
+    assert app.RENDER_VERSION in app.render_variant(".py")
+    assert app.RENDER_VERSION in app.render_variant(".md")
@@ -0,0 +1,38 @@
+import glob
+import os
+
+import pytest
+
+import renderers
+from code2md import MarkdownGenerator
+from highlighter import Task3Highlighter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("backend", renderers.available_backends())
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "*.py"))))
+def test_segments_render_as_the_whole_document(path, backend):
+    renderer = renderers.get_renderer(backend)
+    with open(path, encoding="utf-8") as f:
+        segments = list(MarkdownGenerator(f.read(), "python").iter_segments_with_modes())
+    whole = renderer.markdown_to_html(Task3Highlighter("\n\n".join(text for _, text in segments)).process())
+    assert renderers.render_segments(segments, renderer) == whole
+    assert "".join(renderers.iter_segments_html(segments, renderer)) == whole
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "*.py"))))
+def test_backends_render_alike(path):
+    pytest.importorskip("cmarkgfm")
+    with open(path, encoding="utf-8") as f:
+        text = Task3Highlighter(MarkdownGenerator(f.read(), "python").generate_markdown()).process()
+    assert renderers.get_renderer("cmark").markdown_to_html(text) == renderers.get_renderer("mistune").markdown_to_html(text)
+
+
+@pytest.mark.parametrize("backend", renderers.available_backends())
+def test_raw_code_html_is_kept(backend):
+    raw = '<pre><code class="language-python">x = "raw"\n</code></pre>'
+    result = renderers.get_renderer(backend).markdown_to_html(f"{raw}\n\n```python\ny = 1\n```\n")
+    assert result.startswith(raw + "\n")
+    assert "data-sourcepos" not in result
+    assert result.count('<pre class="pygments">') == 1
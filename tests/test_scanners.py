@@ -0,0 +1,105 @@
+import glob
+import os
+import random
+
+import pytest
+
+import readblocks
+from readblocks import PygmentsParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pieces of the random sources, per language: comments, literals and the lexer rules around them.
+FRAGMENTS = {
+    "python": [
+        "# comment\n", "x = 1  # inline\n", "\n", "    ", "def f(a, b):\n", "class A(B):\n",
+        '"""doc\n# not a comment\n"""\n', "'''", '"""', "'", '"', "r'\\'#'", 'b"\\N{x}"',
+        "f'{a!r:>{w}} # {b[\"k\"]}'", 'f"{x = }"', "f'{'", "rf'{a}\\'", "u'\\N{DASH}#'",
+        "'{0:>10} #'.format(x)", "match x:\n", "    case [a, _]:\n", "case _:\n", "match = 1\n",
+        "from . import (a,\n b)\n", "import a as b, c\n", "def\n", "class\n", "class 1\n",
+        "\\\n", "1if x else'#'\n", "@'x'\n", "x = f'''\n{a}\n# no\n'''\n", "print('a\\\n#b')\n",
+        "é'#'\n", "ß = 1\n", "lambda: {'a': 1}\n", "f'{x:{\"#\"}}'\n", "\t# tab\n", "async def g():\n",
+    ],
+    "javascript": [
+        "// comment\n", "/* block\n comment */", "\n", "  ", "x = a / b / c;\n", "re = /a[/]b/g;\n",
+        "if (/#/.test(s)) {}\n", "return /x/;\n", "`a ${b + `c ${d}`} e`", "`", "${", "}", "'", '"',
+        "'it\\'s // not'", '"/* no */"', "<!-- old\n", "#!/usr/bin/env node\n", "x++ / 2;\n",
+        "a = b\n/re/.exec(c)\n", ") / 2", "] / x /", "typeof /x/", "this.x / 2", "obj.return / 2",
+        "#priv / 2", "x => /a/", "1e3 / 2 / 3", "0x1f / 2", "/* a */ /b/", "foo(/* c */ /r/)",
+        "/unterminated\n", "'unterminated\n", "a /= 2;\n", "\\u0061 / 2", "é / 2", "let x\n= /y/\n",
+        "case 1: /z/\n", "{ } /x/", "`${ /* c */ }`", "`${ '}' }`", "=== /q/", "a-- /x/ 2",
+    ],
+    "go": [
+        "// comment\n", "/* block\n */", "\n", "\t", "func f() {\n", "}\n", "s := \"// no\"\n",
+        "r := `/* raw\n */`\n", "c := '\"'\n", "c := '\\''\n", "c := '\\x41'\n", "'", '"', "`",
+        "x := a / b\n", "/\\\n* odd */", "/* a *\\\n/", "'ab'", "\"unterminated\n", "/ *", "*/",
+    ],
+    "java": [
+        "// comment\n", "/** doc\n * more\n */", "\n", "    ", "class A {\n", "}\n",
+        "String s = \"// no\";\n", "String t = \"\"\"\n  /* text block */\n  \"\"\";\n", "char c = '\"';\n",
+        "char d = '\\'';\n", "var x = 1;\n", "import java.util.*;\n", "import static a.B.c;\n",
+        "package a.b;\n", "record R(int a) {}\n", "public static record S() {}\n", "'", '"', "\"\"\"",
+        "Foo.class", "1.class", "x.var", "@interface A {}\n", "class 1 // x\n", "var\n", "class\n/*x*/",
+        "import a /* c */;\n", "/ /", "\"unterminated\n", "'\\u0041'", "int $class = 1;\n",
+    ],
+    "c": [
+        "// comment\n", "/* block\n */", "\n", "  ", "#include <stdio.h>\n", "#define X(a) a /* c */\n",
+        "  # if 0\nx\n#endif\n", "#if 0\n#if 1\n#else\n#endif\n", "int f(int a /* b */, char *c)\n{\n",
+        "static int g(void) // x)\n;\n", "}\n", "struct S {\n", "struct\n#define Y\n", "case 1: /* c */\n",
+        "x = a / b;\n", "s = \"// no\\\n\";\n", "c = '\"';\n", "'", '"', "/\\\n* odd */", "// a \\\nb\n",
+        "label: x;\n", "\\\n", "1'000 / 2", "L\"s\" u8\"t\"", "x.y->z", "return (a) / (b);\n", "/*", "*/",
+        "for (;;) { /* c */ }\n", "enum E { A };\n", "typedef int T;\n", "\"unterminated\n", "#",
+    ],
+    "bash": [
+        "# comment\n", "echo a # b\n", "echo a#b\n", "\n", "  ", "x=1\n", "x=#y\n", "echo $#\n",
+        "echo ${#x}\n", "echo $((1 # 2))\n", "echo `date # x`\n", "echo $(ls # x\n)\n", "if [ -f x ]; then\n",
+        "fi\n", "done#x\n", "'#'", '"#"', "'", '"', "cat <<EOF\n# no\nEOF\n", "a\\#b\n", "12#3\n",
+        "#!/bin/sh\n", "case $x in a) ;; esac\n", "f() { :; }\n", "echo \"$(echo '#')\"\n", "a>#b\n",
+    ],
+}
+FRAGMENTS["cpp"] = FRAGMENTS["c"] + [
+    "class A : public B {\n", "namespace n { // c\n", "R\"x(/* raw */)x\"", "template <typename T>\n",
+    "enum class E { A };\n", "concept C = true;\n", "auto s = u8R\"(//)\";\n", "a::b /* c */ ::c",
+]
+
+# (language, code) which once made a scanner differ from the lexer.
+REGRESSIONS = [
+    ("python", 'def f"""{"\n#'),
+    ("javascript", "<<!--"),
+]
+
+
+def block_records(blocks):
+    return [(block["type"], block["content"], block["positions"]["string"]) for block in blocks]
+
+
+def assert_same_blocks(code, language):
+    parser = PygmentsParser(code, language)
+    scanned = block_records(parser.iter_comments_and_blocks())
+    assert scanned == block_records(parser.iter_blocks_from(parser.source)), code
+
+
+@pytest.mark.parametrize("language", sorted(FRAGMENTS))
+def test_scanner_is_registered(language):
+    assert readblocks.get_scanner(readblocks.get_lexer(language)) is not None
+
+
+@pytest.mark.parametrize("language, code", REGRESSIONS)
+def test_scanner_regressions(language, code):
+    assert_same_blocks(code, language)
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(ROOT, "*.py"))))
+def test_repository_sources_match_lexer(path):
+    with open(path, encoding="utf-8") as f:
+        assert_same_blocks(f.read(), "python")
+
+
+@pytest.mark.parametrize("language", sorted(FRAGMENTS))
+def test_random_sources_match_lexer(language):
+    rng = random.Random(1)
+    for _ in range(200):
+        code = "".join(rng.choice(FRAGMENTS[language]) for _ in range(rng.randint(1, 40)))
+        if rng.random() < 0.3:
+            code = code[:rng.randint(0, len(code))]
+        assert_same_blocks(code, language)
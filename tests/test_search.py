@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+
+import app
+from searchindex import SearchIndex, terms_of
+
+FILES = {
+    "a.py": "# cache and stream\nx = 1\n",
+    "b.py": "# only cache\ny = 2  # stream in code\n",
+    "sub/c.py": "def f():\n    # stream the cache\n    return 3\n",
+}
+
+
+def naive_search(root, query, kind):
+    terms = set(terms_of(query))
+    found = set()
+    for directory, _, files in os.walk(root):
+        for name in files:
+            abs_path = os.path.join(directory, name)
+            for segment_kind, _, text in app.search_segments(abs_path, ".py"):
+                if segment_kind == kind and terms <= set(terms_of(text)):
+                    found.add(os.path.relpath(abs_path, root))
+    return found
+
+
+def test_index_finds_what_a_scan_finds(tmp_path):
+    for name, content in FILES.items():
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(content)
+    index = SearchIndex(app.search_segments, {".py"}, refresh_seconds=0)
+    root = str(tmp_path)
+    for kind in ("prose", "code"):
+        index.refresh_if_due(root)
+        found = {result["path"] for result in index.search("cache stream", kind, limit=10)}
+        assert found == naive_search(root, "cache stream", kind)
+    with open(tmp_path / "b.py", "a") as f:
+        f.write("\n# cache stream appended\n")
+    index.refresh_if_due(root)
+    found = {result["path"] for result in index.search("cache stream", "prose", limit=10)}
+    assert found == naive_search(root, "cache stream", "prose") == {"a.py", "b.py"}
+
+
+def test_search_does_not_wait_for_the_index(tmp_path, monkeypatch):
+    for name, content in FILES.items():
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(content)
+    release = threading.Event()
+
+    def slow_segments(abs_path, ext):
+        release.wait()
+        return app.search_segments(abs_path, ext)
+
+    index = SearchIndex(slow_segments, {".py"}, refresh_seconds=3600)
+    monkeypatch.setattr(app, "search_index", index)
+    monkeypatch.setattr(app, "BASE_DIR", str(tmp_path))
+    client = app.app.test_client()
+    try:
+        data = client.get("/search?q=cache&format=json").get_json()
+        assert data["complete"] is False and data["results"] == []
+        assert b"still being built" in client.get("/search?q=cache").data
+        release.set()
+        deadline = time.monotonic() + 10
+        while not index.is_ready(str(tmp_path)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        data = client.get("/search?q=cache&format=json").get_json()
+        assert data["complete"] is True
+        assert {result["path"] for result in data["results"]} == {"a.py", "b.py", os.path.join("sub", "c.py")}
+    finally:
+        release.set()
+        index.stop()
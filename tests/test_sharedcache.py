@@ -0,0 +1,58 @@
+import pytest
+
+import readblocks
+from readblocks import PygmentsParser
+from sharedcache import SharedCache
+
+SOURCES = [
+    ("python", "# c\ndef f():\n    \"\"\"Doc.\"\"\"\n    return 1  # inline\n\n\n# tail\n"),
+    ("c", "/* a */\nint f(void) { // b\n  return 0;\n}\n"),
+    ("python", ""),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SharedCache(str(tmp_path / "shared.sqlite3"))
+    readblocks.set_block_store(store)
+    yield store
+    readblocks.set_block_store(None)
+
+
+def parse(code, language):
+    parser = PygmentsParser(code, language)
+    return parser, [dict(block) for block in parser.iter_comments_and_blocks()]
+
+
+@pytest.mark.parametrize("language, code", SOURCES)
+def test_stored_blocks_match_parsed_blocks(store, language, code):
+    first, blocks = parse(code, language)
+    second, stored = parse(code, language)
+    assert not first.cached and second.cached
+    assert stored == blocks
+
+
+@pytest.mark.parametrize("language, code", SOURCES)
+def test_block_runs_round_trip(language, code):
+    blocks = list(PygmentsParser(code, language).iter_comments_and_blocks())
+    data = readblocks.encode_block_runs(bytearray(b["type"] == "comment" for b in blocks),
+                                        [b["positions"]["string"][1] for b in blocks])
+    assert readblocks.decode_block_runs(data) == [(b["type"], *b["positions"]["string"]) for b in blocks]
+    assert readblocks.decode_block_runs(data[:-1]) is None
+    assert readblocks.decode_block_runs(data + b"\0") is None
+
+
+def test_corrupt_entry_is_parsed_again(store):
+    code = SOURCES[0][1]
+    _, blocks = parse(code, "python")
+    key = readblocks.block_store_key(readblocks.get_lexer("python"), code)
+    store.put(key, store.get(key)[:-1])
+    parser, parsed = parse(code, "python")
+    assert not parser.cached and parsed == blocks
+
+
+def test_values_round_trip(store):
+    value = b"x" * 10000
+    store.put("key", value)
+    assert store.get("key") == value
+    assert store.get("missing") is None
@@ -0,0 +1,31 @@
+import os
+
+import shtype
+from shtype import Shtype, derive_comment_syntax
+
+
+def test_comment_syntax_is_not_written_to_the_index(tmp_path):
+    path = str(tmp_path / "index.json")
+    checker = Shtype(path)
+    assert checker.get_comment_syntax("python")["line"] == ["#"]
+    assert checker.get_comment_syntax("No such language") is None
+    assert not os.path.exists(path)
+
+
+def test_prebuilt_index_is_used(tmp_path):
+    path = str(tmp_path / "index.json")
+    index = shtype.build_index()
+    index["comments"]["Python"] = {"line": ["%"], "block": [], "doc": [], "continuation": [], "hashbang": []}
+    shtype.write_index(index, path)
+    checker = Shtype(path)
+    assert checker.get_comment_syntax("py")["line"] == ["%"]
+    assert checker.get_languages_by_extension(".py")
+
+
+def test_derive_comment_syntax_reads_group_rules():
+    # JavaLexer's line comments are a bygroups() rule, (//.*?)(\n).
+    syntax = derive_comment_syntax(Shtype().get_lexer_class("java"))
+    assert syntax["line"] == ["//"]
+    assert ["/*", "*/"] in syntax["block"]
+    # CSharpLexer keeps its token definitions per Unicode level.
+    assert derive_comment_syntax(Shtype().get_lexer_class("csharp"))["line"] == ["//"]
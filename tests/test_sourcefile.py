@@ -0,0 +1,58 @@
+import hashlib
+
+import pytest
+
+import sourcefile
+
+TEXTS = [
+    "",
+    "one line without newline",
+    "a\nb\nc\n",
+    "\n\n\n",
+    "".join(f"line {n} é\n" for n in range(2500)),
+    "".join(f"line {n}\n" for n in range(2000)) + "last",
+]
+
+
+def write(tmp_path, data):
+    path = tmp_path / "file.txt"
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_mapped_reading_matches_plain_reading(tmp_path, text):
+    data = text.encode("utf-8")
+    path = write(tmp_path, data)
+    assert sourcefile.read_digest_and_text(path) == (hashlib.sha256(data).hexdigest(), text)
+    assert sourcefile.read_text(path) == text
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("step", [1, 7, 1000])
+def test_paged_lines_match_splitting(tmp_path, text, step):
+    path = write(tmp_path, text.encode("utf-8"))
+    with sourcefile.mapped(path) as data:
+        index = sourcefile.LineIndex(data, step)
+    lines = text.splitlines(keepends=True)
+    assert index.line_count == len(lines)
+    for first in (1, 2, 999, 1000, 1001, len(lines), len(lines) + 1):
+        for count in (1, 3, 1000):
+            expected = "".join(lines[first - 1:first - 1 + count])
+            assert sourcefile.read_lines(path, index, first, count, 1 << 30) == \
+                (expected, len(lines[first - 1:first - 1 + count]), False)
+
+
+def test_paged_lines_are_cut_at_max_bytes(tmp_path):
+    path = write(tmp_path, b"aaaa\nbbbb\ncccc\n")
+    with sourcefile.mapped(path) as data:
+        index = sourcefile.LineIndex(data)
+    assert sourcefile.read_lines(path, index, 1, 3, 12) == ("aaaa\nbbbb\n", 2, True)
+    assert sourcefile.read_lines(path, index, 1, 3, 3) == ("aaa", 1, True)
+
+
+def test_binary_files_are_rejected(tmp_path):
+    path = write(tmp_path, b"text\0more")
+    assert sourcefile.is_binary_file(path)
+    with pytest.raises(sourcefile.BinaryFileError):
+        sourcefile.read_digest_and_text(path)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+warmup.py – Pre-warming the render cache with the pages readers are likely to open first.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+import threading
+from collections import Counter
+from urllib.parse import unquote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_PATHS = 10000
+DEFAULT_SAVE_INTERVAL = 60
+# Seconds to wait before checking again while live requests are in flight.
+IDLE_POLL_SECONDS = 0.05
+
+_ACCESS_LOG_REQUEST = re.compile(r'"(?:GET|HEAD) (/view/[^ "]+)')
+
+
+def read_paths_file(path):
+    """
+    Returns the paths listed in a file (a list of paths or an access log, see above), most
+    requested first.
+    """
+    counts = Counter()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            m = _ACCESS_LOG_REQUEST.search(line)
+            url = m.group(1) if m else line
+            url = urlsplit(url).path if m or url.startswith("/view/") else url
+            subpath = unquote(url[len("/view/"):]) if url.startswith("/view/") else url
+            if subpath:
+                counts[subpath] += 1
+    # Counter.most_common keeps the order of first appearance among equal counts.
+    return [subpath for subpath, _ in counts.most_common()]
+
+
+class AccessStats:
+    """
+    Counts of /view requests per path, optionally kept in a JSON file across restarts.
+    """
+
+    def __init__(self, path=None, max_paths=DEFAULT_MAX_PATHS, save_interval=DEFAULT_SAVE_INTERVAL):
+        self.path = path
+        self.max_paths = max_paths
+        self.save_interval = save_interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._saved = time.monotonic()
+        self._dirty = False
+        if path is not None:
+            self.load()
+
+    def record(self, subpath):
+        with self._lock:
+            self._counts[subpath] += 1
+            # When full, the least requested half is dropped.
+            if len(self._counts) > self.max_paths:
+                self._counts = Counter(dict(self._counts.most_common(self.max_paths // 2)))
+            self._dirty = True
+            due = self.path is not None and time.monotonic() - self._saved >= self.save_interval
+        if due:
+            self.save()
+
+    def most_common(self, n=None):
+        """
+        Returns the n (all if None) most requested paths, most requested first.
+        """
+        with self._lock:
+            return [subpath for subpath, _ in self._counts.most_common(n)]
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                counts = json.load(f).get("counts", {})
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.error(f"Could not read access statistics {self.path}: {e}")
+            return
+        with self._lock:
+            self._counts.update(counts)
+
+    def save(self):
+        """
+        Writes the counts to the file (atomically), if they changed since the last save.
+        """
+        with self._lock:
+            self._saved = time.monotonic()
+            if not self._dirty:
+                return
+            data = {"version": 1, "counts": dict(self._counts)}
+            self._dirty = False
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Could not save access statistics {self.path}: {e}")
+
+
+class Warmer:
+    """
+    Renders lists of paths in the background with render(subpath), which returns "warmed",
+    "skipped" (nothing to cache, e.g. a streamed page) or raises / returns another status on failure.
+    """
+
+    def __init__(self, render, workers=1, nice=10):
+        self.render = render
+        self.workers = workers
+        self.nice = nice
+        self._lock = threading.Lock()
+        self._live_requests = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._cancelled = False
+        self._run = None  # the counters of the current or last run
+        self._executor = None
+
+    # --- Live requests
+    def request_started(self):
+        with self._lock:
+            self._live_requests += 1
+            self._idle.clear()
+
+    def request_finished(self):
+        with self._lock:
+            self._live_requests -= 1
+            if self._live_requests <= 0:
+                self._live_requests = 0
+                self._idle.set()
+
+    # --- Runs
+    def start(self, paths):
+        """
+        Starts warming paths in the background. Returns False if a run is still in progress.
+        """
+        with self._lock:
+            if self._run is not None and self._run["running"]:
+                return False
+            self._cancelled = False
+            self._run = {"running": True, "total": len(paths), "done": 0, "warmed": 0, "skipped": 0,
+                         "failed": 0, "current": [], "started": time.time(), "finished": None}
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="warmup",
+                                                    initializer=self._lower_priority)
+        if not paths:
+            self._finish()
+            return True
+        remaining = [len(paths)]
+        for subpath in paths:
+            self._executor.submit(self._warm, subpath, remaining)
+        return True
+
+    def cancel(self):
+        """
+        Skips the paths of the current run that have not been started yet.
+        """
+        with self._lock:
+            self._cancelled = True
+
+    def status(self):
+        with self._lock:
+            if self._run is None:
+                return {"running": False, "total": 0, "done": 0}
+            status = dict(self._run, current=list(self._run["current"]))
+            status["live_requests"] = self._live_requests
+        end = status["finished"] or time.time()
+        status["seconds"] = round(end - status["started"], 3)
+        return status
+
+    def _lower_priority(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except (AttributeError, OSError):
+            # On Linux, a thread's nice value is its own; elsewhere the threads keep their priority.
+            pass
+
+    def _warm(self, subpath, remaining):
+        run = self._run
+        try:
+            if self._cancelled:
+                return
+            # Wait for live requests before each path; a path being rendered is finished first, so
+            # a request may wait for that one render, never for the rest of the list.
+            while not self._idle.wait(IDLE_POLL_SECONDS):
+                if self._cancelled:
+                    return
+            with self._lock:
+                run["current"].append(subpath)
+            try:
+                result = self.render(subpath)
+            except Exception as e:
+                logging.error(f"Warming {subpath} failed: {e}")
+                result = "failed"
+            with self._lock:
+                run["current"].remove(subpath)
+                run["done"] += 1
+                run[result if result in ("warmed", "skipped") else "failed"] += 1
+        finally:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._run["running"] = False
+            self._run["finished"] = time.time()
+        logging.info(f"Cache warm-up finished: {self.status()}")